@@ -0,0 +1,122 @@
+# figures.py
+# Server-side downsampling for long time-series figures. Each trace is cut
+# to the visible x-range and reduced to about one min/max pair per pixel
+# column (or LTTB), so the figure JSON stays the same size however long the
+# history is; zooming re-requests detail for the new range via relayoutData.
+# Downsampled traces are cached per (series, version, range, points).
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+DEFAULT_POINTS = 1200      # roughly the plot width in pixels
+CACHE_ITEMS = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# ---------- index selection -------------------------------------------------
+
+def minmax_indices(x, y, n_buckets):
+    """First, last and per-bucket min and max points, buckets equal-width in x."""
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    span = max(float(x[-1] - x[0]), 1.0)
+    bucket = np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+    order = np.lexsort((y, bucket))          # by bucket, then value
+    sorted_buckets = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keeps the point of each bucket that
+    forms the largest triangle with the previous pick and the next bucket's mean."""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picks = np.empty(n_out, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picks[i + 1] = a
+    return picks
+
+
+METHODS = {"minmax": lambda x, y, n: minmax_indices(x, y, n // 2), "lttb": lttb_indices}
+
+
+# ---------- traces ----------------------------------------------------------
+
+def _as_numbers(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64)
+    return x.astype(np.float64)
+
+
+def downsample(x, y, n_points=DEFAULT_POINTS, x_range=None, method="minmax"):
+    """(x, y) reduced to about n_points inside x_range, plus one neighbour on
+    each side so the line runs to the plot edges. x must be sorted."""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    ok = ~np.isnan(y)
+    x, y = x[ok], y[ok]
+    xs = _as_numbers(x)
+    if x_range is not None:
+        lo, hi = _as_numbers(pd.to_datetime(list(x_range)).values if np.issubdtype(x.dtype, np.datetime64)
+                             else np.asarray(x_range, dtype=np.float64))
+        start = max(np.searchsorted(xs, lo, side="left") - 1, 0)
+        end = min(np.searchsorted(xs, hi, side="right") + 1, len(xs))
+        x, y, xs = x[start:end], y[start:end], xs[start:end]
+    idx = METHODS[method](xs, y, n_points)
+    return x[idx], y[idx]
+
+
+def cached_trace(key, version, x, y, n_points=DEFAULT_POINTS, x_range=None, method="minmax"):
+    cache_key = (key, version, tuple(map(str, x_range)) if x_range else None, n_points, method)
+    with _cache_lock:
+        if cache_key in _cache:
+            _cache.move_to_end(cache_key)
+            return _cache[cache_key]
+    value = downsample(x, y, n_points, x_range, method)
+    with _cache_lock:
+        _cache[cache_key] = value
+        while len(_cache) > CACHE_ITEMS:
+            _cache.popitem(last=False)
+    return value
+
+
+def line_figure(df, x, ys, title, key, version, x_range=None, n_points=DEFAULT_POINTS, method="minmax"):
+    """Downsampled line figure; uirevision keeps the user's zoom across updates."""
+    fig = go.Figure()
+    for col in ys:
+        tx, ty = cached_trace((key, col), version, df[x].to_numpy(), df[col].to_numpy(),
+                              n_points, x_range, method)
+        fig.add_trace(go.Scattergl(x=tx, y=ty, mode="lines", name=str(col)))
+    fig.update_layout(title=title, uirevision=key)
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    return fig
+
+
+def x_range_from_relayout(relayout):
+    """Visible x-range from a dcc.Graph relayoutData event, None for full view."""
+    if not relayout or relayout.get("xaxis.autorange"):
+        return None
+    if "xaxis.range[0]" in relayout:
+        return relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    if "xaxis.range" in relayout:
+        return tuple(relayout["xaxis.range"])
+    return None
@@ -1,18 +1,24 @@
 # main.py
 from pathlib import Path
-import threading
 import pandas as pd
 import dash
-from dash import html, dcc, Output, Input
+from dash import html, dcc, Output, Input, State
+from dash.exceptions import PreventUpdate
 import plotly.express as px
+import plotly.graph_objects as go
 from sklearn.metrics import classification_report
 from dash import dash_table
 
 
-from run_model import _run_notebook
+from figures import line_figure, x_range_from_relayout
 from models.macro_model_s3 import build_forecast
+from models.var_service import var_forecast
+from models.mc_service import SERVICE as MC_SERVICE, ASSETS as MC_ASSETS
+from models import profiling
+from models.jobs import JOBS
 
-app = dash.Dash(__name__)
+# pages are swapped in by URL, so callbacks may target ids not on screen yet
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 
 # ---------- XGBoost static CSV ----------------------------------------------
 
@@ -20,34 +26,55 @@ XGB_DF = pd.read_csv(Path("app/data/lumber_xgb.csv"))
 XGB_REPORT = pd.read_csv(Path("app/data/lumber_xgb_report.csv"))
 #print(XGB_REPORT.head())
 
-# ---------- Monte-Carlo static image ----------------------------------------
+# ---------- Monte-Carlo simulation service ----------------------------------
 
-MC_IMAGE = "/assets/lumber_mc_hist.png"        
-MC_IMAGE_CRUDE = "/assets/crude_mc_hist.png" 
+MC_SIMS = [1_000_000, 10_000_000, 100_000_000]
 
-# ---------- VAR notebook (sample notebook) ----------------------------------
+# ---------- background jobs (models/jobs.py) ---------------------------------
+# Model work runs on the job pool; callbacks submit it under a key (identical
+# requests share one job) and poll the job until it is done.
 
-VAR_PATH = Path("notebooks/VAR.ipynb")
-var_df   = None                               
+VAR_KEY = "var:DEXKOUS"     # VAR forecast (cached coefficients, weekly refit)
+MACRO_TTL = 600             # seconds a finished macro forecast is served before refitting
 
 def run_var():
-    global var_df
-    res = _run_notebook(VAR_PATH)             
-    var_df = res["df"]
+    with profiling.run("var"):
+        df = var_forecast("DEXKOUS", steps=5)
+    return df, int(pd.util.hash_pandas_object(df).sum())
 
-threading.Thread(target=run_var, daemon=True).start()
+def submit_var():
+    return JOBS.submit(VAR_KEY, run_var, label="VAR DEXKOUS")
+
+def run_macro(currency):
+    with profiling.run(f"macro:{currency}"):
+        return build_forecast(currency, n_paths=2000)
+
+submit_var()                # start fitting before the first page load
 
 # ---------- layout ----------------------------------------------------------
 
 CURRENCIES = ["usd_krw", "usd_china", "usd_uk"]
 
-app.layout = html.Div(
+MAIN_PAGE = html.Div(
     [
-        html.H2("Lumber Monte-Carlo (static image)"),
-        html.Img(src=MC_IMAGE, style={"maxWidth": "700px"}),
-
-        html.H2("Crude oil Monte-Carlo (static image)"),
-        html.Img(src=MC_IMAGE_CRUDE, style={"maxWidth": "700px"}),
+        html.H2("Monte-Carlo price simulation"),
+        html.Div(
+            [
+                dcc.Dropdown(id="mc-asset",
+                             options=[{"label": a.replace("_", " ").title(), "value": a} for a in MC_ASSETS],
+                             value="lumber", clearable=False, style={"width": "180px"}),
+                dcc.Dropdown(id="mc-sims", options=[{"label": f"{n:,} paths", "value": n} for n in MC_SIMS],
+                             value=10_000_000, clearable=False, style={"width": "220px"}),
+            ],
+            style={"display": "flex", "gap": "12px"},
+        ),
+        html.Label("Horizon (weeks)"),
+        dcc.Slider(id="mc-horizon", min=1, max=52, step=1, value=4,
+                   marks={w: str(w) for w in (1, 4, 13, 26, 52)}),
+        html.Div(id="mc-summary"),
+        dcc.Graph(id="mc-graph"),
+        dcc.Store(id="mc-key"),
+        dcc.Interval(id="mc-poll", interval=300, disabled=True),
 
         html.H2("XGBoost Feature Importance"),
         dcc.Graph(
@@ -84,35 +111,185 @@ app.layout = html.Div(
             value="usd_krw",
             clearable=False,
         ),
+        html.Div(id="macro-status"),
         dcc.Graph(id="macro-graph"),
+        dcc.Interval(id="macro-poll", interval=500, disabled=True),
+
+        html.Footer(["Calligo - Capstone · ", dcc.Link("debug", href="/debug")]),
+    ]
+)
 
-        html.Footer("Calligo - Capstone"),
+TABLE_STYLE = dict(style_cell={'textAlign': 'right', 'padding': '6px'},
+                   style_header={'backgroundColor': '#f4f4f4', 'fontWeight': 'bold'},
+                   style_table={'overflowX': 'auto'})
+
+DEBUG_PAGE = html.Div(
+    [
+        html.H2("Stage profiling"),
+        dcc.Checklist(
+            id="prof-mode",
+            options=[{"label": " record stage timings", "value": "on"},
+                     {"label": " trace memory (slower)", "value": "memory"}],
+            value=[v for v, on in (("on", profiling.enabled()), ("memory", profiling.MODE == "memory")) if on],
+        ),
+        html.Div(id="prof-status"),
+        dcc.Dropdown(id="prof-run", placeholder="No runs recorded yet", style={"width": "420px"}),
+        dcc.Graph(id="prof-graph"),
+        dash_table.DataTable(id="prof-run-table", **TABLE_STYLE),
+        html.H3("All runs, per stage"),
+        dash_table.DataTable(id="prof-totals", **TABLE_STYLE),
+        html.H3("Jobs"),
+        dash_table.DataTable(id="job-table", **TABLE_STYLE),
+        dcc.Interval(id="prof-poll", interval=2000),
+        html.Footer(dcc.Link("back", href="/")),
     ]
 )
 
+app.layout = html.Div([dcc.Location(id="url"), html.Div(id="page")])
+
+@app.callback(Output("page", "children"), Input("url", "pathname"))
+def show_page(pathname):
+    return DEBUG_PAGE if pathname == "/debug" else MAIN_PAGE
+
 # ---------- update VAR once ready ------------------------------------------
 
 @app.callback(
     Output("var-graph", "figure"),
+    Output("var-refresh", "disabled"),
     Input("var-refresh", "n_intervals"),
+    Input("var-graph", "relayoutData"),
 )
-def load_var_graph(_):
-    if var_df is None:
-        return px.line(title="Loading VAR notebook")
+def load_var_graph(_, relayout):
+    job = submit_var()
+    if job.pending:
+        return px.line(title="Loading VAR forecast"), False
+    if job.error:
+        return px.line(title="VAR forecast failed"), True
+    var_df, var_version = job.result
+    if relayout and not any(k.startswith("xaxis") for k in relayout) \
+            and any(k.startswith("yaxis") for k in relayout):
+        raise PreventUpdate        # y-only zoom: the x detail on screen is still right
     x_col = var_df.columns[0]
-    return px.line(var_df, x=x_col, y=var_df.columns[1:],
-                   title="VAR Forecast")
+    fig = line_figure(var_df, x_col, var_df.columns[1:], "VAR Forecast",
+                      key="var", version=var_version, x_range=x_range_from_relayout(relayout))
+    return fig, True
+
+# ---------- Monte-Carlo panel -----------------------------------------------
+
+@app.callback(
+    Output("mc-key", "data"),
+    Input("mc-asset", "value"),
+    Input("mc-horizon", "value"),
+    Input("mc-sims", "value"),
+)
+def start_mc(asset, horizon, n_sims):
+    return MC_SERVICE.request(asset, horizon, n_sims)
+
+@app.callback(
+    Output("mc-graph", "figure"),
+    Output("mc-summary", "children"),
+    Output("mc-poll", "disabled"),
+    Input("mc-poll", "n_intervals"),
+    Input("mc-key", "data"),
+)
+def show_mc(_, key):
+    snap = MC_SERVICE.status(key) if key else None
+    if snap is None:
+        return px.bar(title="Simulating..."), "", False
+    if "error" in snap:
+        return px.bar(title="Simulation failed"), snap["error"], True
+
+    edges = snap["edges"]
+    fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=snap["counts"] / snap["done"],
+                 labels={"x": "Simulated price", "y": "Probability"},
+                 title=f"{snap['asset'].title()} price after {snap['horizon']} weeks")
+    fig.update_traces(width=float(edges[1] - edges[0]))
+    fig.add_vline(x=snap["last_price"], line_dash="dash", line_color="red", annotation_text="Current price")
+    progress = "" if snap["finished"] else f" ({snap['done']:,} of {snap['n_sims']:,} paths so far)"
+    summary = f"Probability the price is higher: {snap['up_prob']:.2%}{progress}"
+    if snap.get("corr"):
+        other, r = max(snap["corr"].items(), key=lambda kv: abs(kv[1]))
+        summary += f" · moves most with {other.replace('_', ' ')} (corr {r:+.2f})"
+    return fig, summary, snap["finished"]
 
 # ---------- macro dropdown --------------------------------------------------
 
+def macro_figure(df, currency):
+    fig = go.Figure([
+        go.Scatter(x=df["date"], y=df["q95"], line=dict(width=0), showlegend=False, hoverinfo="skip"),
+        go.Scatter(x=df["date"], y=df["q05"], line=dict(width=0), fill="tonexty",
+                   fillcolor="rgba(99,110,250,0.15)", name="90% band"),
+        go.Scatter(x=df["date"], y=df["q75"], line=dict(width=0), showlegend=False, hoverinfo="skip"),
+        go.Scatter(x=df["date"], y=df["q25"], line=dict(width=0), fill="tonexty",
+                   fillcolor="rgba(99,110,250,0.3)", name="50% band"),
+        go.Scatter(x=df["date"], y=df["q50"], name="median path", line=dict(dash="dot")),
+        go.Scatter(x=df["date"], y=df["predicted_value"], name="point forecast"),
+    ])
+    fig.update_layout(title=f"{currency.upper()} 14-day Forecast")
+    return fig
+
 @app.callback(
     Output("macro-graph", "figure"),
+    Output("macro-status", "children"),
+    Output("macro-poll", "disabled"),
     Input("currency-picker", "value"),
+    Input("macro-poll", "n_intervals"),
 )
-def show_macro(currency):
-    df = build_forecast(currency)
-    return px.line(df, x="date", y="predicted_value",
-                   title=f"{currency.upper()} 14-day Forecast")
+def show_macro(currency, _):
+    job = JOBS.submit(f"macro:{currency}", run_macro, currency, label=f"macro {currency}", ttl=MACRO_TTL)
+    if job.pending:
+        status = f"Fitting {currency.upper()}: {job.progress:.0%} {job.message}".rstrip()
+        if dash.ctx.triggered_id == "macro-poll":
+            return dash.no_update, status, False      # keep the chart on screen while polling
+        return px.line(title=f"{currency.upper()} 14-day Forecast (fitting...)"), status, False
+    if job.error:
+        return px.line(title="Macro forecast failed"), job.error, True
+    return macro_figure(job.result, currency), "", True
+
+# ---------- debug page ------------------------------------------------------
+
+def _records(df):
+    return [{k: (None if pd.isna(v) else round(v, 4)) if isinstance(v, float) else v for k, v in row.items()}
+            for row in df.to_dict("records")]
+
+@app.callback(Output("prof-status", "children"), Input("prof-mode", "value"))
+def set_profiling(mode):
+    mode = "memory" if "memory" in mode else "1" if "on" in mode else ""
+    profiling.enable(mode)
+    return {"": "Profiling is off.", "1": "Recording wall and CPU time per stage.",
+            "memory": "Recording time and peak traced memory per stage."}[mode]
+
+@app.callback(
+    Output("prof-run", "options"),
+    Output("prof-run", "value"),
+    Output("prof-graph", "figure"),
+    Output("prof-run-table", "data"),
+    Output("prof-totals", "data"),
+    Input("prof-poll", "n_intervals"),
+    Input("prof-run", "value"),
+    State("prof-run", "options"),
+)
+def show_profile(_, selected, known):
+    runs = {f"{r.started:.6f}": r for r in profiling.runs()}
+    options = [{"label": f"{pd.Timestamp(r.started, unit='s'):%H:%M:%S} {r.name} ({r.wall:.2f}s)", "value": k}
+               for k, r in reversed(runs.items())]
+    if selected not in runs:
+        selected = options[0]["value"] if options else None
+    if not runs or (options == known and dash.ctx.triggered_id == "prof-poll"):
+        # nothing new since the last poll: leave the page as it is
+        if runs:
+            raise PreventUpdate
+        return [], None, px.bar(title="Enable profiling and use the dashboard"), [], []
+    report = runs[selected].report()
+    fig = go.Figure([go.Bar(y=report["stage"], x=report["wall_s"], name="wall", orientation="h"),
+                     go.Bar(y=report["stage"], x=report["cpu_s"], name="CPU", orientation="h")])
+    fig.update_layout(title=f"{runs[selected].name}: {runs[selected].wall:.2f}s", xaxis_title="seconds",
+                      yaxis=dict(autorange="reversed"), height=200 + 30 * len(report))
+    return options, selected, fig, _records(report), _records(profiling.totals())
+
+@app.callback(Output("job-table", "data"), Input("prof-poll", "n_intervals"))
+def show_jobs(_):
+    return _records(JOBS.table())
 
 # ---------- run -------------------------------------------------------------
 
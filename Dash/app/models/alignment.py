@@ -0,0 +1,147 @@
+# alignment.py
+# Mixed-frequency as-of alignment. Every series is looked up on a target
+# calendar (weekly, daily or business-day) in one searchsorted call over all
+# series at once: each calendar date takes the latest observation that had
+# been published by then (observation date + publication lag). Aligned
+# panels are cached on disk keyed by the versions of their inputs.
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CALENDARS = {"W": "W-SUN", "D": "D", "B": "B"}   # "W" matches resample('W')
+CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / ".align_cache"
+# part of every cache key, like the code digests in pipeline.fingerprint: editing
+# this module retires the panels it aligned before
+CODE_VERSION = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+
+# Typical delay between a FRED observation date and its release. Observation
+# dates are period starts, so e.g. Q1 GDP (dated Jan 1) is first out late April.
+PUBLICATION_LAGS = {
+    "gdp": 120,
+    "cpi": 45,
+    "ppi": 45,
+    "unemployment_rate": 35,
+    "unrate": 35,
+    "housing_starts": 48,
+    "building_permits": 48,
+    "construction_spending": 62,
+    "m2_money_supply": 55,
+    "indpro": 45,
+    "usd_index": 35,
+    "lumber_price": 45,
+    "mortgage_rate": 0,
+    "yield_curve": 1,
+    "crude_oil_price": 1,
+    "retail_gas_price": 1,
+}
+
+
+def to_days(dates):
+    dates = pd.Series(dates) if not isinstance(dates, (pd.Series, pd.Index)) else dates
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def target_calendar(start, end, freq="W"):
+    return pd.date_range(start, end, freq=CALENDARS.get(freq, freq))
+
+
+def prepare_series(dates, values):
+    """Sorted (day, value) arrays with NaNs dropped; the last value wins on a repeated date."""
+    days = to_days(dates)
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    keep = ~np.isnan(values) & (days != np.iinfo(np.int64).min)
+    days, values = days[keep], values[keep]
+    order = np.argsort(days, kind="stable")
+    days, values = days[order], values[order]
+    last = np.r_[days[1:] != days[:-1], True]
+    return days[last], values[last]
+
+
+def align_series(series, freq="W", lags=None, start=None, end=None, how="latest", end_on=None):
+    """As-of align {name: (dates, values)} on a target calendar.
+
+    lags maps name -> publication lag in days (missing names get 0). The
+    calendar starts when every series has a value; it ends at the newest
+    available observation of any series (how="latest", older series carry
+    forward) or, as the old inner merge did, at the oldest (how="common").
+    end_on names a series, typically a model's target, whose last observation
+    ends the calendar instead, so that series is never carried forward.
+    """
+    lags = lags or {}
+    names = list(series)
+    prepared = []
+    for name in names:
+        days, values = prepare_series(*series[name])
+        if not len(days):
+            raise ValueError(f"Series {name} has no observations")
+        prepared.append((days + int(lags.get(name, 0)), values))
+
+    firsts = np.array([d[0] for d, _ in prepared])
+    lasts = np.array([d[-1] for d, _ in prepared])
+    offset = pd.tseries.frequencies.to_offset(CALENDARS.get(freq, freq))
+    if start is None:
+        start = pd.Timestamp(firsts.max(), unit="D")
+    if end is None:
+        # like resample, the period holding the last observation is included
+        if end_on is not None:
+            last = lasts[names.index(end_on)]
+        else:
+            last = lasts.max() if how == "latest" else lasts.min()
+        end = offset.rollforward(pd.Timestamp(last, unit="D"))
+    calendar = target_calendar(start, end, freq)
+    cal = to_days(calendar)
+
+    # one sorted key space for all series: key = series offset + day, so a
+    # single searchsorted answers every (series, calendar date) lookup
+    lo = min(firsts.min(), cal.min(initial=firsts.min()))
+    hi = max(lasts.max(), cal.max(initial=lasts.max()))
+    span = int(hi - lo) + 1
+    offsets = np.arange(len(names), dtype=np.int64) * span
+    keys = np.concatenate([d - lo + off for (d, _), off in zip(prepared, offsets)])
+    values = np.concatenate([v for _, v in prepared])
+    bounds = np.cumsum([0] + [len(d) for d, _ in prepared])
+
+    queries = (cal - lo)[None, :] + offsets[:, None]
+    pos = np.searchsorted(keys, queries.ravel(), side="right").reshape(queries.shape) - 1
+    valid = pos >= bounds[:-1, None]        # found an observation of the same series
+    out = np.where(valid, values[np.clip(pos, 0, None)], np.nan)
+
+    panel = pd.DataFrame(out.T, columns=names)
+    panel.insert(0, "date", calendar)
+    return panel
+
+
+# ---------- cache ---------------------------------------------------------
+
+def cache_key(versions, **params):
+    payload = json.dumps({"code": CODE_VERSION, "versions": versions, "params": params}, sort_keys=True,
+                         default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cached_align(versions, load, freq="W", lags=None, how="latest", end_on=None, cache_dir=CACHE_DIR):
+    """Align with a disk cache.
+
+    versions maps name -> an input version (S3 ETag, file hash, ...); load(name)
+    returns (dates, values) and is only called on a cache miss.
+    """
+    key = cache_key(versions, freq=freq, lags=lags or {}, how=how, end_on=end_on)
+    path = Path(cache_dir) / f"{key}.pkl"
+    if path.exists():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    panel = align_series({name: load(name) for name in versions}, freq=freq, lags=lags, how=how, end_on=end_on)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(panel, f)
+    os.replace(tmp, path)
+    return panel
@@ -0,0 +1,184 @@
+# backtest.py
+# Walk-forward evaluation for the currency (Ridge + RandomForest) and lumber
+# (XGBoost) models.
+#
+#   cd Dash/app
+#   python -m models.backtest usd_krw --min-train 750 --test-size 5
+#   python -m models.backtest lumber --window 260 --workers 8 --out lumber_folds.csv
+#
+# Features are built once into NumPy arrays; each worker process receives
+# them a single time through the pool initializer, so a fold is just a pair
+# of index ranges and never rebuilds or pickles a DataFrame.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+_DATA = {}
+LABEL_HORIZON = 1       # rows a label looks ahead (tomorrow's direction); purged from each training window
+
+
+@dataclass
+class Fold:
+    index: int
+    train_start: int
+    train_end: int      # exclusive
+    test_end: int       # exclusive; test rows are [train_end, test_end)
+
+
+def walk_forward_splits(n, min_train, test_size=1, step=None, window=None):
+    """Expanding (window=None) or rolling walk-forward folds over n rows."""
+    step = step or test_size
+    folds = []
+    train_end = min_train
+    while train_end < n:
+        start = 0 if window is None else max(0, train_end - window)
+        folds.append(Fold(len(folds), start, train_end, min(train_end + test_size, n)))
+        train_end += step
+    return folds
+
+
+# ---------- models --------------------------------------------------------
+
+def fit_predict_currency(X_train, y_train, X_test, params):
+    from sklearn.linear_model import Ridge
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(X_train)
+    reg = Ridge(alpha=1.0).fit(scaler.transform(X_train), y_train["value"])
+    clf = RandomForestClassifier(**{**params, "n_jobs": 1}).fit(X_train, y_train["direction"])
+    return reg.predict(scaler.transform(X_test)), clf.predict(X_test)
+
+
+def fit_predict_lumber(X_train, y_train, X_test, params):
+    from xgboost import XGBClassifier
+
+    clf = XGBClassifier(**{**params, "n_jobs": 1}).fit(X_train, y_train["direction"])
+    return None, clf.predict(X_test)
+
+
+def model_params(target):
+    """Classifier params the live model for target trains with: the tuned ones, if saved (see tuning.py)."""
+    from .tuning import load_tuned
+
+    if target == "lumber":
+        from .lumber_xgb import XGB_PARAMS
+        return load_tuned("lumber_xgb", XGB_PARAMS)
+    from .macro_model_s3 import RF_PARAMS
+    return load_tuned(f"{target}_rf", RF_PARAMS)
+
+
+MODELS = {"currency": fit_predict_currency, "lumber": fit_predict_lumber}
+
+
+# ---------- feature matrices ----------------------------------------------
+
+def currency_matrices(currency_code):
+    from .macro_model_s3 import build_currency_features, feature_columns
+    from .merge_fred_files import build_merged_macro
+
+    df = build_currency_features(build_merged_macro(currency_code))
+    X = df[feature_columns(df)].to_numpy(dtype=np.float64)
+    targets = {"value": df["currency_value"].to_numpy(dtype=np.float64),
+               "direction": df["direction"].to_numpy(dtype=np.int64)}
+    return df["observation_date"].to_numpy(), X, targets
+
+
+def lumber_matrices():
+    from .lumber_xgb import add_lumber_features, split_xy
+    from .merge_fred_files import load_and_merge_data
+
+    df = add_lumber_features(load_and_merge_data(end_on="lumber_price"))
+    X, y = split_xy(df)
+    return df["date"].to_numpy(), X.to_numpy(dtype=np.float64), {"direction": y.to_numpy(dtype=np.int64)}
+
+
+# ---------- fold execution -------------------------------------------------
+
+def _init_worker(model, X, targets, params):
+    _DATA.update(model=model, X=X, targets=targets, params=params)
+
+
+def _run_fold(fold):
+    X, targets = _DATA["X"], _DATA["targets"]
+    # the last LABEL_HORIZON training labels are computed from test-period prices
+    train = slice(fold.train_start, fold.train_end - LABEL_HORIZON)
+    test = slice(fold.train_end, fold.test_end)
+
+    start = time.perf_counter()
+    values, directions = MODELS[_DATA["model"]](X[train], {k: v[train] for k, v in targets.items()}, X[test],
+                                                _DATA["params"])
+    fit_seconds = time.perf_counter() - start
+
+    actual_dir = targets["direction"][test]
+    out = {"fold": fold.index, "n_train": train.stop - train.start,
+           "n_test": fold.test_end - fold.train_end,
+           "hits": int((directions == actual_dir).sum()), "abs_err": None,
+           "seconds": round(fit_seconds, 4)}
+    if values is not None:
+        out["abs_err"] = float(np.abs(values - targets["value"][test]).sum())
+    return out
+
+
+def backtest(model, dates, X, targets, folds, params, workers=None):
+    """Run every fold across a process pool with the classifier params
+    (see model_params); returns (per-fold DataFrame, summary dict)."""
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(model, X, targets, params)
+        rows = [_run_fold(f) for f in folds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model, X, targets, params)) as ex:
+            rows = list(ex.map(_run_fold, folds, chunksize=max(1, len(folds) // (workers * 4))))
+    wall = time.perf_counter() - start
+
+    result = pd.DataFrame(rows)
+    result["test_start"] = [dates[f.train_end] for f in folds]
+    result["direction_accuracy"] = result["hits"] / result["n_test"]
+    if result["abs_err"].notna().any():
+        result["mae"] = result["abs_err"] / result["n_test"]
+
+    n_test = int(result["n_test"].sum())
+    summary = {"model": model, "folds": len(folds), "test_rows": n_test,
+               "direction_accuracy": round(float(result["hits"].sum()) / n_test, 4),
+               "mae": round(float(result["abs_err"].sum()) / n_test, 6) if "mae" in result else None,
+               "fit_seconds_total": round(float(result["seconds"].sum()), 2),
+               "fit_seconds_p50": round(float(result["seconds"].median()), 4),
+               "wall_seconds": round(wall, 2), "workers": workers}
+    return result.drop(columns=["hits", "abs_err"]), summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward backtest.")
+    parser.add_argument("target", help="currency code from merge_fred_files.SERIES (e.g. usd_krw) or 'lumber'")
+    parser.add_argument("--min-train", type=int, default=None, help="rows in the first training window")
+    parser.add_argument("--test-size", type=int, default=1, help="rows predicted per fold (1 = refit every row)")
+    parser.add_argument("--step", type=int, default=None, help="rows between refits (default: test size)")
+    parser.add_argument("--window", type=int, default=None, help="rolling training window (default: expanding)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", help="write per-fold results to this CSV")
+    args = parser.parse_args()
+
+    if args.target == "lumber":
+        model, (dates, X, targets) = "lumber", lumber_matrices()
+    else:
+        model, (dates, X, targets) = "currency", currency_matrices(args.target)
+
+    min_train = args.min_train or len(X) // 2
+    folds = walk_forward_splits(len(X), min_train, args.test_size, args.step, args.window)
+    print(f"[Backtest] {args.target}: {len(X)} rows, {len(folds)} folds", flush=True)
+    result, summary = backtest(model, dates, X, targets, folds, model_params(args.target), args.workers)
+    print(f"[Backtest] {summary}", flush=True)
+    if args.out:
+        result.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# daily_panel.py
+# Date-aligned float32 panel of daily series, built by streaming one series at
+# a time into a preallocated (optionally memory-mapped) matrix, plus NaN-aware
+# target-vs-all correlation screening that never forms the full k x k matrix.
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CORR_CHUNK = 256   # columns per correlation block
+
+
+class DailyPanel:
+    def __init__(self, start, n_days, ids, memmap_path=None):
+        self.start = np.datetime64(pd.Timestamp(start).date(), "D")
+        self.ids = list(ids)
+        self.col = {sid: j for j, sid in enumerate(self.ids)}
+        shape = (n_days, len(self.ids))
+        # column-major: each series is contiguous, so writes and column blocks are sequential
+        if memmap_path:
+            self.values = np.memmap(memmap_path, dtype=np.float32, mode="w+", shape=shape, order="F")
+            self.values[:] = np.nan
+        else:
+            self.values = np.full(shape, np.nan, dtype=np.float32, order="F")
+        self.has_obs = np.zeros(n_days, dtype=bool)
+
+    @property
+    def dates(self):
+        return self.start + np.arange(self.values.shape[0])
+
+    def put(self, sid, dates, values):
+        rows = (np.asarray(dates, dtype="datetime64[D]") - self.start).astype(np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        keep = (rows >= 0) & (rows < self.values.shape[0]) & ~np.isnan(values)
+        rows, values = rows[keep], values[keep]
+        # duplicated dates: the last observation wins, as in drop_duplicates(keep='last')
+        uniq, pos = np.unique(rows[::-1], return_index=True)
+        self.values[uniq, self.col[sid]] = values[::-1][pos]
+        self.has_obs[uniq] = True
+
+    def frame(self, ids=None):
+        ids = self.ids if ids is None else list(ids)
+        rows = np.flatnonzero(self.has_obs)
+        cols = [self.col[sid] for sid in ids]
+        data = self.values[np.ix_(rows, cols)]
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self.dates[rows], name="date"), columns=ids)
+
+    def correlations(self, target, min_periods=2):
+        """Pearson correlation of target with every column, pairwise-complete
+        like DataFrame.corr(), computed one column block at a time."""
+        t = self.values[:, self.col[target]].astype(np.float64)
+        t_ok = ~np.isnan(t)
+        rows = np.flatnonzero(t_ok)
+        t = t[rows]
+        out = np.full(len(self.ids), np.nan)
+        for lo in range(0, len(self.ids), CORR_CHUNK):
+            x = np.asarray(self.values[rows, lo:lo + CORR_CHUNK], dtype=np.float64)
+            m = ~np.isnan(x)
+            n = m.sum(axis=0)
+            x = np.where(m, x, 0.0)
+            tm = np.where(m, t[:, None], 0.0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_t = tm.sum(axis=0) / n
+                mean_x = x.sum(axis=0) / n
+                dt = np.where(m, tm - mean_t, 0.0)
+                dx = np.where(m, x - mean_x, 0.0)
+                r = (dt * dx).sum(axis=0) / np.sqrt((dt * dt).sum(axis=0) * (dx * dx).sum(axis=0))
+            r[n < min_periods] = np.nan
+            out[lo:lo + len(r)] = np.clip(r, -1.0, 1.0)
+        return pd.Series(out, index=self.ids, name=target)
+
+    def top_correlated(self, target, k=30, min_periods=2):
+        """|corr| with target, highest first; the target itself comes first."""
+        corr = self.correlations(target, min_periods).abs().dropna()
+        # a constant or too-short target has no correlation with itself and was dropped above
+        others = corr.drop(target, errors="ignore").sort_values(ascending=False).iloc[:k]
+        return pd.concat([pd.Series({target: 1.0}, name=target), others])
+
+
+def build_daily_panel(series_ids, load, start, end, memmap_path=None, workers=8):
+    """Stream series into a DailyPanel covering [start, end].
+
+    load(series_id) must return a DataFrame with 'date' and 'value' columns;
+    loads run on a thread pool (they are I/O bound) while the panel is filled
+    as each one arrives, so at most 2 * workers raw frames are alive at a time.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    panel = DailyPanel(start, (end - start).days + 1, series_ids, memmap_path)
+
+    def fetch(sid):
+        df = load(sid)
+        dates = pd.to_datetime(df["date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+        values = pd.to_numeric(df["value"], errors="coerce").to_numpy(dtype=np.float64)
+        return sid, dates, values
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        in_flight = deque()
+        for sid in series_ids:
+            in_flight.append(ex.submit(fetch, sid))
+            if len(in_flight) >= 2 * workers:
+                panel.put(*in_flight.popleft().result())
+        while in_flight:
+            panel.put(*in_flight.popleft().result())
+    return panel
@@ -0,0 +1,136 @@
+# jobs.py
+# Background jobs for the dashboard. Callbacks submit model work (retrains,
+# forecasts, simulations) under a key and return at once with the job's
+# status; the work runs on a bounded thread pool, so a slow retrain cannot
+# occupy the request threads.
+#
+#   job = JOBS.submit(f"macro:{currency}", build_forecast, currency, ttl=600)
+#   job.state, job.progress, job.message, job.result, job.error
+#
+# A key names the result, not the request: submitting a key that is queued
+# or running joins that job instead of starting another, and a finished job
+# is handed back as it is until it is ttl seconds old (never, with ttl=None;
+# failed jobs are never reused). Work reports progress through
+# report_progress(), which does nothing outside a job. A job submitted with
+# lane= runs on that lane's own small pool instead of the shared one, so a
+# burst of one kind of work (Monte Carlo slider changes) cannot take every
+# worker from the rest.
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+JOB_WORKERS = int(os.environ.get("CALLIGO_JOB_WORKERS", 4))
+LANES = {"mc": int(os.environ.get("CALLIGO_MC_WORKERS", 1))}    # lane -> workers
+KEEP_JOBS = 200              # finished jobs kept for reuse and the /debug page
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_local = threading.local()
+
+
+class Job:
+    def __init__(self, key, label, lane=None):
+        self.key = key
+        self.label = label
+        self.lane = lane
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.requests = 1          # submissions coalesced onto this job
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def succeeded(self):
+        return self.state == DONE
+
+    @property
+    def pending(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; True if it did within timeout."""
+        return self._done.wait(timeout)
+
+
+def report_progress(fraction, message=None):
+    """Progress (0..1) of the job running on this thread, if any."""
+    job = getattr(_local, "job", None)
+    if job is not None:
+        job.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            job.message = message
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, keep=KEEP_JOBS, lanes=LANES):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lanes = {lane: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"job-{lane}")
+                       for lane, n in (lanes or {}).items()}
+        self._jobs = OrderedDict()         # key -> latest Job for that key
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, label=None, ttl=None, lane=None, **kwargs):
+        """Job for key: the one in flight or still fresh, else a new run of fn(*args, **kwargs)
+        on lane's pool (the shared one by default)."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and (job.pending or (job.succeeded and (
+                    ttl is None or time.time() - job.finished < ttl))):
+                job.requests += 1
+                self._jobs.move_to_end(key)
+                return job
+            job = self._jobs[key] = Job(key, label or key, lane)
+            self._jobs.move_to_end(key)
+            self._trim()
+        pool = self._pool if lane is None else self._lanes[lane]
+        pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.state, job.started = RUNNING, time.time()
+        _local.job = job
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.finished, job.state = time.time(), FAILED
+            print(f"[Jobs] {job.label} failed → {job.error}", flush=True)
+        else:
+            job.result, job.progress = result, 1.0
+            job.finished, job.state = time.time(), DONE      # state last: submit() reads finished once DONE
+        finally:
+            _local.job = None
+            job._done.set()
+
+    def _trim(self):
+        finished = [k for k, j in self._jobs.items() if not j.pending]
+        for key in finished[:max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def table(self):
+        """One row per known job, newest first, for the /debug page."""
+        now = time.time()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        rows = [{"job": j.label, "lane": j.lane or "shared", "state": j.state, "progress": round(j.progress, 3), "message": j.message,
+                 "requests": j.requests, "waited_s": round((j.started or now) - j.submitted, 3),
+                 "ran_s": None if j.started is None else round((j.finished or now) - j.started, 3),
+                 "error": j.error} for j in reversed(jobs)]
+        return pd.DataFrame(rows, columns=["job", "lane", "state", "progress", "message", "requests", "waited_s",
+                                           "ran_s", "error"])
+
+
+JOBS = JobQueue()
@@ -0,0 +1,48 @@
+# lumber_xgb.py
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from xgboost import XGBClassifier
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+from .profiling import span
+from .tuning import load_tuned
+
+XGB_PARAMS = dict(n_estimators=50, max_depth=3, learning_rate=0.1, scale_pos_weight=2, random_state=42, tree_method="hist")
+
+def add_lumber_features(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['target'] = np.where(df['lumber_price'].shift(-1) > df['lumber_price'], 1, 0)
+    df['month'] = df['date'].dt.month
+    df['is_summer'] = df['month'].isin([6,7,8]).astype(int)
+    df['month_sin'] = np.sin(2 * np.pi * df['month']/12)
+    df['month_cos'] = np.cos(2 * np.pi * df['month']/12)
+    df['lumber_pct_change_1w'] = df['lumber_price'].pct_change(1)
+    df['lumber_pct_change_4w'] = df['lumber_price'].pct_change(4)
+    df['lumber_sma_4w'] = df['lumber_price'].rolling(4).mean()
+    df['lumber_sma_12w'] = df['lumber_price'].rolling(12).mean()
+    df['lumber_volatility_4w'] = df['lumber_price'].rolling(4).std()
+    return df.dropna().reset_index(drop=True)
+
+def split_xy(df: pd.DataFrame):
+    return df.drop(columns=['date', 'target', 'lumber_price']), df['target']
+
+def write_lumber_xgb_artifacts(merged: pd.DataFrame, data_dir: Path) -> None:
+    """Train the lumber direction classifier and write the two CSVs the dashboard shows."""
+    with span("features"):
+        X, y = split_xy(add_lumber_features(merged))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, shuffle=False)
+
+    with span("xgb_fit"):
+        model = XGBClassifier(**load_tuned("lumber_xgb", XGB_PARAMS))
+        model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+
+    importance = model.get_booster().get_score(importance_type='weight')
+    importance_df = pd.DataFrame(importance.items(), columns=['Feature', 'Importance']) \
+        .sort_values(by='Importance', ascending=False)
+    importance_df.to_csv(data_dir / "lumber_xgb.csv", index=False)
+
+    report_dict = classification_report(y_test, y_pred, labels=[0, 1], output_dict=True)
+    pd.DataFrame(report_dict).transpose().reset_index().rename(
+        columns={"index": "Class"}).to_csv(data_dir / "lumber_xgb_report.csv", index=False)
@@ -1,14 +1,20 @@
 # macro_model_s3.py
 import pandas as pd, numpy as np
-from sklearn.linear_model import Ridge
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
 from .merge_fred_files import build_merged_macro  
+from .online_ridge import fit_or_update
+from .jobs import report_progress
+from .profiling import span
+from .tuning import load_tuned
 
-def build_forecast(currency_code: str, horizon=14) -> pd.DataFrame:
-    df = build_merged_macro(currency_code)
+RF_PARAMS = dict(n_estimators=100, random_state=42)
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+FEATURE_KEYS = ["_lag1","_ma","_return","_volatility","_delta"]
+
+def build_currency_features(df: pd.DataFrame, currency_col="currency_value") -> pd.DataFrame:
+    df = df.copy()
     df["observation_date"] = pd.to_datetime(df["observation_date"])
-    currency_col = "currency_value"
 
     # ---------------- feature engineering ----------------
     df[f"{currency_col}_ma7"]        = df[currency_col].rolling(7).mean().shift(1)
@@ -26,55 +32,116 @@ def build_forecast(currency_code: str, horizon=14) -> pd.DataFrame:
     df[f"{currency_col}_tomorrow"] = df[currency_col].shift(-1)
     df["direction"] = (df[f"{currency_col}_tomorrow"] > df[currency_col]).astype(int)
     df.dropna(inplace=True)
+    return df
+
+def feature_columns(df: pd.DataFrame):
+    return [c for c in df if any(k in c for k in FEATURE_KEYS)]
+
+def _linear_map(scaler, reg):
+    # scaler + ridge folded into one linear map on the raw features
+    weights = reg.coef_ / scaler.scale_
+    return weights, reg.intercept_ - scaler.mean_ @ weights
+
+def _recursive_forecast(df, feature_cols, weights, offset, shocks, currency_col="currency_value"):
+    """Paths (n x horizon) of the recursive Ridge forecast with shocks (n x horizon)
+    added to each step, and the (n x horizon x features) rows each step predicted from.
+
+    Every step rebuilds the currency-derived features (lag, 7-day mean and
+    volatility, 1-day return) from each path's own history and predicts all
+    paths in one matrix product; the other features stay at their last value.
+    """
+    n_paths, horizon = shocks.shape
+    hist = np.tile(df[currency_col].to_numpy(dtype=np.float64)[-7:], (n_paths, 1))
+    features = np.tile(df[feature_cols].to_numpy(dtype=np.float64)[-1], (n_paths, 1))
+    col = {c: i for i, c in enumerate(feature_cols)}
+
+    paths = np.empty((n_paths, horizon))
+    rows = np.empty((n_paths, horizon, len(feature_cols)))
+    for step in range(horizon):
+        window = hist[:, -7:]
+        derived = {
+            f"{currency_col}_lag1": window[:, -1],
+            f"{currency_col}_ma7": window.mean(axis=1),
+            f"{currency_col}_volatility7": window.std(axis=1, ddof=1),
+            f"{currency_col}_return1": window[:, -1] / window[:, -2] - 1,
+        }
+        for name, values in derived.items():
+            if name in col:
+                features[:, col[name]] = values
+        rows[:, step] = features
+        paths[:, step] = features @ weights + offset + shocks[:, step]
+        hist = np.column_stack([hist[:, 1:], paths[:, step]])
+    return paths, rows
+
+def point_path(df, feature_cols, scaler, reg, horizon, currency_col="currency_value"):
+    """The zero-shock path of simulate_paths' recursion: (values, feature rows) per step."""
+    weights, offset = _linear_map(scaler, reg)
+    paths, rows = _recursive_forecast(df, feature_cols, weights, offset, np.zeros((1, horizon)), currency_col)
+    return paths[0], rows[0]
+
+def simulate_paths(df, feature_cols, scaler, reg, horizon, n_paths, currency_col="currency_value", seed=42):
+    """(n_paths x horizon) recursive Ridge forecasts with bootstrapped residuals."""
+    weights, offset = _linear_map(scaler, reg)
+    X = df[feature_cols].to_numpy(dtype=np.float64)
+    residuals = df[currency_col].to_numpy() - (X @ weights + offset)
+    rng = np.random.default_rng(seed)
+    shocks = rng.choice(residuals, size=(n_paths, horizon))
+    return _recursive_forecast(df, feature_cols, weights, offset, shocks, currency_col)[0]
+
+def build_forecast(currency_code: str, horizon=14, n_paths=0, quantiles=QUANTILES) -> pd.DataFrame:
+    """Point forecast from the recursive Ridge forecast; with n_paths > 0 also
+    q{..} quantile bands and prob_up (share of simulated paths above today's
+    value) per day, and the point forecast is then the median path."""
+    currency_col = "currency_value"
+    with span("load"):
+        merged = build_merged_macro(currency_code)
+    report_progress(0.3, "features")
+    with span("features"):
+        df = build_currency_features(merged, currency_col)
 
     # ---------------- model training ----------------
-    feature_cols = [c for c in df if any(k in c for k in ["_lag1","_ma","_return","_volatility","_delta"])]
+    feature_cols = feature_columns(df)
     X, y_reg, y_clf = df[feature_cols], df[currency_col], df["direction"]
 
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    reg  = Ridge(alpha=1.0).fit(X_scaled, y_reg)
-    clf  = RandomForestClassifier(n_estimators=100, random_state=42).fit(X, y_clf)
-
-    # ---------------- forecasting loop ----------------
-    def forecast(df_hist):
-        last = df_hist.copy()
-        results = []
-        base = last.iloc[-1][currency_col]
-
-        results.append({
-            "date": last.iloc[-1]["observation_date"],
-            "predicted_value": base,
-            "predicted_direction": "Today",
-            "confidence": None,
+    report_progress(0.4, "fitting")
+    with span("fit_ridge"):
+        # saved sufficient statistics plus the new rows; a full refit only now and then
+        scaler, reg = fit_or_update(currency_code, df["observation_date"], X, y_reg, alpha=1.0).to_sklearn()
+    with span("fit_rf"):
+        clf  = RandomForestClassifier(**load_tuned(f"{currency_code}_rf", RF_PARAMS)).fit(X, y_clf)
+
+    # ---------------- forecasting ----------------
+    # the point line is the zero-shock path of the same recursion the bands come from
+    report_progress(0.8, "forecasting")
+    with span("forecast_loop"):
+        base = df[currency_col].iloc[-1]
+        values, rows = point_path(df, feature_cols, scaler, reg, horizon, currency_col)
+        probs = clf.predict_proba(pd.DataFrame(rows, columns=feature_cols))[:, 1]
+        last_date = df["observation_date"].iloc[-1]
+        out = pd.DataFrame({
+            "date": [last_date + pd.Timedelta(days=d) for d in range(horizon + 1)],
+            "predicted_value": np.r_[base, values],
+            "predicted_direction": ["Today"] + ["Up" if v > base else "Down" for v in values],
+            "confidence": [None] + [round(100 * p, 2) for p in probs],
         })
+    if n_paths:
+        with span("bootstrap_bands"):
+            paths = simulate_paths(df, feature_cols, scaler, reg, horizon, n_paths, currency_col)
+        bands = np.vstack([np.full(len(quantiles), base), np.quantile(paths, quantiles, axis=0).T])
+        for j, q in enumerate(quantiles):
+            out[f"q{round(q * 100):02d}"] = bands[:, j]
+        out["prob_up"] = np.r_[np.nan, (paths > base).mean(axis=0)]
+        # the skewed residuals and the volatility feature move the median off the
+        # zero-shock path; the line drawn inside the bands is the median path
+        median = np.median(paths, axis=0)
+        out["predicted_value"] = np.r_[base, median]
+        out["predicted_direction"] = ["Today"] + ["Up" if v > base else "Down" for v in median]
+    return out
 
-        feature_cols = [c for c in last if any(k in c for k in ["_lag1","_ma","_return","_volatility","_delta"])]
-        for _ in range(horizon):
-            row = last.iloc[-1]
-            X_future = pd.DataFrame([{c: row[c] for c in feature_cols}])
-            pred_val = reg.predict(scaler.transform(X_future))[0]
-            pred_dir = "Up" if pred_val > base else "Down"
-            prob     = clf.predict_proba(X_future)[0][1]
-
-            next_date = row["observation_date"] + pd.Timedelta(days=1)
-            results.append({
-                "date": next_date,
-                "predicted_value": pred_val,
-                "predicted_direction": pred_dir,
-                "confidence": round(100*prob,2),
-            })
-
-            # extend history for next iteration
-            new_row = row.copy()
-            new_row["observation_date"] = next_date
-            new_row[currency_col] = pred_val
-            last = pd.concat([last, pd.DataFrame([new_row])], ignore_index=True)
-
-        return pd.DataFrame(results)
-
-    return forecast(df)
-
-# Expose dataframe so run_any() can grab it
-forecast_df = build_forecast("usd_krw")
-df = forecast_df
\ No newline at end of file
+# Expose dataframe so run_any() can grab it (computed on first access, not at import)
+def __getattr__(name):
+    if name in ("forecast_df", "df"):
+        value = build_forecast("usd_krw")
+        globals().update(forecast_df=value, df=value)
+        return value
+    raise AttributeError(name)
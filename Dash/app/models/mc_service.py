@@ -0,0 +1,162 @@
+# mc_service.py
+# Monte Carlo simulations for the dashboard. A request (asset, horizon,
+# n_sims) runs as a background job (jobs.py) and publishes a refined
+# histogram after every chunk, so callers can poll a coarse answer right away.
+# Every asset in ASSETS is simulated jointly in that one run (shared block
+# bootstrap, see monte_carlo.simulate_joint_chunks), so the other assets'
+# results for the same params are ready when they are asked for. Finished
+# results are kept in memory and on disk, keyed by the S3 ETags of the price
+# series and the simulation params. Simulations run in the jobs' "mc" lane,
+# and one still queued when a newer request arrives is dropped unrun.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .alignment import align_series
+from .merge_fred_files import SERIES, kpi_series, kpi_version
+from .monte_carlo import BINS, MEAN_BLOCK, simulate_joint_chunks
+from .jobs import JOBS, report_progress
+from .profiling import run as profile_run, span
+
+CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / ".mc_cache"
+MEMORY_ITEMS = 64
+SEED = 42
+
+ASSETS = {
+    "lumber": "WPU0851.csv",
+    "crude": "DCOILWTICO.csv",
+    **{name: fname for name, (fname, _) in SERIES.items() if name.startswith("usd_")},
+}
+
+
+class SimulationService:
+    def __init__(self, cache_dir=CACHE_DIR, memory_items=MEMORY_ITEMS):
+        self.cache_dir = Path(cache_dir)
+        self.memory_items = memory_items
+        self._results = OrderedDict()      # key -> latest snapshot (finished or running)
+        self._running = set()
+        self._generation = 0               # bumped per simulation submitted; older queued ones are stale
+        self._returns = {}                 # versions -> (weekly returns matrix, last prices)
+        self._lock = threading.Lock()
+
+    # ---------- inputs ------------------------------------------------------
+
+    def _weekly_returns(self, versions):
+        """Weekly returns of every asset on their common weeks (weeks x assets) and the latest prices."""
+        marker = json.dumps(versions, sort_keys=True)
+        with self._lock:
+            if marker in self._returns:
+                return self._returns[marker]
+        panel = align_series({a: kpi_series(fname) for a, fname in ASSETS.items()}, freq="W")
+        prices = panel[list(ASSETS)].dropna()
+        value = (prices.pct_change().dropna().to_numpy(), prices.iloc[-1].to_numpy(dtype=float))
+        with self._lock:
+            self._returns = {marker: value}
+        return value
+
+    @staticmethod
+    def key(asset, versions, horizon, n_sims):
+        payload = json.dumps([asset, versions, horizon, n_sims, BINS, SEED, MEAN_BLOCK], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    # ---------- cache -------------------------------------------------------
+
+    def _remember(self, key, snapshot):
+        with self._lock:
+            self._results[key] = snapshot
+            self._results.move_to_end(key)
+            while len(self._results) > self.memory_items:
+                self._results.popitem(last=False)
+
+    def _load(self, key):
+        path = self.cache_dir / f"{key}.npz"
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return {**meta, "edges": data["edges"], "counts": data["counts"], "finished": True}
+
+    def _save(self, key, snapshot):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta = {k: v for k, v in snapshot.items() if k not in ("edges", "counts")}
+        tmp = self.cache_dir / f"{key}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, edges=snapshot["edges"], counts=snapshot["counts"], meta=json.dumps(meta))
+        os.replace(tmp, self.cache_dir / f"{key}.npz")
+
+    # ---------- requests ----------------------------------------------------
+
+    def request(self, asset, horizon, n_sims):
+        """Return the key for these params, starting a simulation if needed."""
+        versions = {a: kpi_version(fname) for a, fname in ASSETS.items()}
+        keys = {a: self.key(a, versions, horizon, n_sims) for a in ASSETS}
+        key = keys[asset]
+        with self._lock:
+            known = self._results.get(key)
+            if key in self._running or (known is not None and "error" not in known):
+                return key
+        cached = self._load(key)
+        if cached is not None:
+            self._remember(key, cached)
+            return key
+
+        with self._lock:
+            if key in self._running:
+                return key
+            self._running.update(keys.values())
+            self._generation += 1
+            generation = self._generation
+        JOBS.submit("mc:" + self.key("*", versions, horizon, n_sims), self._run, keys, versions, horizon, n_sims,
+                    generation, label=f"mc h={horizon} n={n_sims:,}", ttl=0, lane="mc")
+        return key
+
+    @staticmethod
+    def _snapshot(joint, i, asset, finished):
+        names = list(ASSETS)
+        return {"edges": joint["edges"][i], "counts": joint["counts"][i], "up_prob": joint["up_prob"][i],
+                "last_price": joint["last_price"][i], "n_sims": joint["n_sims"], "done": joint["done"],
+                "horizon": joint["horizon"], "asset": asset, "finished": finished,
+                "corr": {b: float(joint["corr"][i, j]) for j, b in enumerate(names) if b != asset}}
+
+    def _run(self, keys, versions, horizon, n_sims, generation):
+        try:
+            with self._lock:
+                superseded = generation != self._generation
+            if superseded:
+                # a slider moved on while this waited; asking for these params again reruns it
+                for asset, key in keys.items():
+                    self._remember(key, {"asset": asset, "finished": True,
+                                         "error": "superseded by a newer simulation request"})
+                return
+            with profile_run(f"mc:joint:{len(keys)}"):
+                with span("returns"):
+                    returns, last_prices = self._weekly_returns(versions)
+                joint = None
+                with span("simulate"):
+                    for joint in simulate_joint_chunks(returns, last_prices, n_sims, horizon, seed=SEED):
+                        for i, asset in enumerate(ASSETS):
+                            self._remember(keys[asset], self._snapshot(joint, i, asset, False))
+                        report_progress(joint["done"] / n_sims, f"{joint['done']:,} of {n_sims:,} paths")
+            for i, asset in enumerate(ASSETS):
+                snapshot = self._snapshot(joint, i, asset, True)
+                self._remember(keys[asset], snapshot)
+                self._save(keys[asset], snapshot)
+        except Exception as e:
+            print(f"[MC] joint h={horizon} n={n_sims} failed → {e}", flush=True)
+            for asset, key in keys.items():
+                self._remember(key, {"asset": asset, "finished": True, "error": str(e)})
+        finally:
+            with self._lock:
+                self._running.difference_update(keys.values())
+
+    def status(self, key):
+        """Latest snapshot for key (None until the first chunk is done)."""
+        with self._lock:
+            return self._results.get(key)
+
+
+SERVICE = SimulationService()
@@ -1,10 +1,14 @@
-import io, boto3, pandas as pd
+import io, os, boto3, pandas as pd
 from functools import reduce
+from .alignment import cached_align
+from .profiling import span
 
-aws_access_key_id = "YOUR_KEY_ID"
-aws_secret_access_key = "YOUR_ACCESS_KEY"
-endpoint_url = "YOUR_ENDPOINT"
-bucket_name = "fred"
+aws_access_key_id = os.environ.get("AWS_ACCESS_KEY_ID", "YOUR_KEY_ID")
+aws_secret_access_key = os.environ.get("AWS_SECRET_ACCESS_KEY", "YOUR_ACCESS_KEY")
+endpoint_url = os.environ.get("S3_ENDPOINT_URL", "YOUR_ENDPOINT")
+bucket_name = os.environ.get("FRED_BUCKET", "fred")
+# Read observations through Data_Serving/server.py instead of S3, e.g. "http://localhost:8060"
+DATA_API_URL = os.environ.get("FRED_DATA_API")
 
 SERIES = {
     "usd_krw":      ("DEXKOUS.csv",      "DEXKOUS"),
@@ -18,13 +22,21 @@ SERIES = {
     "crude_oil":    ("DCOILWTICO.csv",   "DCOILWTICO"),
 }
 
-s3 = boto3.resource(
-    "s3",
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    endpoint_url=endpoint_url,
-)
-bucket = s3.Bucket(bucket_name)
+bucket = None
+session = None
+
+def get_bucket():
+    # created on first use so importing the module never touches S3
+    global bucket
+    if bucket is None:
+        s3 = boto3.resource(
+            "s3",
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            endpoint_url=endpoint_url,
+        )
+        bucket = s3.Bucket(bucket_name)
+    return bucket
 
 def find_date_col(df: pd.DataFrame) -> str:
     for cand in ("observation_date", "date"):
@@ -59,10 +71,27 @@ def tidy_series_df(df: pd.DataFrame, fred_col: str, new_name: str) -> pd.DataFra
 
 
 
+def _api(method, key):
+    # observations/ID.csv -> /series/ID on the read API
+    global session
+    if session is None:
+        import requests
+        session = requests.Session()
+    resp = session.request(method, f"{DATA_API_URL}/series/{key[len('observations/'):-len('.csv')]}",
+                           params={"format": "csv"}, timeout=60)
+    resp.raise_for_status()
+    return resp
+
 def s3_csv_to_df(key: str) -> pd.DataFrame:
 
-    body = bucket.Object(key).get()["Body"].read()
-    return pd.read_csv(io.BytesIO(body))
+    with span("s3_fetch") as sp:
+        if DATA_API_URL and key.startswith("observations/"):
+            body = _api("GET", key).content
+        else:
+            body = get_bucket().Object(key).get()["Body"].read()
+        sp.add_bytes(len(body))
+    with span("csv_parse"):
+        return pd.read_csv(io.BytesIO(body))
 
 
 def build_merged_macro(currency_code: str) -> pd.DataFrame:
@@ -89,10 +118,74 @@ def build_merged_macro(currency_code: str) -> pd.DataFrame:
         except Exception:
             print(f"Skipping {fname} (not found)")  
 
-    df_merged = reduce(
-        lambda l, r: pd.merge(l, r, on="observation_date", how="outer"), dfs
-    ).sort_values("observation_date", ignore_index=True)
+    with span("merge"):
+        df_merged = reduce(
+            lambda l, r: pd.merge(l, r, on="observation_date", how="outer"), dfs
+        ).sort_values("observation_date", ignore_index=True)
     df_merged["currency_code"] = currency_code
     return df_merged
 
-print('hi')
+
+# ---------- weekly KPI merges for the lumber and crude-oil models ----------
+
+LUMBER_KPIS = {
+    'CPIAUCSL.csv': 'cpi',
+    'GDP.csv': 'gdp',
+    'HOUST.csv': 'housing_starts',
+    'M2REAL.csv': 'm2_money_supply',
+    'MORTGAGE30US.csv': 'mortgage_rate',
+    'PERMIT.csv': 'building_permits',
+    'PPIACO.csv': 'ppi',
+    'T10Y2Y.csv': 'yield_curve',
+    'TLRESCONS.csv': 'construction_spending',
+    'UNRATE.csv': 'unemployment_rate',
+    'WPU0851.csv': 'lumber_price'
+}
+
+CRUDE_KPIS = {
+    'DCOILWTICO.csv': 'crude_oil_price',
+    'CPIAUCSL.csv': 'cpi',
+    'GASREGW.csv': 'retail_gas_price',
+    'GDP.csv': 'gdp',
+    'INDPRO.csv': 'indpro',
+    'PPIACO.csv': 'ppi',
+    'TWEXAFEGSMTH.csv': 'usd_index',
+    'UNRATE.csv': 'unrate'
+}
+
+def kpi_version(key):
+    try:
+        if DATA_API_URL:
+            return _api("HEAD", f"observations/{key}").headers["ETag"]
+        return get_bucket().Object(f"observations/{key}").e_tag
+    except Exception as e:
+        print(f" {key} missing → {e}")
+        return None
+
+def kpi_series(key):
+    df = s3_csv_to_df(f"observations/{key}")
+    df.columns = df.columns.str.strip().str.lower()
+    date_col  = 'observation_date' if 'observation_date' in df.columns else 'date'
+    value_col = 'value' if 'value' in df.columns else next(c for c in df.columns if c != date_col)
+    return df[date_col], df[value_col]
+
+def load_and_merge_data(kpi_files=LUMBER_KPIS, freq="W", lags=None, how="latest", end_on=None) -> pd.DataFrame:
+    """Weekly (or daily / business-day) as-of panel of the KPI series.
+
+    how="latest" runs to the newest observation of any series; how="common"
+    stops where the oldest series ends, like the previous inner merge; end_on
+    (a column name, e.g. the model target) stops where that series ends. lags
+    maps column name -> publication lag in days (see alignment.PUBLICATION_LAGS).
+    The aligned panel is cached per set of S3 ETags.
+    """
+    versions = {}
+    for key, col_name in kpi_files.items():
+        etag = kpi_version(key)
+        if etag is not None:
+            versions[col_name] = (key, etag)
+    if not versions:
+        raise RuntimeError("No KPI files were loaded from S3 — nothing to merge.")
+
+    with span("kpi_merge"):
+        return cached_align(versions, lambda col_name: kpi_series(versions[col_name][0]),
+                            freq=freq, lags=lags, how=how, end_on=end_on)
@@ -0,0 +1,147 @@
+# monte_carlo.py
+# CPU Monte Carlo for weekly price moves: i.i.d. bootstrap of historical
+# returns, simulated in fixed-size chunks and reduced to a histogram and an
+# up-probability so memory does not grow with the number of simulations.
+#
+# simulate_joint_chunks() does the same for many assets at once: one
+# stationary block bootstrap (Politis-Romano) draws the week indices and
+# every asset takes the same weeks, so cross-asset correlation and short-run
+# autocorrelation survive. The index draws, which dominate the cost, are
+# shared, so dozens of assets cost little more than one.
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from .profiling import span
+
+CHUNK = 1_000_000
+FIRST_CHUNK = 100_000     # small first chunk so a coarse answer is out quickly
+BINS = 50
+MEAN_BLOCK = 4            # mean block length (weeks) of the stationary bootstrap
+
+def _final_prices(growth, last_price, n, horizon, rng):
+    # one horizon step at a time keeps memory at O(n) for long horizons
+    total = np.zeros(n)
+    for _ in range(horizon):
+        total += growth[rng.integers(0, len(growth), n)]
+    return last_price * np.exp(total)
+
+def simulate_chunks(returns, last_price, n_sims, horizon, bins=BINS, seed=42, chunk=CHUNK):
+    """Yield the running histogram after every chunk; chunk sizes double from
+    FIRST_CHUNK up to chunk. Bin edges are fixed up front so snapshots add up."""
+    growth = np.log1p(np.asarray(returns, dtype=np.float64))
+    rng = np.random.default_rng(seed)
+
+    # bin edges from a pilot sample's tails so the bins are not wasted on
+    # extremes the bootstrap almost never produces
+    pilot = _final_prices(growth, last_price, min(n_sims, 100_000), horizon, rng)
+    lo, hi = np.quantile(pilot, [0.0005, 0.9995])
+    edges = np.linspace(lo, hi, bins + 1)
+
+    counts = np.zeros(bins, dtype=np.int64)
+    ups = 0
+    done = 0
+    size = min(FIRST_CHUNK, chunk)
+    while done < n_sims:
+        n = min(size, n_sims - done)
+        final = _final_prices(growth, last_price, n, horizon, rng)
+        idx = np.clip(((final - lo) * (bins / (hi - lo))).astype(np.int64), 0, bins - 1)
+        counts += np.bincount(idx, minlength=bins)
+        ups += int((final > last_price).sum())
+        done += n
+        size = min(size * 2, chunk)
+        yield {"edges": edges, "counts": counts.copy(), "up_prob": ups / done,
+               "last_price": float(last_price), "n_sims": n_sims, "done": done, "horizon": horizon}
+
+def simulate_histogram(returns, last_price, n_sims, horizon, bins=BINS, seed=42, chunk=CHUNK):
+    for result in simulate_chunks(returns, last_price, n_sims, horizon, bins, seed, chunk):
+        pass
+    return result
+
+# ---------- joint simulation --------------------------------------------------
+
+def _joint_log_returns(growth, n, horizon, block, rng):
+    """(n, assets) summed log growth of n paths. Each step continues the
+    current block with the next week (wrapping around) or, with probability
+    1/block, jumps to a random week; all assets read the same row."""
+    T = len(growth)
+    total = np.zeros((n, growth.shape[1]), dtype=growth.dtype)
+    idx = rng.integers(0, T, n)
+    for step in range(horizon):
+        if step:
+            idx += 1
+            restart = rng.random(n) < 1.0 / block
+            idx[restart] = rng.integers(0, T, int(restart.sum()))
+            idx[idx == T] = 0
+        total += growth[idx]
+    return total
+
+def simulate_joint_chunks(returns, last_prices, n_sims, horizon, bins=BINS, seed=42, chunk=CHUNK,
+                          block=MEAN_BLOCK):
+    """Joint version of simulate_chunks for a (weeks, assets) returns matrix
+    with no gaps. Yields per-asset edges/counts (assets, bins[+1]), up_prob,
+    last_price and the correlation of the simulated log returns. chunk bounds
+    paths x assets per chunk, so memory does not grow with the asset count."""
+    # float32 halves the memory traffic of the gathers, which dominate with many assets
+    growth = np.log1p(np.asarray(returns, dtype=np.float64)).astype(np.float32)
+    last_prices = np.asarray(last_prices, dtype=np.float64)
+    last = last_prices.astype(np.float32)
+    n_assets = growth.shape[1]
+    rng = np.random.default_rng(seed)
+    chunk = max(1, chunk // n_assets)
+
+    pilot = last * np.exp(_joint_log_returns(growth, min(n_sims, 100_000, chunk),
+                                             horizon, block, rng))
+    lo, hi = np.quantile(pilot, [0.0005, 0.9995], axis=0)
+    hi = np.where(hi > lo, hi, lo + 1)           # an asset that never moved
+    edges = np.linspace(lo.astype(float), hi.astype(float), bins + 1).T
+    offset = np.arange(n_assets) * bins
+
+    counts = np.zeros((n_assets, bins), dtype=np.int64)
+    ups = np.zeros(n_assets, dtype=np.int64)
+    s1, s2 = np.zeros(n_assets), np.zeros((n_assets, n_assets))
+    done = 0
+    size = min(FIRST_CHUNK, chunk)
+    while done < n_sims:
+        n = min(size, n_sims - done)
+        total = _joint_log_returns(growth, n, horizon, block, rng)
+        final = last * np.exp(total)
+        idx = np.clip(((final - lo) * (bins / (hi - lo))).astype(np.int64), 0, bins - 1) + offset
+        counts += np.bincount(idx.ravel(), minlength=n_assets * bins).reshape(n_assets, bins)
+        ups += (total > 0).sum(axis=0)
+        s1 += total.sum(axis=0, dtype=np.float64)
+        s2 += (total.T @ total).astype(np.float64)
+        done += n
+        size = min(size * 2, chunk)
+        cov = s2 / done - np.outer(s1, s1) / done**2
+        sd = np.sqrt(np.clip(np.diag(cov), 1e-300, None))
+        yield {"edges": edges, "counts": counts.copy(), "up_prob": ups / done, "last_price": last_prices,
+               "corr": np.clip(cov / np.outer(sd, sd), -1.0, 1.0), "n_sims": n_sims, "done": done,
+               "horizon": horizon}
+
+def simulate_joint(returns, last_prices, n_sims, horizon, bins=BINS, seed=42, chunk=CHUNK, block=MEAN_BLOCK):
+    for result in simulate_joint_chunks(returns, last_prices, n_sims, horizon, bins, seed, chunk, block):
+        pass
+    return result
+
+def write_mc_artifacts(merged: pd.DataFrame, price_col: str, name: str, data_dir: Path,
+                       assets_dir: Path, n_sims=10_000_000, horizon=4) -> dict:
+    """Simulate `horizon` weeks ahead and write {name}_mc_flag.txt and {name}_mc_hist.png."""
+    # Figure directly rather than pyplot: stages may plot from several threads
+    from matplotlib.figure import Figure
+
+    prices = merged[price_col].dropna()
+    with span("simulate"):
+        result = simulate_histogram(prices.pct_change().dropna(), prices.iloc[-1], n_sims, horizon)
+    (data_dir / f"{name}_mc_flag.txt").write_text(str(int(result["up_prob"] > 0.5)))
+
+    edges = result["edges"]
+    fig = Figure(figsize=(8,6))
+    ax = fig.subplots()
+    ax.bar(edges[:-1], result["counts"], width=np.diff(edges), align="edge", color='skyblue', edgecolor='black')
+    ax.axvline(result["last_price"], color='red', linestyle='--', label='Current Price')
+    ax.set_title(f"{name.title()} Price Distribution After {horizon} Weeks (up: {result['up_prob']:.2%})")
+    ax.set_xlabel('Simulated Price')
+    ax.set_ylabel('Frequency')
+    ax.legend()
+    fig.savefig(assets_dir / f"{name}_mc_hist.png", dpi=150, bbox_inches="tight")
+    return result
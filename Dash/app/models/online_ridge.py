@@ -0,0 +1,193 @@
+# online_ridge.py
+# StandardScaler + Ridge kept as sufficient statistics, so the currency
+# regressor absorbs each new daily row in O(features^2) instead of refitting
+# on the whole history.
+#
+#   model = fit_or_update("usd_krw", df["observation_date"], X, y)
+#   scaler, reg = model.to_sklearn()        # drop-in for the fitted pair
+#
+# The state is the row count, the feature and target means and the centered
+# scatter matrices Sxx = sum (x - mean)(x - mean)' and Sxy, updated with
+# Welford's recurrences. Standardizing then penalizing is the same as solving
+#   (D^-1 Sxx D^-1 + alpha I) w = D^-1 Sxy,   D = diag(feature std)
+# which is what Ridge(alpha).fit(StandardScaler().fit_transform(X), y) solves,
+# so coefficients match a full refit to rounding. The state is saved per
+# currency next to the other model caches. Whenever the history or the feature
+# set changes underneath it, it is rebuilt from the full history; every
+# REFIT_EVERY absorbed rows it is rebuilt too, and the drift of the online fit
+# over the same rows is logged.
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.preprocessing import StandardScaler
+
+STATE_DIR = Path(__file__).resolve().parents[1] / "data" / ".ridge_state"
+REFIT_EVERY = 250          # absorbed rows between full refits (about a year of business days)
+
+
+class OnlineRidge:
+    def __init__(self, features, alpha=1.0):
+        self.features = list(features)
+        self.alpha = float(alpha)
+        p = len(self.features)
+        self.n = 0
+        self.mean_x = np.zeros(p)
+        self.mean_y = 0.0
+        self.sxx = np.zeros((p, p))
+        self.sxy = np.zeros(p)
+        self.last_date = None          # newest observation absorbed, as datetime64[D]
+        self.since_refit = 0
+        self.rows_hash = None          # digest of the (date, X, y) rows absorbed, see row_hashes()
+        self._solution = None
+
+    # ---------- statistics ------------------------------------------------
+
+    @classmethod
+    def fit(cls, X, y, features, alpha=1.0, last_date=None):
+        """State of a full fit on (X, y)."""
+        model = cls(features, alpha)
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        model.n = len(y)
+        model.mean_x = X.mean(axis=0)
+        model.mean_y = float(y.mean())
+        Xc = X - model.mean_x
+        model.sxx = Xc.T @ Xc
+        model.sxy = Xc.T @ (y - model.mean_y)
+        model.last_date = last_date
+        return model
+
+    def update(self, x, y, date=None):
+        """Absorb one observation; O(features^2)."""
+        x = np.asarray(x, dtype=np.float64)
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.sxx += np.outer(dx, x - self.mean_x)
+        self.sxy += dx * (y - self.mean_y)
+        if date is not None:
+            self.last_date = date
+        self.since_refit += 1
+        self._solution = None
+
+    # ---------- solution --------------------------------------------------
+
+    @property
+    def scale_(self):
+        std = np.sqrt(np.clip(np.diag(self.sxx) / max(self.n, 1), 0.0, None))
+        return np.where(std > 0, std, 1.0)      # as StandardScaler: constant features are left unscaled
+
+    def _solve(self):
+        if self._solution is None:
+            d = self.scale_
+            A = self.sxx / np.outer(d, d) + self.alpha * np.eye(len(d))
+            self._solution = np.linalg.solve(A, self.sxy / d)
+        return self._solution
+
+    @property
+    def coef_(self):
+        """Coefficients on the standardized features, like Ridge.coef_."""
+        return self._solve()
+
+    @property
+    def intercept_(self):
+        return self.mean_y          # standardized features have mean zero
+
+    def predict(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_x) / self.scale_ @ self.coef_ + self.intercept_
+
+    def to_sklearn(self):
+        """(StandardScaler, Ridge) fitted to the current state, for code that expects the pair."""
+        scaler = StandardScaler()
+        scaler.mean_, scaler.scale_ = self.mean_x.copy(), self.scale_
+        scaler.var_ = np.diag(self.sxx) / max(self.n, 1)
+        scaler.n_samples_seen_ = self.n
+        scaler.n_features_in_ = len(self.features)
+        reg = Ridge(alpha=self.alpha)
+        reg.coef_, reg.intercept_ = self.coef_.copy(), self.intercept_
+        reg.n_features_in_ = len(self.features)
+        if all(isinstance(f, str) for f in self.features):
+            scaler.feature_names_in_ = np.asarray(self.features, dtype=object)
+        return scaler, reg
+
+    # ---------- persistence -----------------------------------------------
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"features": self.features, "alpha": self.alpha, "n": self.n, "mean_y": self.mean_y,
+                "since_refit": self.since_refit, "rows_hash": self.rows_hash,
+                "last_date": None if self.last_date is None else str(self.last_date)}
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, mean_x=self.mean_x, sxx=self.sxx, sxy=self.sxy, meta=json.dumps(meta))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        if not Path(path).exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            model = cls(meta["features"], meta["alpha"])
+            model.mean_x, model.sxx, model.sxy = data["mean_x"], data["sxx"], data["sxy"]
+        model.n, model.mean_y, model.since_refit = meta["n"], meta["mean_y"], meta["since_refit"]
+        model.rows_hash = meta.get("rows_hash")
+        model.last_date = None if meta["last_date"] is None else np.datetime64(meta["last_date"], "D")
+        return model
+
+
+def row_hashes(dates, X, y):
+    """(n x 3) per-row hashes of the dates, features and target."""
+    return np.column_stack([pd.util.hash_array(np.asarray(dates, dtype="datetime64[D]").astype(np.int64)),
+                            pd.util.hash_pandas_object(X, index=False).to_numpy(),
+                            pd.util.hash_array(np.asarray(y, dtype=np.float64))])
+
+
+def _digest(hashes):
+    return hashlib.sha256(np.ascontiguousarray(hashes).tobytes()).hexdigest()
+
+
+def fit_or_update(key, dates, X, y, alpha=1.0, state_dir=STATE_DIR, refit_every=REFIT_EVERY):
+    """OnlineRidge for X (a DataFrame) and y over the history up to dates[-1]:
+    the saved state plus the rows newer than it, or a full refit when there is
+    no usable state or a refit is due."""
+    path = Path(state_dir) / f"{key}.npz"
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    features = list(X.columns)
+    Xv, yv = X.to_numpy(dtype=np.float64), np.asarray(y, dtype=np.float64)
+    model = OnlineRidge.load(path)
+    hashes = row_hashes(dates, X, yv)
+
+    new = None
+    if model is not None and model.features == features and model.alpha == alpha \
+            and model.last_date is not None and model.last_date <= dates[-1]:
+        new = np.flatnonzero(dates > model.last_date)
+        # rows at or before the saved date must be what the state was built from: a
+        # revision to a past value keeps the count, so the rows' digest is compared too
+        if len(dates) - len(new) != model.n or _digest(hashes[:model.n]) != model.rows_hash:
+            new = None
+
+    if new is not None and model.since_refit + len(new) < refit_every:
+        if not len(new):
+            return model
+        for i in new:
+            model.update(Xv[i], yv[i], dates[i])
+    else:
+        fresh = OnlineRidge.fit(Xv, yv, features, alpha, dates[-1])
+        if new is not None:
+            # a refit that is merely due: bring the online state to the same rows, then compare
+            for i in new:
+                model.update(Xv[i], yv[i], dates[i])
+            drift = np.abs(fresh.coef_ - model.coef_).max()
+            print(f"[Ridge] {key}: full refit on {fresh.n} rows, online drift {drift:.2e}", flush=True)
+        model = fresh
+    model.rows_hash = _digest(hashes)
+    model.save(path)
+    return model
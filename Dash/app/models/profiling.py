@@ -0,0 +1,251 @@
+# profiling.py
+# Opt-in stage profiling for the models and the dashboard.
+#
+#   with profiling.run("macro:usd_krw"):          # one report per run
+#       with profiling.span("fit_rf"):             # named stage inside it
+#           ...
+#
+# Each span records wall and CPU time (of its thread), bytes handed to
+# span.add_bytes() and, with CALLIGO_PROFILE=memory, the tracemalloc peak
+# above its start (process-wide, so concurrent threads can inflate it).
+# Spans nest: a span inside "build_forecast" is reported as
+# "build_forecast/fit_rf". The last runs are kept for the /debug page and
+# totals per stage are kept across runs.
+#
+# Disabled (the default) a span is a flag check. capture() additionally
+# writes a cProfile .prof and a sampled .folded stack file (flamegraph.pl or
+# speedscope input) for one block of code.
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+PROFILE_DIR = Path(__file__).resolve().parents[1] / "data" / ".profiles"
+MODE = os.environ.get("CALLIGO_PROFILE", "")      # "", "1" or "memory"
+KEEP_RUNS = 50
+SAMPLE_INTERVAL = 0.005
+
+_local = threading.local()
+_lock = threading.Lock()
+RUNS = deque(maxlen=KEEP_RUNS)
+TOTALS = {}                 # stage -> [calls, wall, cpu, bytes, peak]
+
+
+def enabled():
+    return bool(MODE)
+
+
+def enable(mode="1"):
+    """Turn profiling on ("1", or "memory" to also trace allocations) or off ("")."""
+    global MODE
+    MODE = mode
+    if mode == "memory" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif mode != "memory" and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if MODE == "memory":
+    tracemalloc.start()
+
+
+class Span:
+    __slots__ = ("name", "wall", "cpu", "bytes", "peak", "mem_start", "error")
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = self.cpu = 0.0
+        self.bytes = 0
+        self.peak = None
+        self.mem_start = None
+        self.error = None
+
+    def add_bytes(self, n):
+        self.bytes += int(n)
+
+
+class _NoSpan:
+    def add_bytes(self, n):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Run:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.wall = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def report(self):
+        """One row per stage: calls, wall/CPU seconds, bytes, peak MB and share of the run's wall time."""
+        with self._lock:
+            rows = [(s.name, s.wall, s.cpu, s.bytes, s.peak) for s in self.spans]
+        df = pd.DataFrame(rows, columns=["stage", "wall_s", "cpu_s", "bytes", "peak_mb"])
+        df["peak_mb"] = df["peak_mb"].astype(float) / 2**20
+        report = df.groupby("stage", sort=False).agg(
+            calls=("wall_s", "size"), wall_s=("wall_s", "sum"), cpu_s=("cpu_s", "sum"),
+            bytes=("bytes", "sum"), peak_mb=("peak_mb", "max")).reset_index()
+        report["share"] = report["wall_s"] / self.wall if self.wall else None
+        return report
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def span(name):
+    """Time one pipeline stage; yields an object with add_bytes(n)."""
+    if not MODE:
+        yield NO_SPAN
+        return
+    stack = _stack()
+    record = Span("/".join([s.name for s in stack[-1:]] + [name]))
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        for parent in stack:             # fold the peak so far into the open spans
+            if parent.mem_start is not None:
+                parent.peak = max(parent.peak or 0, peak - parent.mem_start)
+        tracemalloc.reset_peak()
+        record.mem_start = current
+    stack.append(record)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.wall = time.perf_counter() - wall
+        record.cpu = time.thread_time() - cpu
+        stack.pop()
+        if tracing and tracemalloc.is_tracing():
+            record.peak = max(record.peak or 0, tracemalloc.get_traced_memory()[1] - record.mem_start)
+            if stack and stack[-1].mem_start is not None:
+                stack[-1].peak = max(stack[-1].peak or 0, record.peak + record.mem_start - stack[-1].mem_start)
+        _record(record)
+
+
+def _record(record):
+    run_ = getattr(_local, "run", None)
+    if run_ is not None:
+        run_.add(record)
+    with _lock:
+        total = TOTALS.setdefault(record.name, [0, 0.0, 0.0, 0, 0])
+        total[0] += 1
+        total[1] += record.wall
+        total[2] += record.cpu
+        total[3] += record.bytes
+        total[4] = max(total[4], record.peak or 0)
+
+
+@contextmanager
+def run(name):
+    """Group the spans of this thread into one report, kept in RUNS."""
+    if not MODE:
+        yield None
+        return
+    outer = getattr(_local, "run", None)
+    current = _local.run = Run(name)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.wall = time.perf_counter() - start
+        _local.run = outer
+        with _lock:
+            RUNS.append(current)
+
+
+def profiled(name=None):
+    """Decorator form of span()."""
+    def wrap(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def totals():
+    with _lock:
+        rows = [(k, *v) for k, v in TOTALS.items()]
+    df = pd.DataFrame(rows, columns=["stage", "calls", "wall_s", "cpu_s", "bytes", "peak_mb"])
+    df["peak_mb"] = df["peak_mb"] / 2**20
+    return df.sort_values("wall_s", ascending=False, ignore_index=True)
+
+
+def runs():
+    with _lock:
+        return list(RUNS)
+
+
+def reset():
+    with _lock:
+        RUNS.clear()
+        TOTALS.clear()
+
+
+# ---------- on-demand capture -------------------------------------------------
+
+def _sample(thread_id, stop, counts):
+    me = threading.get_ident()
+    while not stop.wait(SAMPLE_INTERVAL):
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (thread_id is not None and ident != thread_id):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+
+
+@contextmanager
+def capture(name, out_dir=PROFILE_DIR, all_threads=False):
+    """cProfile the block into {name}.prof and sample its stacks into
+    {name}.folded; yields the paths. cProfile only sees the calling thread;
+    with all_threads the sampler covers every thread (e.g. pool workers)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {"prof": out_dir / f"{name}.prof", "folded": out_dir / f"{name}.folded"}
+    counts, stop = {}, threading.Event()
+    target = None if all_threads else threading.get_ident()
+    sampler = threading.Thread(target=_sample, args=(target, stop, counts), daemon=True)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield paths
+    finally:
+        profiler.disable()
+        stop.set()
+        sampler.join()
+        profiler.dump_stats(paths["prof"])
+        paths["folded"].write_text("".join(f"{k} {v}\n" for k, v in sorted(counts.items())))
+        print(f"[Profile] {name}: {paths['prof']} and {paths['folded']}", flush=True)
@@ -0,0 +1,228 @@
+# tuning.py
+# Time-series cross-validated hyperparameter search for the lumber
+# XGBClassifier and the currency RandomForestClassifier.
+#
+#   cd Dash/app
+#   python -m models.tuning lumber --trials 40 --splits 5 --save
+#   python -m models.tuning usd_krw --trials 20 --workers 8 --save
+#
+# Trials run on a process pool. XGBoost trains with tree_method='hist' on a
+# QuantileDMatrix built once per fold in each worker and reused by every
+# trial. Each trial's score is stored on disk under a key made of the data
+# fingerprint, the CV layout and the params, so after a data refresh only
+# trials on the new data are evaluated and re-running a search is free.
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .backtest import LABEL_HORIZON, walk_forward_splits
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+CACHE_DIR = DATA_DIR / ".tuning_cache"
+TUNED_PARAMS_FILE = DATA_DIR / "tuned_params.json"
+MAX_BIN = 256
+
+XGB_SPACE = {
+    "n_estimators": [50, 100, 200, 400],
+    "max_depth": [2, 3, 4, 6],
+    "learning_rate": [0.03, 0.05, 0.1, 0.2],
+    "scale_pos_weight": [1, 1.5, 2],
+    "subsample": [0.7, 0.85, 1.0],
+    "colsample_bytree": [0.7, 0.85, 1.0],
+    "min_child_weight": [1, 3, 5],
+}
+
+RF_SPACE = {
+    "n_estimators": [100, 200, 400],
+    "max_depth": [None, 4, 8, 16],
+    "min_samples_leaf": [1, 5, 20],
+    "max_features": ["sqrt", 0.5, 1.0],
+}
+
+_DATA = {}
+
+
+# ---------- trials --------------------------------------------------------
+
+def sample_trials(space, n_trials, seed=42):
+    """n_trials distinct points of the grid, in a seed-stable order."""
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    random.Random(seed).shuffle(grid)
+    return grid[:n_trials]
+
+
+def fingerprint(X, y):
+    h = hashlib.sha256()
+    h.update(str(X.shape).encode())
+    h.update(np.ascontiguousarray(X).tobytes())
+    h.update(np.ascontiguousarray(y).tobytes())
+    return h.hexdigest()[:16]
+
+
+def trial_key(model, data_fp, folds, params):
+    payload = json.dumps({"model": model, "data": data_fp, "max_bin": MAX_BIN, "purge": LABEL_HORIZON,
+                          "folds": [(f.train_start, f.train_end, f.test_end) for f in folds],
+                          "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _load_cached(key):
+    path = CACHE_DIR / f"{key}.json"
+    if path.exists():
+        return json.loads(path.read_text())
+    return None
+
+
+def _store(key, result):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_DIR / f"{key}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(result))
+    os.replace(tmp, CACHE_DIR / f"{key}.json")
+
+
+# ---------- fold evaluation (worker side) ----------------------------------
+
+def _init_worker(model, X, y, folds):
+    _DATA.update(model=model, X=np.ascontiguousarray(X, dtype=np.float32), y=y, folds=folds, dtrain={})
+
+
+def _train_rows(fold):
+    # purged like backtest._run_fold: the last labels look into the test rows
+    return slice(fold.train_start, fold.train_end - LABEL_HORIZON)
+
+
+def _xgb_train_matrix(fold):
+    # binned once per fold and process, then shared by every trial
+    import xgboost as xgb
+
+    cache = _DATA["dtrain"]
+    if fold.index not in cache:
+        rows = _train_rows(fold)
+        cache[fold.index] = xgb.QuantileDMatrix(_DATA["X"][rows], label=_DATA["y"][rows], max_bin=MAX_BIN)
+    return cache[fold.index]
+
+
+def _xgb_predict(params, fold):
+    import xgboost as xgb
+
+    p = dict(params)
+    rounds = p.pop("n_estimators", 100)
+    booster = xgb.train({"objective": "binary:logistic", "tree_method": "hist", "max_bin": MAX_BIN,
+                         "nthread": 1, "seed": 42, "eta": p.pop("learning_rate", 0.3), **p},
+                        _xgb_train_matrix(fold), num_boost_round=rounds)
+    test = slice(fold.train_end, fold.test_end)
+    return booster.inplace_predict(_DATA["X"][test])
+
+
+def _rf_predict(params, fold):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rows = _train_rows(fold)
+    clf = RandomForestClassifier(random_state=42, n_jobs=1, **params).fit(_DATA["X"][rows], _DATA["y"][rows])
+    proba = clf.predict_proba(_DATA["X"][fold.train_end:fold.test_end])
+    return proba[:, list(clf.classes_).index(1)] if 1 in clf.classes_ else np.zeros(len(proba))
+
+
+PREDICTORS = {"xgb": _xgb_predict, "rf": _rf_predict}
+
+
+def _run_trial(params):
+    start = time.perf_counter()
+    accs, losses = [], []
+    for fold in _DATA["folds"]:
+        proba = np.clip(PREDICTORS[_DATA["model"]](params, fold), 1e-7, 1 - 1e-7)
+        actual = _DATA["y"][fold.train_end:fold.test_end]
+        accs.append(float(((proba > 0.5) == actual).mean()))
+        losses.append(float(-np.mean(actual * np.log(proba) + (1 - actual) * np.log(1 - proba))))
+    return {"params": params, "accuracy": float(np.mean(accs)), "log_loss": float(np.mean(losses)),
+            "fold_accuracy": accs, "seconds": round(time.perf_counter() - start, 3)}
+
+
+# ---------- search ----------------------------------------------------------
+
+def time_series_folds(n, n_splits=5):
+    """Expanding folds like sklearn's TimeSeriesSplit: n_splits equal test blocks."""
+    test_size = n // (n_splits + 1)
+    return walk_forward_splits(n, n - n_splits * test_size, test_size)
+
+
+def search(model, X, y, trials, n_splits=5, workers=None):
+    """Evaluate trials (list of param dicts), reusing cached scores; best first by log loss."""
+    folds = time_series_folds(len(X), n_splits)
+    data_fp = fingerprint(X, y)
+    keys = [trial_key(model, data_fp, folds, p) for p in trials]
+    results = {k: _load_cached(k) for k in keys}
+    todo = [(k, p) for k, p in zip(keys, trials) if results[k] is None]
+    print(f"[Tuning] {model}: {len(trials)} trials, {len(trials) - len(todo)} cached, "
+          f"{len(folds)} folds, data {data_fp}", flush=True)
+
+    if todo:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model, X, y, folds)) as ex:
+            for (key, _), result in zip(todo, ex.map(_run_trial, [p for _, p in todo])):
+                _store(key, result)
+                results[key] = result
+                print(f"[Tuning] acc={result['accuracy']:.4f} logloss={result['log_loss']:.4f} "
+                      f"{result['params']} ({result['seconds']}s)", flush=True)
+
+    return sorted((results[k] for k in keys), key=lambda r: r["log_loss"])
+
+
+# ---------- tuned params used by the models --------------------------------
+
+def load_tuned(name, defaults):
+    """defaults overridden by the params saved for name, if any."""
+    if TUNED_PARAMS_FILE.exists():
+        saved = json.loads(TUNED_PARAMS_FILE.read_text()).get(name)
+        if saved:
+            return {**defaults, **saved}
+    return dict(defaults)
+
+
+def save_tuned(name, params):
+    saved = json.loads(TUNED_PARAMS_FILE.read_text()) if TUNED_PARAMS_FILE.exists() else {}
+    saved[name] = params
+    tmp = TUNED_PARAMS_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(saved, indent=2, sort_keys=True))
+    os.replace(tmp, TUNED_PARAMS_FILE)
+
+
+def main():
+    from .backtest import currency_matrices, lumber_matrices
+
+    parser = argparse.ArgumentParser(description="Time-series CV hyperparameter search.")
+    parser.add_argument("target", help="'lumber' (XGBClassifier) or a currency code (RandomForest)")
+    parser.add_argument("--trials", type=int, default=30)
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", action="store_true", help="store the best params for the model to use")
+    args = parser.parse_args()
+
+    if args.target == "lumber":
+        _, X, targets = lumber_matrices()
+        model, space, name = "xgb", XGB_SPACE, "lumber_xgb"
+    else:
+        _, X, targets = currency_matrices(args.target)
+        model, space, name = "rf", RF_SPACE, f"{args.target}_rf"
+
+    ranked = search(model, X, targets["direction"], sample_trials(space, args.trials, args.seed),
+                    args.splits, args.workers)
+    best = ranked[0]
+    print(f"[Tuning] best: acc={best['accuracy']:.4f} logloss={best['log_loss']:.4f} {best['params']}", flush=True)
+    if args.save:
+        save_tuned(name, best["params"])
+        print(f"[Tuning] saved {name} params to {TUNED_PARAMS_FILE}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
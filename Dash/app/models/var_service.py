@@ -0,0 +1,232 @@
+# var_service.py
+# KRW/USD VAR forecast as a cached service instead of a notebook run.
+#
+# The expensive parts - screening every daily series for the ones most
+# correlated with the target, and choosing the lag order - only happen on a
+# refit (every REFIT_EVERY, or when forced). The selected columns, lag order
+# and coefficient matrices are stored per input-panel hash; in between,
+# forecasts apply the stored coefficients to the latest k_ar rows of just
+# the selected series.
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .daily_panel import build_daily_panel
+from .merge_fred_files import get_bucket, s3_csv_to_df
+from .profiling import span
+
+CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / ".var_cache"
+METADATA_KEY = "metadata/all_series_metadata.csv"
+REFIT_EVERY = timedelta(days=7)
+MAX_LAGS = 15
+N_VARIABLES = 30
+NAN_THRESHOLD = 0.01      # keep columns with at least 1% observations, as in VAR.ipynb
+# screen with SQL over the store (warehouse.py) instead of loading every daily series
+SCREEN_IN_WAREHOUSE = bool(os.environ.get("FRED_WAREHOUSE"))
+
+
+class VarModel:
+    def __init__(self, columns, k_ar, intercept, coefs, panel_hash, fitted_at, scores=None):
+        self.columns = list(columns)
+        self.k_ar = int(k_ar)
+        self.intercept = np.asarray(intercept)       # (k,)
+        self.coefs = np.asarray(coefs)               # (k_ar, k, k); coefs[i] multiplies y[t-i-1]
+        self.panel_hash = panel_hash
+        self.fitted_at = fitted_at
+        self.scores = scores or {}
+
+    def forecast(self, history, steps):
+        """Iterate y_t = c + sum_i A_i y_{t-i} from the last k_ar rows of history."""
+        window = [np.asarray(row, dtype=np.float64) for row in np.asarray(history)[-self.k_ar:]]
+        out = []
+        for _ in range(steps):
+            y = self.intercept.copy()
+            for i in range(self.k_ar):
+                y += self.coefs[i] @ window[-1 - i]
+            out.append(y)
+            window.append(y)
+        return np.array(out)
+
+    def save(self, path):
+        tmp = Path(f"{path}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, intercept=self.intercept, coefs=self.coefs,
+                 meta=json.dumps({"columns": self.columns, "k_ar": self.k_ar, "panel_hash": self.panel_hash,
+                                  "fitted_at": self.fitted_at.isoformat(), "scores": self.scores}))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        if not Path(path).exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(meta["columns"], meta["k_ar"], data["intercept"], data["coefs"], meta["panel_hash"],
+                       datetime.fromisoformat(meta["fitted_at"]), {int(p): s for p, s in meta["scores"].items()})
+
+
+# ---------- estimation ----------------------------------------------------
+
+def lagged_design(Y, maxlags):
+    """[1, y_{t-1}, ..., y_{t-maxlags}] for t = maxlags..T-1; lag blocks are contiguous
+    so the design of any p <= maxlags is a column prefix."""
+    T, k = Y.shape
+    X = np.empty((T - maxlags, 1 + k * maxlags))
+    X[:, 0] = 1.0
+    for i in range(1, maxlags + 1):
+        X[:, 1 + k * (i - 1):1 + k * i] = Y[maxlags - i:T - i]
+    return X, Y[maxlags:]
+
+
+def _ols(X, Y):
+    beta, *_ = np.linalg.lstsq(X, Y, rcond=None)
+    resid = Y - X @ beta
+    return beta, resid
+
+
+def _info_criteria(resid, p, k):
+    nobs = resid.shape[0]
+    _, logdet = np.linalg.slogdet(resid.T @ resid / nobs)
+    free_params = p * k * k + k
+    return {"aic": logdet + 2.0 / nobs * free_params,
+            "bic": logdet + np.log(nobs) / nobs * free_params,
+            "hqic": logdet + 2.0 * np.log(np.log(nobs)) / nobs * free_params}
+
+
+def select_lag_order(Y, maxlags=MAX_LAGS, ic="aic", workers=None):
+    """Score every lag order 1..maxlags on the same sample (like statsmodels'
+    select_order) in parallel; the shared design matrix is built once."""
+    Y = np.asarray(Y, dtype=np.float64)
+    k = Y.shape[1]
+    X, target = lagged_design(Y, maxlags)
+
+    def score(p):
+        _, resid = _ols(X[:, :1 + k * p], target)
+        return p, _info_criteria(resid, p, k)
+
+    # lstsq runs in LAPACK with the GIL released, so threads overlap the fits
+    with ThreadPoolExecutor(max_workers=workers or min(maxlags, os.cpu_count() or 1)) as ex:
+        scores = dict(ex.map(score, range(1, maxlags + 1)))
+    best = min(scores, key=lambda p: scores[p][ic])
+    return best, {p: s[ic] for p, s in scores.items()}
+
+
+def fit_var(df_diff, maxlags=MAX_LAGS, ic="aic", panel_hash=None, workers=None):
+    Y = df_diff.to_numpy(dtype=np.float64)
+    k = Y.shape[1]
+    p, scores = select_lag_order(Y, maxlags, ic, workers)
+    X, target = lagged_design(Y, p)
+    beta, _ = _ols(X, target)
+    coefs = beta[1:].reshape(p, k, k).transpose(0, 2, 1)
+    return VarModel(df_diff.columns, p, beta[0], coefs, panel_hash or frame_hash(df_diff),
+                    datetime.now(timezone.utc), scores)
+
+
+def frame_hash(df):
+    h = hashlib.sha256()
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(np.ascontiguousarray(df.index.values).tobytes())
+    h.update(np.ascontiguousarray(df.to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()[:20]
+
+
+# ---------- data ----------------------------------------------------------
+
+def _daily_metadata():
+    meta = s3_csv_to_df(METADATA_KEY)
+    meta = meta[~meta["title"].str.upper().str.contains("DISCONTINUED", na=False)]
+    return meta[meta["frequency"].str.contains("Daily", na=False)].set_index("id")
+
+
+def _load_series(series_id):
+    return s3_csv_to_df(f"observations/{series_id}.csv")[["date", "value"]]
+
+
+def load_levels(series_ids, start, end=None):
+    end = end or pd.Timestamp.today().normalize()
+    return build_daily_panel(series_ids, _load_series, start, end)
+
+
+def screen_variables(target, k=N_VARIABLES):
+    """Target plus the k daily series most correlated with it (the notebook's screen)."""
+    if SCREEN_IN_WAREHOUSE:
+        from .warehouse import Warehouse
+
+        return Warehouse().top_correlated(target, k=k, frequency="Daily").index.tolist()[:k + 1]
+    meta = _daily_metadata()
+    available = {o.key.split("/")[-1][:-4] for o in get_bucket().objects.filter(Prefix="observations/")
+                 if o.key.endswith(".csv")}
+    ids = sorted(set(meta.index.astype(str)) & available)
+    starts = pd.to_datetime(meta.loc[ids, "observation_start"], errors="coerce")
+    panel = load_levels(ids, starts.min())
+    return panel.top_correlated(target, k=k).index.tolist()[:k + 1]
+
+
+def prepare(levels):
+    """Drop near-empty columns, then difference on the rows where every column is observed."""
+    valid = levels.isna().mean() < (1 - NAN_THRESHOLD)
+    filtered = levels[valid[valid].index]
+    return filtered, filtered.diff().dropna()
+
+
+# ---------- service ---------------------------------------------------------
+
+def _current_path(target):
+    return CACHE_DIR / f"{target}_current.json"
+
+
+def current_model(target):
+    """(model, time of the last refit) for target, or (None, None)."""
+    path = _current_path(target)
+    if not path.exists():
+        return None, None
+    current = json.loads(path.read_text())
+    return (VarModel.load(CACHE_DIR / f"{current['panel_hash']}.npz"),
+            datetime.fromisoformat(current["refit_at"]))
+
+
+def refit(target="DEXKOUS", workers=None):
+    with span("screen"):
+        variables = screen_variables(target)
+    with span("load_levels"):
+        levels = load_levels(variables, "1900-01-01").frame()
+    _, df_diff = prepare(levels)
+    panel_hash = frame_hash(df_diff)
+    model = VarModel.load(CACHE_DIR / f"{panel_hash}.npz")
+    if model is None:
+        with span("fit_var"):
+            model = fit_var(df_diff, panel_hash=panel_hash, workers=workers)
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        model.save(CACHE_DIR / f"{panel_hash}.npz")
+    _current_path(target).write_text(json.dumps({"panel_hash": panel_hash,
+                                                 "refit_at": datetime.now(timezone.utc).isoformat()}))
+    print(f"[VAR] {target}: k_ar={model.k_ar}, {len(model.columns)} series, panel {panel_hash}", flush=True)
+    return model, levels
+
+
+def var_forecast(target="DEXKOUS", steps=5, refit_every=REFIT_EVERY, force_refit=False, history_days=365):
+    """Last year of the target plus a steps-day forecast, as a (date, target) frame."""
+    model, refit_at = (None, None) if force_refit else current_model(target)
+    if model is None or datetime.now(timezone.utc) - refit_at > refit_every:
+        with span("refit"):
+            model, levels = refit(target)
+    else:
+        with span("load_levels"):
+            levels = load_levels(model.columns, "1900-01-01").frame(model.columns)
+
+    # same columns the coefficients were fitted on, without re-filtering
+    selected = levels[model.columns]
+    with span("forecast"):
+        steps_diff = model.forecast(selected.diff().dropna().to_numpy(dtype=np.float64), steps)
+    last_row = selected.dropna().iloc[-1]
+    index = pd.date_range(levels.index[-1] + pd.Timedelta(days=1), periods=steps)
+    forecast_actual = pd.DataFrame(steps_diff, index=index, columns=model.columns).cumsum() + last_row
+
+    actual_past = levels[[target]].loc[levels.index[-1] - pd.Timedelta(days=history_days - 1):]
+    df_plot = pd.concat([actual_past, forecast_actual[[target]]])
+    return df_plot.rename_axis("date").reset_index()
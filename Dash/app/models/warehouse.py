@@ -0,0 +1,187 @@
+# warehouse.py
+# Embedded DuckDB query layer over the observation store. Observation files
+# (the crawler's observations/*.csv, or a Parquet export of them) and the
+# series metadata are registered as views and read in place, from local
+# disk or S3, so cross-series work - panels, latest values, correlation
+# screening - runs as multi-threaded SQL instead of materializing every
+# series in pandas. DuckDB spills to temp_dir when a join or pivot does not
+# fit in memory_limit.
+#
+#   wh = Warehouse("s3://fred/observations")         # or a local dir / .parquet
+#   wh.panel(["DEXKOUS", "DGS10"], start="2020-01-01", freq="W")
+#   wh.top_correlated("DEXKOUS", k=30, frequency="Daily")
+#
+# Queries that name their series only open those files; for repeated
+# full-store scans, export_parquet() writes one Parquet file sorted by
+# series_id and date so row-group statistics prune everything else.
+import os
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from .merge_fred_files import aws_access_key_id, aws_secret_access_key, bucket_name, endpoint_url
+
+WAREHOUSE_ROOT = os.environ.get("FRED_WAREHOUSE", f"s3://{bucket_name}/observations")
+METADATA_PATH = os.environ.get("FRED_WAREHOUSE_METADATA", f"s3://{bucket_name}/metadata/all_series_metadata.csv")
+TEMP_DIR = Path(__file__).resolve().parents[1] / "data" / ".duckdb_tmp"
+
+COLUMNS = "{'series_id': 'VARCHAR', 'date': 'DATE', 'value': 'DOUBLE'}"
+# label of the period holding each date, matching pandas resample() labels
+PERIODS = {"W": "week", "M": "month", "Q": "quarter", "A": "year", "Y": "year"}
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _date(value):
+    return _quote(pd.Timestamp(value).date().isoformat())
+
+
+class Warehouse:
+    def __init__(self, root=WAREHOUSE_ROOT, metadata=METADATA_PATH, threads=None, memory_limit=None,
+                 temp_dir=TEMP_DIR):
+        self.root = str(root).rstrip("/")
+        self.parquet = self.root.endswith(".parquet")
+        self._listed = None               # observation files under an s3:// root, listed once
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = {_quote(memory_limit)}")
+        if temp_dir:
+            Path(temp_dir).mkdir(parents=True, exist_ok=True)
+            self.con.execute(f"SET temp_directory = {_quote(temp_dir)}")
+        if self.root.startswith("s3://") or str(metadata or "").startswith("s3://"):
+            self._configure_s3()
+
+        self.con.execute(f"CREATE VIEW observations AS SELECT * FROM {self._source()}")
+        self.has_metadata = bool(metadata) and (str(metadata).startswith("s3://") or os.path.exists(metadata))
+        if self.has_metadata:
+            self.con.execute(f"CREATE VIEW metadata AS SELECT * FROM read_csv({_quote(metadata)}, "
+                             "header = true, all_varchar = true)")
+
+    def _configure_s3(self):
+        self.con.execute("INSTALL httpfs")
+        self.con.execute("LOAD httpfs")
+        endpoint = endpoint_url.split("://", 1)[-1].rstrip("/")
+        self.con.execute(f"""CREATE SECRET fred_s3 (TYPE s3, KEY_ID {_quote(aws_access_key_id)},
+            SECRET {_quote(aws_secret_access_key)}, ENDPOINT {_quote(endpoint)},
+            URL_STYLE 'path', USE_SSL {str(not endpoint_url.startswith('http://')).lower()})""")
+
+    # ---------- sources -----------------------------------------------------
+
+    def _source(self, series_ids=None):
+        """Table expression for the observations, reading only the files of series_ids when given."""
+        if self.parquet:
+            return f"read_parquet({_quote(self.root)})"
+        if series_ids is None:
+            files = _quote(f"{self.root}/*.csv")
+        else:
+            paths = [f"{self.root}/{sid}.csv" for sid in series_ids]
+            if self.root.startswith("s3://"):
+                paths = [p for p in paths if p in self._listed_files()]
+            else:
+                paths = [p for p in paths if os.path.exists(p)]
+            if not paths:
+                raise ValueError(f"None of {list(series_ids)[:5]} are in {self.root}")
+            files = "[" + ", ".join(map(_quote, paths)) + "]"
+        return f"read_csv({files}, header = true, columns = {COLUMNS}, nullstr = ['', '.'])"
+
+    def _listed_files(self):
+        # one listing of the prefix, as var_service.screen_variables does
+        if self._listed is None:
+            rows = self.con.execute(f"SELECT file FROM glob({_quote(self.root + '/*.csv')})").fetchall()
+            self._listed = {file for (file,) in rows}
+        return self._listed
+
+    @staticmethod
+    def _where(series_ids=None, start=None, end=None, alias=None):
+        p = f"{alias}." if alias else ""
+        clauses = [f"{p}value IS NOT NULL"]
+        if series_ids is not None:
+            clauses.append(f"{p}series_id IN ({', '.join(map(_quote, series_ids))})")
+        if start is not None:
+            clauses.append(f"{p}date >= {_date(start)}")
+        if end is not None:
+            clauses.append(f"{p}date <= {_date(end)}")
+        return " AND ".join(clauses)
+
+    def sql(self, query, params=None):
+        return self.con.execute(query, params or []).df()
+
+    # ---------- queries -----------------------------------------------------
+
+    def series_ids(self, frequency=None, discontinued=False):
+        """Ids from the metadata, optionally by frequency prefix ("Daily") and without discontinued series."""
+        clauses = ["TRUE"]
+        if frequency:
+            clauses.append(f"frequency LIKE {_quote(frequency + '%')}")
+        if not discontinued:
+            clauses.append("NOT contains(upper(coalesce(title, '')), 'DISCONTINUED')")
+        return self.con.execute(f"SELECT id FROM metadata WHERE {' AND '.join(clauses)} ORDER BY id") \
+            .df()["id"].tolist()
+
+    def panel(self, series_ids, start=None, end=None, freq=None):
+        """Date x series frame. With freq ("W", "M", "Q", "A") each column holds
+        the last observation in each period, labelled by the period end."""
+        series_ids = list(series_ids)
+        obs = f"SELECT series_id, date, value FROM {self._source(series_ids)} " \
+              f"WHERE {self._where(series_ids, start, end)}"
+        if freq:
+            unit = PERIODS[freq]
+            label = f"CAST(date_trunc('{unit}', date) + INTERVAL 1 {unit} - INTERVAL 1 day AS DATE)"
+            obs = f"SELECT series_id, {label} AS date, arg_max(value, date) AS value FROM ({obs}) GROUP BY ALL"
+        cols = ", ".join(f"max(value) FILTER (WHERE series_id = {_quote(s)}) AS {_ident(s)}" for s in series_ids)
+        df = self.con.execute(f"SELECT date, {cols} FROM ({obs}) GROUP BY date ORDER BY date").df()
+        df["date"] = pd.to_datetime(df["date"])
+        return df.set_index("date")
+
+    def latest(self, series_ids):
+        """Newest non-missing observation of each series: series_id, date, value."""
+        series_ids = list(series_ids)
+        return self.con.execute(
+            f"SELECT series_id, max(date) AS date, arg_max(value, date) AS value "
+            f"FROM {self._source(series_ids)} WHERE {self._where(series_ids)} "
+            f"GROUP BY series_id ORDER BY series_id").df()
+
+    def correlations(self, target, series_ids=None, start=None, end=None, min_periods=2):
+        """Pearson correlation of target with every series on their common dates
+        (pairwise-complete, like DataFrame.corr())."""
+        source = self._source(None if series_ids is None else [target, *series_ids])
+        df = self.con.execute(f"""
+            WITH t AS (SELECT date, value FROM {source} WHERE {self._where([target], start, end)})
+            SELECT o.series_id, corr(t.value, o.value) AS corr
+            FROM {source} o JOIN t ON o.date = t.date
+            WHERE {self._where(series_ids, start, end, alias="o")}
+            GROUP BY o.series_id HAVING count(*) >= {int(min_periods)}
+        """).df()
+        return df.set_index("series_id")["corr"].clip(-1.0, 1.0).rename(target)
+
+    def top_correlated(self, target, k=30, frequency=None, series_ids=None, start=None, end=None,
+                       min_periods=2):
+        """|corr| with target, highest first, the target itself first (as DailyPanel.top_correlated);
+        frequency restricts the candidates to current series of that frequency in the metadata."""
+        if frequency and series_ids is None:
+            series_ids = self.series_ids(frequency)
+        corr = self.correlations(target, series_ids, start, end, min_periods).abs().dropna()
+        others = corr.drop(target, errors="ignore").sort_values(ascending=False).iloc[:k]
+        return pd.concat([pd.Series({target: 1.0}, name=target), others])
+
+    # ---------- maintenance -------------------------------------------------
+
+    def export_parquet(self, path, series_ids=None):
+        """Write the observations to one Parquet file sorted by series_id, date."""
+        self.con.execute(f"""COPY (SELECT series_id, date, value FROM {self._source(series_ids)}
+                                  ORDER BY series_id, date)
+                             TO {_quote(path)} (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE 122880)""")
+        print(f"[Warehouse] Wrote {path}", flush=True)
+        return path
+
+    def close(self):
+        self.con.close()
@@ -0,0 +1,253 @@
+# pipeline.py
+# Dependency-aware rebuild of the dashboard artifacts.
+#
+#   python app/pipeline.py              # from the Dash directory
+#   python app/pipeline.py --force lumber_xgb --workers 2
+#
+# Each stage declares its S3 inputs, upstream stages, output files and the
+# code it runs. A stage's fingerprint hashes its inputs' ETags, its code files
+# and its upstream fingerprints; only stages whose fingerprint differs from
+# the last successful run (or whose outputs are missing) are re-run, and
+# stages that do not depend on each other run in parallel.
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List
+
+APP_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(APP_DIR))
+
+from models import merge_fred_files, profiling
+from models.tuning import TUNED_PARAMS_FILE
+
+DATA_DIR = APP_DIR / "data"
+ASSETS_DIR = APP_DIR / "assets"
+CACHE_DIR = DATA_DIR / ".pipeline"
+STATE_FILE = CACHE_DIR / "state.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Dict[str, object]], object]      # receives upstream results by stage name
+    inputs: List[str] = field(default_factory=list)  # S3 keys
+    deps: List[str] = field(default_factory=list)
+    outputs: List[Path] = field(default_factory=list)
+    code: List[Path] = field(default_factory=list)
+
+    @property
+    def result_path(self):
+        return CACHE_DIR / f"{self.name}.pkl"
+
+
+# ---------- fingerprints --------------------------------------------------
+
+def s3_etag(key):
+    try:
+        return merge_fred_files.get_bucket().Object(key).e_tag
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(stage, upstream, etags):
+    h = hashlib.sha256(stage.name.encode())
+    for key in sorted(stage.inputs):
+        h.update(f"{key}={etags[key]}".encode())
+    for path in sorted(stage.code):
+        h.update(file_digest(path).encode())
+    for dep in sorted(stage.deps):
+        h.update(upstream[dep].encode())
+    return h.hexdigest()
+
+
+# ---------- stages --------------------------------------------------------
+
+def _kpi_keys(kpis):
+    return [f"observations/{fname}" for fname in kpis]
+
+
+def _mc_stage(name, merge_stage, price_col):
+    from models.monte_carlo import write_mc_artifacts
+    return Stage(
+        name=f"{name}_mc",
+        run=lambda up: write_mc_artifacts(up[merge_stage], price_col, name, DATA_DIR, ASSETS_DIR),
+        deps=[merge_stage],
+        outputs=[DATA_DIR / f"{name}_mc_flag.txt", ASSETS_DIR / f"{name}_mc_hist.png"],
+        code=[APP_DIR / "models" / "monte_carlo.py"],
+    )
+
+
+def default_stages():
+    from models.lumber_xgb import write_lumber_xgb_artifacts
+
+    merge_code = [APP_DIR / "models" / "merge_fred_files.py", APP_DIR / "models" / "alignment.py"]
+    return [
+        # each merge ends with its price series, which the models below train or simulate on:
+        # weeks past its last observation would only repeat it
+        Stage("lumber_merge", lambda up: merge_fred_files.load_and_merge_data(merge_fred_files.LUMBER_KPIS,
+                                                                              end_on="lumber_price"),
+              inputs=_kpi_keys(merge_fred_files.LUMBER_KPIS), code=merge_code),
+        Stage("crude_merge", lambda up: merge_fred_files.load_and_merge_data(merge_fred_files.CRUDE_KPIS,
+                                                                             end_on="crude_oil_price"),
+              inputs=_kpi_keys(merge_fred_files.CRUDE_KPIS), code=merge_code),
+        Stage("lumber_xgb", lambda up: write_lumber_xgb_artifacts(up["lumber_merge"], DATA_DIR),
+              deps=["lumber_merge"],
+              outputs=[DATA_DIR / "lumber_xgb.csv", DATA_DIR / "lumber_xgb_report.csv"],
+              code=[APP_DIR / "models" / "lumber_xgb.py"] + [p for p in [TUNED_PARAMS_FILE] if p.exists()]),
+        _mc_stage("lumber", "lumber_merge", "lumber_price"),
+        _mc_stage("crude", "crude_merge", "crude_oil_price"),
+    ]
+
+
+# ---------- scheduling ----------------------------------------------------
+
+def topo_order(stages):
+    by_name = {s.name: s for s in stages}
+    order, seen, visiting = [], set(), set()
+
+    def visit(name):
+        if name in seen:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle in pipeline at stage {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+            visit(dep)
+        visiting.discard(name)
+        seen.add(name)
+        order.append(by_name[name])
+
+    for s in stages:
+        visit(s.name)
+    return order
+
+
+def load_state():
+    if not STATE_FILE.exists():
+        return {}
+    return json.loads(STATE_FILE.read_text())
+
+
+def save_state(state):
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True))
+    os.replace(tmp, STATE_FILE)
+
+
+def run_pipeline(stages=None, force=(), workers=4):
+    """Run every stale stage; returns the names of the stages that ran."""
+    stages = topo_order(stages or default_stages())
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    state = load_state()
+
+    # one HEAD per distinct S3 key, shared across stages
+    keys = sorted({k for s in stages for k in s.inputs})
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        etags = dict(zip(keys, ex.map(s3_etag, keys)))
+
+    prints = {}
+    for s in stages:
+        prints[s.name] = fingerprint(s, prints, etags)
+
+    stale = set()
+    for s in stages:
+        if (s.name in force or any(d in stale for d in s.deps)
+                or state.get(s.name) != prints[s.name]
+                or not s.result_path.exists()
+                or not all(p.exists() for p in s.outputs)):
+            stale.add(s.name)
+    print(f"[Pipeline] {len(stale)}/{len(stages)} stages stale: {sorted(stale)}", flush=True)
+
+    results = {}
+
+    def upstream(s):
+        # upstream results come from this run or, for fresh deps, the cached pickle
+        out = {}
+        for dep in s.deps:
+            if dep not in results:
+                with open(next(x for x in stages if x.name == dep).result_path, "rb") as f:
+                    results[dep] = pickle.load(f)
+            out[dep] = results[dep]
+        return out
+
+    def execute(s):
+        print(f"[Pipeline] Running {s.name} ...", flush=True)
+        with profiling.run(s.name):
+            result = s.run(upstream(s))
+        with open(s.result_path, "wb") as f:
+            pickle.dump(result, f)
+        return result
+
+    pending = [s for s in stages if s.name in stale]
+    done, failed, running = set(), set(), {}
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        while pending or running:
+            for s in list(pending):
+                if any(d in failed for d in s.deps):
+                    print(f"[Pipeline] Skipping {s.name}: an upstream stage failed.", flush=True)
+                    failed.add(s.name)
+                    pending.remove(s)
+                elif all(d in done or d not in stale for d in s.deps):
+                    running[ex.submit(execute, s)] = s
+                    pending.remove(s)
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                s = running.pop(fut)
+                try:
+                    results[s.name] = fut.result()
+                except Exception as e:
+                    print(f"[Pipeline] {s.name} failed → {e}", flush=True)
+                    failed.add(s.name)
+                    continue
+                done.add(s.name)
+                state[s.name] = prints[s.name]
+                save_state(state)
+                print(f"[Pipeline] {s.name} done.", flush=True)
+
+    if failed:
+        raise RuntimeError(f"Pipeline stages failed: {sorted(failed)}")
+    return sorted(done)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild stale dashboard artifacts.")
+    parser.add_argument("--force", nargs="*", help="re-run these stages (all stages if none are named)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--profile", choices=["time", "memory"], help="print per-stage timings of each run")
+    parser.add_argument("--capture", metavar="NAME", help="also write a cProfile and folded-stack capture")
+    args = parser.parse_args()
+    stages = default_stages()
+    force = set() if args.force is None else set(args.force or [s.name for s in stages])
+    if args.profile:
+        profiling.enable("memory" if args.profile == "memory" else "1")
+    if args.capture:
+        with profiling.capture(args.capture, all_threads=True):
+            run_pipeline(stages, force=force, workers=args.workers)
+    else:
+        run_pipeline(stages, force=force, workers=args.workers)
+    for r in profiling.runs():
+        print(f"\n[Profile] {r.name}: {r.wall:.2f}s\n{r.report().to_string(index=False)}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
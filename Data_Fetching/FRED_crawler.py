@@ -1,20 +1,28 @@
 import os
-import requests
-import time
 import sys
-import pandas as pd
-import io
+import tempfile
+from datetime import datetime, timezone
 import boto3
 import botocore
-from datetime import datetime, timedelta
+from metadata_index import MetadataIndex
+from crawler_core import FredClient, Crawler
+from crawl_metrics import serve_metrics
+from update_feed import S3HighWaterMark, failed_rows, run_updates
+from release_scheduler import run_scheduler
+from sinks import S3Sink, LocalCSVSink, PostgresSink, CatalogSink, MetadataPartSink
+from shard_coordinator import (ShardCoordinator, merge_metadata_parts, part_key, plan_categories, plan_ids,
+                               plan_keys, run_worker)
+from vintage_store import S3Blobs, VintageSink, VintageStore, backfill
 
 # Constants
 API_KEY = "YOUR_API_KEY"
-BASE_URL = "https://api.stlouisfed.org/fred"
-SERIES_ENDPOINT = f"{BASE_URL}/category/series"
-CHILDREN_ENDPOINT = f"{BASE_URL}/category/children"
+API_KEYS = [API_KEY]        # sharded mode: one worker per key at a time, each within its own rate limit
 CHECKPOINT_KEY = 'metadata/metadata.csv'
 SERIES_LIMIT = 1000000
+WORKERS = 4
+PROGRESS_INTERVAL = 30      # seconds between [Progress] JSON log lines
+METRICS_PORT = None         # e.g. 9108 to expose http://127.0.0.1:9108/metrics
+RELEASE_INDEX_FILE = "release_index.json"
 
 # AWS S3 Configuration from Environment Variables
 aws_access_key_id = 'YOUR_KEY_ID'
@@ -22,9 +30,21 @@ aws_secret_access_key = 'YOUR_ACCESS_KEY'
 endpoint_url = 'YOUR_ENDPOINT'
 bucket_name = 'fred' 
 
+# Optional extra sinks filled by the same crawl, e.g.
+# "postgresql+psycopg2://fred_user:fred_pass@db:5432/fred_data" or "data"
+POSTGRES_URL = None
+LOCAL_CSV_DIR = None
+# SQLite full-text catalog of series metadata (see catalog.py), e.g. "catalog.db"
+CATALOG_FILE = None
+# Keep every revision as a delta under vintages/ (see vintage_store.py)
+STORE_VINTAGES = False
+# Lease table for the sharded crawl (see shard_coordinator.py): a SQLite file
+# for workers on one machine, "postgresql+psycopg2://..." for several nodes
+COORDINATOR_URL = "sqlite:///shards.db"
+
 if not all([aws_access_key_id, aws_secret_access_key, endpoint_url]):
     print("[Fatal Error] Missing AWS credentials or S3 endpoint in environment variables.")
-    sys.exit(1)
+    raise SystemExit(1)
 
 s3 = boto3.resource(
     's3',
@@ -34,136 +54,93 @@ s3 = boto3.resource(
 )
 bucket = s3.Bucket(bucket_name)
 
-visited_categories = set()
-seen_series_ids = set()
-total_series = 0
-
-# Load metadata from S3
+# Load metadata from S3 into a compact on-disk index
+METADATA_LOCAL = os.path.join(tempfile.gettempdir(), "fred_metadata.csv")
 try:
-    obj = bucket.Object(CHECKPOINT_KEY)
-    metadata_content = obj.get()['Body'].read().decode('utf-8')
-    metadata_df = pd.read_csv(io.StringIO(metadata_content))
-    metadata_df['last_updated'] = pd.to_datetime(metadata_df['last_updated'], errors='coerce')
-    metadata_dict = metadata_df.set_index('id').to_dict('index')
-    existing_ids = set(metadata_dict.keys())
+    bucket.download_file(CHECKPOINT_KEY, METADATA_LOCAL)
     print("[Info] Loaded metadata from S3.")
 except botocore.exceptions.ClientError as e:
-    if e.response['Error']['Code'] == "NoSuchKey":
+    if e.response['Error']['Code'] in ("NoSuchKey", "404"):
         print("[Info] No metadata.csv found in S3. Initializing.")
-        metadata_df = pd.DataFrame(columns=['id','title','observation_start','observation_end','frequency','units','seasonal_adjustment','last_updated','notes'])
-        metadata_dict = {}
-        existing_ids = set()
+        if os.path.exists(METADATA_LOCAL):
+            os.remove(METADATA_LOCAL)
     else:
         raise
+metadata_index = MetadataIndex(METADATA_LOCAL)
+
+def make_sinks(metadata_key=CHECKPOINT_KEY):
+    # fresh sinks per crawler: a crawler closes its sinks when it is done
+    sinks = [S3Sink(bucket, metadata_key=metadata_key)]
+    if POSTGRES_URL:
+        sinks.append(PostgresSink(POSTGRES_URL))
+    if LOCAL_CSV_DIR:
+        sinks.append(LocalCSVSink(LOCAL_CSV_DIR))
+    if CATALOG_FILE:
+        sinks.append(CatalogSink(CATALOG_FILE))
+    if STORE_VINTAGES:
+        sinks.append(VintageSink(VintageStore(S3Blobs(bucket))))
+    return sinks
+
+if METRICS_PORT:
+    serve_metrics(METRICS_PORT)
+
+client = FredClient(API_KEY)
+
+def make_crawler():
+    return Crawler(client, make_sinks(), metadata_index, series_limit=SERIES_LIMIT,
+                   workers=WORKERS, progress_interval=PROGRESS_INTERVAL)
+
+def make_shard_crawler(shard_client, lease):
+    # metadata goes to a per-shard part; the merge shard folds the parts into CHECKPOINT_KEY
+    sinks = make_sinks(metadata_key=None) + [MetadataPartSink(bucket, part_key(lease))]
+    return Crawler(shard_client, sinks, metadata_index, workers=WORKERS,
+                   progress_interval=PROGRESS_INTERVAL, stop=lease.lost)
+
+def finish_sharded_crawl(started):
+    merge_metadata_parts(bucket, CHECKPOINT_KEY)
+    hwm.save(started)
+
+# "updates" (default) refreshes only series reported by series/updates since the
+# last run; "full" walks the whole category tree as a periodic reconciliation;
+# "schedule" runs forever, fetching each release's series right after it is published;
+# "backfill ID ..." loads the full ALFRED revision history of the given series;
+# "shard [category|ids]" runs one worker of a sharded crawl (start as many as you
+# like, on any node that reaches COORDINATOR_URL): "category" is a full walk,
+# "ids" re-fetches the observations of every series already in the metadata.
+MODE = sys.argv[1] if len(sys.argv) > 1 else "updates"
+hwm = S3HighWaterMark(bucket)
 
-def safe_put_object(key, content_bytes):
-    for attempt in range(3):
-        try:
-            bucket.put_object(Key=key, Body=content_bytes, ContentLength=len(content_bytes))
-            print(f"[S3] Successfully uploaded {key}.")
-            return
-        except Exception as e:
-            print(f"[S3 ERROR] Attempt {attempt+1} failed to upload {key}: {e}")
-            time.sleep(2)
-    print(f"[S3 ERROR] Failed to upload {key} after retries.")
-
-def safe_get(url, params, retries=5, backoff=5):
-    for attempt in range(retries):
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"[ERROR] Attempt {attempt + 1} failed: {e}", flush=True)
-            time.sleep(backoff * (attempt + 1))
-    return None
-
-def needs_refresh(meta):
-    if pd.isna(meta.get('last_updated')):
-        return True
-    freq = meta.get('frequency', '')
-    age = datetime.now(meta['last_updated'].tzinfo) - meta['last_updated']
-    if "Daily" in freq: return timedelta(days=3) >= age >= timedelta(days=1)
-    if "Weekly" in freq: return timedelta(days=14) >= age >= timedelta(days=7)
-    if "Monthly" in freq: return timedelta(days=60) >= age >= timedelta(days=30)
-    if "Quarterly" in freq: return timedelta(days=180) >= age >= timedelta(days=90)
-    if "Annual" in freq: return timedelta(days=730) >= age >= timedelta(days=365)
-    return False
-
-def update_metadata_s3(new_row_df):
-    global metadata_df
-    metadata_df = pd.concat([metadata_df, new_row_df], ignore_index=True).drop_duplicates(subset='id', keep='last')
-    buffer = io.StringIO()
-    metadata_df.to_csv(buffer, index=False)
-    content = buffer.getvalue().encode('utf-8')
-    safe_put_object(CHECKPOINT_KEY, content)
-
-def process_category(category_id, level=0):
-    global total_series
-    if category_id in visited_categories:
-        return
-    visited_categories.add(category_id)
-
-    print(f"\n[Category] {'  '*level}Processing category {category_id}")
-    series_data = safe_get(SERIES_ENDPOINT, {"api_key": API_KEY, "file_type": "json", "category_id": category_id, "limit": 1000})
-
-    if series_data:
-        for series in series_data.get("seriess", []):
-            sid = series["id"]
-            title = series["title"]
-            if sid in seen_series_ids:
-                continue
-            seen_series_ids.add(sid)
-            total_series += 1
-            if total_series >= SERIES_LIMIT:
-                print("[STOP] Reached series limit.")
-                sys.exit(0)
-
-            if sid not in existing_ids:
-                row = {
-                    'id': sid, 'title': title, 'observation_start': series['observation_start'],
-                    'observation_end': series['observation_end'], 'frequency': series['frequency'],
-                    'units': series['units'], 'seasonal_adjustment': series['seasonal_adjustment'],
-                    'last_updated': series['last_updated'], 'notes': series.get('notes','').replace("\n"," ").replace(",",";")
-                }
-                update_metadata_s3(pd.DataFrame([row]))
-                existing_ids.add(sid)
-                metadata_dict[sid] = row
-                fetch_obs = True
-            else:
-                meta = metadata_dict[sid]
-                if meta.get('title', '').strip().upper().endswith("(DISCONTINUED)"):
-                    print(f"[Skip] {sid} is DISCONTINUED.")
-                    fetch_obs = False
-                else:
-                    fetch_obs = needs_refresh(meta)
-
-            if fetch_obs:
-                obs_data = safe_get(f"{BASE_URL}/series/observations", {"api_key": API_KEY, "file_type": "json", "series_id": sid})
-                if obs_data and obs_data.get("observations"):
-                    obs_rows = [{'series_id': sid, 'date': obs['date'], 'value': float(obs['value']) if obs['value'] not in ("",".") else None} for obs in obs_data['observations']]
-                    if obs_rows:
-                        buffer = io.StringIO()
-                        pd.DataFrame(obs_rows).to_csv(buffer, index=False)
-                        safe_put_object(f'observations/{sid}.csv', buffer.getvalue().encode('utf-8'))
-                        print(f"[Saved] Observations for {sid}.")
-                else:
-                    print(f"[Obs] No observations for {sid}.")
-            else:
-                print(f"[Obs] Skipped {sid}, up-to-date.")
-
-            if total_series % 250 == 0:
-                print(f"\n[Checkpoint] Processed {total_series} series.")
-
-    children_data = safe_get(CHILDREN_ENDPOINT, {"api_key": API_KEY, "file_type": "json", "category_id": category_id})
-    if children_data:
-        for child in children_data.get("categories", []):
-            process_category(child["id"], level+1)
-
-# Start crawling
 try:
-    print("[Start] Crawling categories from root 0")
-    process_category(0)
-    print(f"[Done] Total series processed: {total_series}")
+    if MODE == "shard":
+        kind = sys.argv[2] if len(sys.argv) > 2 else "category"
+        coordinator = ShardCoordinator(COORDINATOR_URL)
+        plan_keys(coordinator, API_KEYS)
+        if kind == "category":
+            plan_categories(client, coordinator)
+        else:
+            plan_ids(coordinator)
+        try:
+            run_worker(coordinator, make_shard_crawler, kind, make_client=FredClient,
+                       on_merge=finish_sharded_crawl)
+            print(coordinator.status().to_string(index=False), flush=True)
+        finally:
+            coordinator.close()
+    elif MODE == "backfill":
+        store = VintageStore(S3Blobs(bucket))
+        for sid in sys.argv[2:]:
+            print(f"[Vintage] {sid}: {backfill(client, store, sid)} vintages.", flush=True)
+    elif MODE == "schedule":
+        # one crawler per release run; none is built up front to sit open all along
+        run_scheduler(client, make_crawler, RELEASE_INDEX_FILE)
+    else:
+        crawler = make_crawler()
+        if MODE == "updates" and run_updates(crawler, hwm):
+            print(f"[Done] Refreshed {crawler.total_series} changed series.")
+        else:
+            started = datetime.now(timezone.utc)
+            print("[Start] Crawling categories from root 0")
+            total = crawler.crawl(0)
+            hwm.save(started, retry=failed_rows(crawler))
+            print(f"[Done] Total series processed: {total}")
 except Exception as e:
     print(f"[Fatal Error] {e}")
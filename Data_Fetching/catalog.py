@@ -0,0 +1,204 @@
+# catalog.py
+# Searchable series catalog: a SQLite database with an FTS5 index over
+# title, notes and units and B-tree indexes on frequency, seasonal
+# adjustment and last_updated. It is kept current by CatalogSink during
+# crawls and can be (re)built from a metadata CSV.
+#
+#   cat = Catalog("catalog.db")
+#   cat.search("korea exchange rate", frequency="Daily", discontinued=False)
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from metadata_index import METADATA_COLUMNS, _is_discontinued, _to_ns, _ts_ns
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    title TEXT,
+    observation_start TEXT,
+    observation_end TEXT,
+    frequency TEXT,
+    units TEXT,
+    seasonal_adjustment TEXT,
+    last_updated TEXT,
+    notes TEXT,
+    updated_ts INTEGER,          -- last_updated as epoch seconds, UTC
+    discontinued INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS series_frequency ON series(frequency);
+CREATE INDEX IF NOT EXISTS series_seasonal ON series(seasonal_adjustment);
+CREATE INDEX IF NOT EXISTS series_updated ON series(updated_ts);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS series_fts USING fts5(
+    title, notes, units, content='series', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS series_ai AFTER INSERT ON series BEGIN
+    INSERT INTO series_fts(rowid, title, notes, units) VALUES (new.rowid, new.title, new.notes, new.units);
+END;
+CREATE TRIGGER IF NOT EXISTS series_ad AFTER DELETE ON series BEGIN
+    INSERT INTO series_fts(series_fts, rowid, title, notes, units)
+    VALUES ('delete', old.rowid, old.title, old.notes, old.units);
+END;
+CREATE TRIGGER IF NOT EXISTS series_au AFTER UPDATE ON series BEGIN
+    INSERT INTO series_fts(series_fts, rowid, title, notes, units)
+    VALUES ('delete', old.rowid, old.title, old.notes, old.units);
+    INSERT INTO series_fts(rowid, title, notes, units) VALUES (new.rowid, new.title, new.notes, new.units);
+END;
+"""
+
+UPSERT = f"""
+INSERT INTO series ({', '.join(METADATA_COLUMNS)}, updated_ts, discontinued)
+VALUES ({', '.join(':' + c for c in METADATA_COLUMNS)}, :updated_ts, :discontinued)
+ON CONFLICT(id) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in METADATA_COLUMNS if c != 'id')},
+    updated_ts = excluded.updated_ts, discontinued = excluded.discontinued
+"""
+
+CSV_CHUNK = 50_000
+NAT = np.iinfo(np.int64).min
+
+
+def _prepare(rows):
+    """Metadata dicts -> parameter dicts with the derived columns filled in."""
+    if not rows:
+        return []
+    frame = pd.DataFrame(rows, columns=METADATA_COLUMNS).astype(object).where(lambda d: d.notna(), None)
+    ns = _to_ns(frame['last_updated'])
+    frame['updated_ts'] = [None if v == NAT else int(v // 10**9) for v in ns]
+    frame['discontinued'] = _is_discontinued(frame['title']).astype(int)
+    return frame.to_dict('records')
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    # ---------- writes ------------------------------------------------------
+
+    def upsert(self, rows):
+        params = _prepare(list(rows))
+        with self._lock, self.conn:
+            self.conn.executemany(UPSERT, params)
+        return len(params)
+
+    def load_csv(self, path):
+        """Bulk (re)load a metadata CSV such as metadata/metadata.csv. Into an empty
+        catalog the FTS index is built once at the end instead of row by row."""
+        bulk = len(self) == 0
+        if bulk:
+            # both write triggers: a duplicate id in a later chunk is an update, and
+            # series_au would 'delete' an FTS row that was never indexed
+            with self._lock:
+                self.conn.execute("DROP TRIGGER IF EXISTS series_ai")
+                self.conn.execute("DROP TRIGGER IF EXISTS series_au")
+        total = 0
+        try:
+            for chunk in pd.read_csv(path, dtype=str, chunksize=CSV_CHUNK, keep_default_na=False):
+                chunk = chunk.drop_duplicates('id', keep='last')
+                total += self.upsert(chunk.reindex(columns=METADATA_COLUMNS).to_dict('records'))
+                print(f"[Catalog] Loaded {total:,} rows.", flush=True)
+        finally:
+            with self._lock:
+                if bulk:
+                    with self.conn:
+                        self.conn.execute("INSERT INTO series_fts(series_fts) VALUES ('rebuild')")
+                    self.conn.executescript(SCHEMA)
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO series_fts(series_fts) VALUES ('optimize')")
+        return total
+
+    # ---------- queries -----------------------------------------------------
+
+    def search(self, text=None, frequency=None, seasonal_adjustment=None, updated_after=None,
+               discontinued=None, limit=50):
+        """Series matching an FTS5 query (best bm25 rank first) and/or filters.
+
+        frequency matches a prefix ("Weekly" finds "Weekly, Ending Friday");
+        updated_after is anything pandas can parse as a timestamp.
+        """
+        where, params = [], []
+        if frequency:
+            where.append("s.frequency >= ? AND s.frequency < ?")     # prefix match on the index
+            params += [frequency, frequency + "\uffff"]
+        if seasonal_adjustment:
+            where.append("s.seasonal_adjustment = ?")
+            params.append(seasonal_adjustment)
+        if updated_after is not None:
+            where.append("s.updated_ts > ?")
+            params.append(_ts_ns(updated_after) // 10**9)
+        if discontinued is not None:
+            where.append("s.discontinued = ?")
+            params.append(int(bool(discontinued)))
+
+        if text:
+            sql = ("SELECT s.* FROM series_fts JOIN series s ON s.rowid = series_fts.rowid "
+                   "WHERE series_fts MATCH ?" + "".join(f" AND {w}" for w in where) +
+                   " ORDER BY bm25(series_fts, 10.0, 1.0, 2.0) LIMIT ?")
+            params.insert(0, text)
+        else:
+            sql = ("SELECT s.* FROM series s" + (" WHERE " + " AND ".join(where) if where else "") +
+                   " ORDER BY s.id LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, params)]
+
+    def ids(self, **filters):
+        return [r["id"] for r in self.search(limit=-1, **filters)]
+
+    def get(self, sid):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM series WHERE id = ?", (sid,)).fetchone()
+        return dict(row) if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_catalog(path, metadata_csv=None):
+    """Open the catalog at path, building it from metadata_csv if it is new or empty."""
+    is_new = not os.path.exists(path)
+    catalog = Catalog(path)
+    if metadata_csv and (is_new or len(catalog) == 0) and os.path.exists(metadata_csv):
+        catalog.load_csv(metadata_csv)
+    return catalog
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build or query the series catalog.")
+    parser.add_argument("db")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--load", metavar="METADATA_CSV", help="bulk load a metadata CSV first")
+    parser.add_argument("--frequency")
+    parser.add_argument("--sa", dest="seasonal_adjustment")
+    parser.add_argument("--updated-after")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = Catalog(args.db)
+    if args.load:
+        catalog.load_csv(args.load)
+    start = time.perf_counter()
+    rows = catalog.search(args.query, args.frequency, args.seasonal_adjustment, args.updated_after,
+                          discontinued=False, limit=args.limit)
+    for r in rows:
+        print(f"{r['id']:<20} {r['frequency'] or '':<10.10} {r['title']}")
+    print(f"[Catalog] {len(rows)} of {len(catalog):,} series in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,361 @@
+# crawler_core.py
+# Single FRED crawl engine shared by the S3, local CSV and Postgres loaders.
+# The category tree is walked once and every fetched series is fanned out to
+# all configured sinks (see sinks.py) concurrently.
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import cached_property, partial
+
+import pandas as pd
+import requests
+
+from crawl_metrics import METRICS, ProgressLogger
+from metadata_index import _is_discontinued
+
+BASE_URL = "https://api.stlouisfed.org/fred"
+PAGE_LIMIT = 1000
+CHECKPOINT_EVERY = 250
+
+
+class StopCrawl(Exception):
+    pass
+
+
+class FredClient:
+    """Thin FRED API wrapper with retries and a global request rate limit."""
+
+    def __init__(self, api_key, base_url=BASE_URL, retries=5, backoff=5, min_interval=0.5,
+                 metrics=METRICS):
+        self.api_key = api_key
+        self.metrics = metrics
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff = backoff
+        self.min_interval = min_interval   # 0.5s ~= FRED's 120 requests/minute
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.min_interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+    def get(self, endpoint, stage="list", **params):
+        url = f"{self.base_url}/{endpoint}"
+        params = {"api_key": self.api_key, "file_type": "json", **params}
+        for attempt in range(self.retries):
+            if attempt:
+                self.metrics.inc("fred_retries_total", stage=stage)
+            self._throttle()
+            self.metrics.inc("fred_requests_total", stage=stage)
+            try:
+                with self.metrics.timed(stage):
+                    response = self.session.get(url, params=params, timeout=10)
+                    response.raise_for_status()
+                    data = response.json()
+                self.metrics.inc("fred_response_bytes_total", len(response.content), stage=stage)
+                return data
+            except requests.exceptions.RequestException as e:
+                print(f"[ERROR] Attempt {attempt + 1} failed: {e}", flush=True)
+                time.sleep(self.backoff * (attempt + 1))
+        self.metrics.inc("fred_failures_total", stage=stage)
+        return None
+
+    def paged(self, endpoint, key, **params):
+        offset = 0
+        while True:
+            data = self.get(endpoint, limit=PAGE_LIMIT, offset=offset, **params)
+            items = data.get(key, []) if data else []
+            yield from items
+            if len(items) < PAGE_LIMIT:
+                return
+            offset += PAGE_LIMIT
+
+    def category_series(self, category_id):
+        return self.paged("category/series", "seriess", category_id=category_id)
+
+    def category_children(self, category_id):
+        data = self.get("category/children", category_id=category_id)
+        return data.get("categories", []) if data else []
+
+    def observations(self, series_id, **params):
+        data = self.get("series/observations", stage="fetch", series_id=series_id, **params)
+        return data.get("observations", []) if data else None
+
+
+def metadata_row(series):
+    return {
+        'id': series['id'],
+        'title': series['title'],
+        'observation_start': series['observation_start'],
+        'observation_end': series['observation_end'],
+        'frequency': series['frequency'],
+        'units': series['units'],
+        'seasonal_adjustment': series['seasonal_adjustment'],
+        'last_updated': series['last_updated'],
+        'notes': series.get('notes', '').replace("\n", " ").replace(",", ";"),
+    }
+
+
+class SeriesObservations:
+    """Observations for one series, encoded once and shared by every sink."""
+
+    def __init__(self, series_id, observations):
+        self.series_id = series_id
+        self.rows = []
+        # the day FRED's answer describes; keys the vintage in vintage_store
+        self.realtime_start = max((obs.get('realtime_start', '') for obs in observations), default='') or None
+        for obs in observations:
+            try:
+                self.rows.append({
+                    'series_id': series_id,
+                    'date': obs['date'],
+                    'value': float(obs['value']) if obs['value'] not in ("", ".") else None,
+                })
+            except ValueError:
+                continue  # skip malformed values
+
+    def __len__(self):
+        return len(self.rows)
+
+    @cached_property
+    def frame(self):
+        return pd.DataFrame(self.rows, columns=['series_id', 'date', 'value'])
+
+    @cached_property
+    def csv_bytes(self):
+        with METRICS.timed("encode"):
+            buffer = io.StringIO()
+            self.frame.to_csv(buffer, index=False)
+            return buffer.getvalue().encode('utf-8')
+
+
+class Crawler:
+    def __init__(self, client, sinks, metadata_index, series_limit=None, workers=4,
+                 metrics=METRICS, progress_interval=30, expected_series=None, stop=None):
+        self.client = client
+        self.stop = stop                # threading.Event; set -> give up (e.g. a lost shard lease)
+        self.metrics = metrics
+        self.progress = ProgressLogger(metrics, progress_interval, expected_series or series_limit)
+        self.sinks = list(sinks)
+        self.index = metadata_index
+        self.series_limit = series_limit
+        self.visited_categories = set()
+        self.seen_series_ids = set()
+        self.total_series = 0
+        self.new_series = 0
+        self.failed = set()             # series whose observations did not reach every sink
+        self._dirty = False             # metadata changed since the last checkpoint
+        self._fetch_pool = ThreadPoolExecutor(max_workers=workers)
+        self._sink_pool = ThreadPoolExecutor(max_workers=max(1, len(self.sinks) * workers))
+        self._pending = {}              # in-flight future -> then(result), run on the crawl thread
+        self._max_pending = workers * 2
+
+    # ---------- fan-out ----------------------------------------------------
+
+    def _write(self, sink, method, *args):
+        name = type(sink).__name__
+        # "upload" is observation uploads only; metadata writes, checkpoints and closes are their own stages
+        stage = "upload" if method == "write_observations" else method
+        with self.metrics.timed(stage, sink=name):
+            getattr(sink, method)(*args)
+        if method == "write_observations":
+            self.metrics.inc("sink_bytes_total", len(args[0].csv_bytes), sink=name)
+
+    def _fan_out(self, method, *args):
+        """Call method on every sink; False if any of them failed."""
+        futures = {self._sink_pool.submit(self._write, sink, method, *args): sink for sink in self.sinks}
+        ok = True
+        for future, sink in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[Sink ERROR] {type(sink).__name__}.{method} failed: {e}", flush=True)
+                ok = False
+        return ok
+
+    def checkpoint(self):
+        self.index.compact()            # sinks bulk-load the file; give them one row per id
+        self._fan_out("checkpoint", self.index.path)
+        self._dirty = False
+
+    # ---------- per-series work --------------------------------------------
+
+    def should_fetch(self, sid):
+        if self.index.is_discontinued(sid):
+            print(f"[Skip] {sid} is DISCONTINUED.", flush=True)
+            self.metrics.inc("crawl_series_total", outcome="discontinued")
+            return False
+        refresh = self.index.needs_refresh(sid)
+        self.metrics.inc("crawl_series_total", outcome="refresh" if refresh else "up_to_date")
+        return refresh
+
+    def fetch_and_store(self, sid):
+        """Fetch sid's observations into every sink; False (and sid in failed) if that did not happen."""
+        try:
+            observations = self.client.observations(sid)
+            if observations is None:
+                print(f"[ERROR] Observations for {sid} could not be fetched.", flush=True)
+                self.failed.add(sid)
+                return False
+            if not observations:
+                print(f"[Obs] No observations for {sid}.", flush=True)
+                return True
+            obs = SeriesObservations(sid, observations)
+            if len(obs):
+                if not self._fan_out("write_observations", obs):
+                    self.failed.add(sid)
+                    return False
+                print(f"[Saved] Observations for {sid}.", flush=True)
+            return True
+        except Exception:
+            self.failed.add(sid)
+            raise
+
+    def _submit(self, fn, *args, then=None):
+        # Bound the number of in-flight series so the walk does not run ahead
+        if len(self._pending) >= self._max_pending:
+            done, _ = wait(self._pending, return_when="FIRST_COMPLETED")
+            for future in done:
+                self._reap(future, self._pending.pop(future))
+        self._pending[self._fetch_pool.submit(fn, *args)] = then
+
+    @staticmethod
+    def _reap(future, then):
+        result = future.result()
+        if then is not None:
+            then(result)
+
+    def _store_row(self, row):
+        self.index.update(row)
+        self._dirty = True
+        self._fan_out("write_series", row)
+
+    def _store_if_fetched(self, row, fetched):
+        if fetched:
+            self._store_row(row)
+
+    def _check_stop(self):
+        if self.stop is not None and self.stop.is_set():
+            raise StopCrawl("Asked to stop.")
+
+    def process_series(self, series):
+        self._check_stop()
+        sid = series["id"]
+        if sid in self.seen_series_ids:
+            return
+        self.seen_series_ids.add(sid)
+        self.total_series += 1
+        if self.series_limit and self.total_series >= self.series_limit:
+            raise StopCrawl(f"Reached limit of {self.series_limit} series.")
+
+        if sid not in self.index:
+            row = metadata_row(series)
+            self.index.add(row)
+            self._dirty = True
+            self._fan_out("write_series", row)
+            self.new_series += 1
+            self.metrics.inc("crawl_series_total", outcome="new")
+            if self.new_series % CHECKPOINT_EVERY == 0:
+                self.checkpoint()
+            fetch_obs = True
+        else:
+            fetch_obs = self.should_fetch(sid)
+
+        if fetch_obs:
+            self._submit(self.fetch_and_store, sid)
+        else:
+            print(f"[Obs] Skipped {sid}, up-to-date.", flush=True)
+
+        if self.total_series % CHECKPOINT_EVERY == 0:
+            print(f"\n[Checkpoint] Processed {self.total_series:,} series.", flush=True)
+
+    def refresh(self, changed_series):
+        """Refresh known-changed series (e.g. from series/updates) without a walk."""
+        self.progress.start()
+        try:
+            for series in changed_series:
+                sid = series["id"]
+                row = metadata_row(series)
+                self.metrics.inc("crawl_series_total", outcome="new" if sid not in self.index else "updated")
+                self.total_series += 1
+                if _is_discontinued([row["title"]])[0]:
+                    self._store_row(row)
+                    print(f"[Skip] {sid} is DISCONTINUED.", flush=True)
+                else:
+                    # the new last_updated goes in only once the observations are stored, so
+                    # a failed fetch is still seen as out of date by later runs
+                    self._submit(self.fetch_and_store, sid, then=partial(self._store_if_fetched, row))
+        finally:
+            self.close()
+        return self.total_series
+
+    def refetch(self, series_ids):
+        """Re-fetch the observations of known series regardless of their age (a backfill)."""
+        self.progress.start()
+        try:
+            for sid in series_ids:
+                self._check_stop()
+                if sid in self.seen_series_ids:
+                    continue
+                self.seen_series_ids.add(sid)
+                self.total_series += 1
+                if self.index.is_discontinued(sid):
+                    self.metrics.inc("crawl_series_total", outcome="discontinued")
+                    continue
+                self.metrics.inc("crawl_series_total", outcome="refresh")
+                self._submit(self.fetch_and_store, sid)
+        except StopCrawl as e:
+            print(f"\n[STOP] {e}", flush=True)
+        finally:
+            self.close()
+        return self.total_series
+
+    # ---------- traversal --------------------------------------------------
+
+    def crawl(self, root=0, recurse=True):
+        """Walk the category tree below root; recurse=False takes only root's own series."""
+        self.progress.start()
+        stack = [(root, 0)]
+        try:
+            while stack:
+                category_id, level = stack.pop()
+                if category_id in self.visited_categories:
+                    continue
+                self.visited_categories.add(category_id)
+                print(f"\n[Category] {'  '*level}Processing category {category_id}", flush=True)
+
+                self.metrics.inc("crawl_categories_total")
+                for series in self.client.category_series(category_id):
+                    self.process_series(series)
+
+                if not recurse:
+                    continue
+                children = self.client.category_children(category_id)
+                stack.extend((child["id"], level + 1) for child in reversed(children))
+        except StopCrawl as e:
+            print(f"\n[STOP] {e}", flush=True)
+        finally:
+            self.close()
+        return self.total_series
+
+    def close(self):
+        # log, don't raise: the checkpoint and sink close below must still run
+        for future, then in self._pending.items():
+            try:
+                self._reap(future, then)
+            except Exception as e:
+                print(f"[ERROR] Fetch failed: {e}", flush=True)
+        self._pending = {}
+        self._fetch_pool.shutdown(wait=True)
+        if self._dirty:
+            self.checkpoint()
+        self._fan_out("close")
+        self._sink_pool.shutdown(wait=True)
+        self.progress.stop()
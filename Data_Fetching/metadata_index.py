@@ -0,0 +1,314 @@
+# metadata_index.py
+# Compact, memory-bounded index over metadata.csv.
+#
+# Only the columns the crawler consults on every series are held in memory, as
+# NumPy arrays: frequency (categorical codes), last_updated (int64 ns since the
+# epoch, UTC) and the DISCONTINUED flag (a packed bitmask). Titles, notes and
+# the remaining columns stay on disk and are parsed on demand from the byte
+# offset of their CSV row.
+import csv
+import io
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+METADATA_COLUMNS = ['id', 'title', 'observation_start', 'observation_end', 'frequency',
+                    'units', 'seasonal_adjustment', 'last_updated', 'notes']
+
+# (min_age, max_age) in days, matched against the frequency text in this order
+REFRESH_WINDOWS = [
+    ("Daily", 1, 3),
+    ("Weekly", 7, 14),
+    ("Monthly", 30, 60),
+    ("Quarterly", 90, 180),
+    ("Annual", 365, 730),
+]
+
+NAT = np.iinfo(np.int64).min
+NS_PER_DAY = 86_400 * 10**9
+CHUNK_ROWS = 200_000
+SCAN_BYTES = 1 << 24
+
+
+def _to_ns(values):
+    ts = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', utc=True)
+    return ts.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _ts_ns(value):
+    ts = pd.Timestamp(value)
+    return (ts.tz_convert("UTC") if ts.tzinfo else ts.tz_localize("UTC")).value
+
+
+def _is_discontinued(titles):
+    return pd.Series(titles, dtype=object).fillna('').astype(str).str.strip().str.upper() \
+        .str.endswith("(DISCONTINUED)").to_numpy(dtype=bool)
+
+
+class MetadataIndex:
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "w", newline="") as f:
+                csv.writer(f, lineterminator="\n").writerow(METADATA_COLUMNS)
+
+        self._load()
+
+    def _load(self):
+        path = self.path
+        with open(path, newline="") as f:
+            self.columns = next(csv.reader(f))
+        self._freq_lookup = {}
+        self.freq_categories = []
+        ids, codes, updated, discontinued = [], [], [], []
+        for chunk in pd.read_csv(path, usecols=['id', 'title', 'frequency', 'last_updated'],
+                                 dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS):
+            ids.append(chunk['id'].to_numpy(dtype=object))
+            codes.append(np.fromiter((self._freq_code(f) for f in chunk['frequency']),
+                                     dtype=np.int16, count=len(chunk)))
+            updated.append(_to_ns(chunk['last_updated']))
+            discontinued.append(_is_discontinued(chunk['title']))
+
+        n = sum(len(a) for a in ids)
+        self._ids = pd.Index(np.concatenate(ids) if ids else np.array([], dtype=object))
+        if not self._ids.is_unique:
+            self._drop_superseded_rows(self._ids.duplicated(keep='last'))
+            return self._load()
+        self._extra = {}          # ids appended after load -> row position
+        self._superseded = 0      # rows on disk replaced by a later copy
+        self._n = n
+        self._freq = self._alloc(np.concatenate(codes) if codes else [], np.int16)
+        self._updated = self._alloc(np.concatenate(updated) if updated else [], np.int64)
+        self._discontinued = np.packbits(np.concatenate(discontinued) if discontinued
+                                         else np.zeros(0, dtype=bool))
+        self._discontinued = self._alloc(self._discontinued, np.uint8)
+        offsets = self._scan_offsets(n)
+        self._starts = self._alloc(offsets[:-1], np.int64)
+        self._ends = self._alloc(offsets[1:], np.int64)
+        self._reader = None
+
+    # ---------- construction helpers ---------------------------------------
+
+    @staticmethod
+    def _alloc(values, dtype):
+        values = np.asarray(values, dtype=dtype)
+        out = np.zeros(max(16, 2 * len(values)), dtype=dtype)
+        out[:len(values)] = values
+        return out
+
+    def _freq_code(self, freq):
+        code = self._freq_lookup.get(freq)
+        if code is None:
+            code = self._freq_lookup[freq] = len(self.freq_categories)
+            self.freq_categories.append(freq)
+        return code
+
+    def _scan_offsets(self, n_rows):
+        # Fast path: one CSV record per physical line, found with a vectorized
+        # newline scan. Falls back to the csv module if a quoted field spans lines.
+        starts = []
+        pos = 0
+        with open(self.path, "rb") as f:
+            while True:
+                block = f.read(SCAN_BYTES)
+                if not block:
+                    break
+                starts.append(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10) + pos + 1)
+                pos += len(block)
+        line_starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+        line_starts = line_starts[line_starts < pos]
+        if len(line_starts) == n_rows:
+            return np.append(line_starts, pos)
+        return self._scan_offsets_csv(pos)
+
+    def _scan_offsets_csv(self, size):
+        consumed = 0
+
+        def lines(f):
+            nonlocal consumed
+            for raw in f:
+                consumed += len(raw)
+                yield raw.decode("utf-8")
+
+        offsets = []
+        with open(self.path, "rb") as f:
+            reader = csv.reader(lines(f))
+            next(reader, None)
+            start = consumed
+            for row in reader:
+                if row:
+                    offsets.append(start)
+                start = consumed
+        offsets.append(size)
+        return np.asarray(offsets, dtype=np.int64)
+
+    def _drop_superseded_rows(self, superseded):
+        # Rows updated in place are appended again; keep only the last copy of each id
+        tmp = f"{self.path}.tmp"
+        with open(self.path, newline="", encoding="utf-8") as src, \
+                open(tmp, "w", newline="", encoding="utf-8") as dst:
+            reader, writer = csv.reader(src), csv.writer(dst, lineterminator="\n")
+            writer.writerow(next(reader))
+            rows = (row for row in reader if row)
+            for drop, row in zip(superseded, rows):
+                if not drop:
+                    writer.writerow(row)
+        os.replace(tmp, self.path)
+
+    def _grow(self):
+        for name in ("_freq", "_updated", "_starts", "_ends"):
+            arr = getattr(self, name)
+            if self._n + 2 > len(arr):
+                setattr(self, name, np.concatenate([arr, np.zeros_like(arr)]))
+        if (self._n >> 3) + 1 >= len(self._discontinued):
+            self._discontinued = np.concatenate([self._discontinued, np.zeros_like(self._discontinued)])
+
+    # ---------- lookup -----------------------------------------------------
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, sid):
+        return self.position(sid) is not None
+
+    def position(self, sid):
+        if sid in self._extra:
+            return self._extra[sid]
+        try:
+            loc = self._ids.get_loc(sid)
+        except KeyError:
+            return None
+        return loc
+
+    @property
+    def ids(self):
+        if not self._extra:
+            return self._ids.to_numpy()
+        return np.concatenate([self._ids.to_numpy(), np.array(list(self._extra), dtype=object)])
+
+    def frequency(self, sid):
+        return self.freq_categories[self._freq[self.position(sid)]]
+
+    def last_updated(self, sid):
+        ns = self._updated[self.position(sid)]
+        return None if ns == NAT else pd.Timestamp(ns, tz="UTC")
+
+    def is_discontinued(self, sid):
+        pos = self.position(sid)
+        return bool((self._discontinued[pos >> 3] >> (7 - (pos & 7))) & 1)
+
+    def get(self, sid):
+        """Full metadata row for sid, parsed lazily from disk."""
+        pos = self.position(sid)
+        if pos is None:
+            return None
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        start, end = self._starts[pos], self._ends[pos]
+        self._reader.seek(start)
+        raw = self._reader.read(end - start).decode("utf-8")
+        row = next(csv.reader(io.StringIO(raw)))
+        return dict(zip(self.columns, row))
+
+    def title(self, sid):
+        return self.get(sid)['title']
+
+    def notes(self, sid):
+        return self.get(sid)['notes']
+
+    # ---------- vectorized filtering --------------------------------------
+
+    def discontinued_mask(self):
+        return np.unpackbits(self._discontinued, count=self._n).astype(bool)
+
+    def frequency_mask(self, contains):
+        hits = np.array([contains in f for f in self.freq_categories] + [False], dtype=bool)
+        return hits[self._freq[:self._n]]
+
+    def refresh_mask(self, now=None):
+        updated = self._updated[:self._n]
+        age = _ts_ns(now or datetime.now(timezone.utc)) - np.where(updated == NAT, 0, updated)
+
+        lo = np.full(len(self.freq_categories) + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        hi = np.full(len(self.freq_categories) + 1, np.iinfo(np.int64).min, dtype=np.int64)
+        for code, freq in enumerate(self.freq_categories):
+            for key, min_days, max_days in REFRESH_WINDOWS:
+                if key in freq:
+                    lo[code], hi[code] = min_days * NS_PER_DAY, max_days * NS_PER_DAY
+                    break
+        codes = self._freq[:self._n]
+        return (updated == NAT) | ((age >= lo[codes]) & (age <= hi[codes]))
+
+    def needs_refresh(self, sid, now=None):
+        pos = self.position(sid)
+        if self._updated[pos] == NAT:
+            return True
+        freq = self.freq_categories[self._freq[pos]]
+        age = _ts_ns(now or datetime.now(timezone.utc)) - self._updated[pos]
+        for key, min_days, max_days in REFRESH_WINDOWS:
+            if key in freq:
+                return min_days * NS_PER_DAY <= age <= max_days * NS_PER_DAY
+        return False
+
+    def filter(self, frequency=None, discontinued=None, updated_after=None):
+        mask = np.ones(self._n, dtype=bool)
+        if frequency is not None:
+            mask &= self.frequency_mask(frequency)
+        if discontinued is not None:
+            mask &= self.discontinued_mask() == discontinued
+        if updated_after is not None:
+            mask &= self._updated[:self._n] >= _ts_ns(updated_after)
+        return self.ids[mask]
+
+    # ---------- updates ----------------------------------------------------
+
+    def add(self, row):
+        """Append a new metadata row to the CSV and the in-memory index."""
+        if row['id'] not in self:
+            self._write_row(row)
+
+    def update(self, row):
+        """Insert or replace the metadata row for row['id']."""
+        self._write_row(row, self.position(row['id']))
+
+    def _write_row(self, row, pos=None):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow([row.get(c, '') for c in self.columns])
+        with open(self.path, "ab+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            start = f.tell()
+            f.write(buffer.getvalue().encode("utf-8"))
+            end = f.tell()
+
+        if pos is not None:
+            self._superseded += 1
+        else:
+            self._grow()
+            pos = self._n
+            self._extra[row['id']] = pos
+            self._n += 1
+        self._starts[pos], self._ends[pos] = start, end
+        self._freq[pos] = self._freq_code(row.get('frequency', ''))
+        self._updated[pos] = _to_ns([row.get('last_updated')])[0]
+        bit = np.uint8(0x80 >> (pos & 7))
+        if _is_discontinued([row.get('title', '')])[0]:
+            self._discontinued[pos >> 3] |= bit
+        else:
+            self._discontinued[pos >> 3] &= ~bit
+
+    def compact(self):
+        """Rewrite the CSV without the rows update() superseded, so it holds one row per id."""
+        if self._superseded:
+            self.close()
+            self._load()
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
@@ -0,0 +1,175 @@
+# release_scheduler.py
+# Release-calendar driven refresh. A persisted release -> series index plus
+# FRED's releases/dates calendar tell us which series can change on which day;
+# shortly after each scheduled publication we re-list just that release and
+# refresh the series whose last_updated moved. A check that fails is logged
+# and, when no later check of that release is queued, retried a few times.
+import heapq
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+RELEASE_TZ = ZoneInfo("America/New_York")
+# FRED has no publication times, only dates; most releases land at 8:30 or
+# 10:00 ET, stragglers later in the day, so each release is checked at these times
+CHECK_TIMES = ("09:00", "11:00", "17:00")
+INDEX_MAX_AGE = timedelta(days=7)
+LOOKAHEAD_DAYS = 7
+RETRY_AFTER = timedelta(minutes=30)   # re-check of a release that failed with no check left that day
+MAX_RETRIES = 6
+
+
+class ReleaseIndex:
+    def __init__(self, releases=None, built=None):
+        self.releases = releases or {}     # release_id -> {"name": ..., "series": [...]}
+        self.built = built
+
+    @classmethod
+    def build(cls, client):
+        releases = {}
+        for release in client.paged("releases", "releases", sort_order="asc", sort_by="release_id"):
+            rid = release["id"]
+            series = [s["id"] for s in client.paged("release/series", "seriess", release_id=rid)]
+            releases[rid] = {"name": release.get("name", ""), "series": series}
+            print(f"[Releases] {rid} {release.get('name', '')}: {len(series)} series", flush=True)
+        return cls(releases, datetime.now(timezone.utc))
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        releases = {int(rid): rel for rid, rel in data["releases"].items()}
+        return cls(releases, datetime.fromisoformat(data["built"]))
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"built": self.built.isoformat(),
+                       "releases": {str(rid): rel for rid, rel in self.releases.items()}}, f)
+        os.replace(tmp, path)
+
+    def is_stale(self, now=None):
+        return self.built is None or (now or datetime.now(timezone.utc)) - self.built > INDEX_MAX_AGE
+
+    @property
+    def total_series(self):
+        return sum(len(rel["series"]) for rel in self.releases.values())
+
+
+def load_or_build_index(client, path):
+    index = ReleaseIndex.load(path)
+    if index is None or index.is_stale():
+        print("[Releases] Building release -> series index.", flush=True)
+        index = ReleaseIndex.build(client)
+        index.save(path)
+    return index
+
+
+def upcoming_release_dates(client, start=None, days=LOOKAHEAD_DAYS):
+    start = start or date.today()
+    end = start + timedelta(days=days)
+    for item in client.paged("releases/dates", "release_dates", realtime_start=start.isoformat(),
+                             realtime_end=end.isoformat(), sort_order="asc",
+                             include_release_dates_with_no_data="true"):
+        yield int(item["release_id"]), date.fromisoformat(item["date"])
+
+
+def check_times(release_date):
+    for hhmm in CHECK_TIMES:
+        hour, minute = map(int, hhmm.split(":"))
+        yield datetime(release_date.year, release_date.month, release_date.day,
+                       hour, minute, tzinfo=RELEASE_TZ).astimezone(timezone.utc)
+
+
+def changed_release_series(client, metadata_index, release_id):
+    """Series of one release whose last_updated is newer than what we hold."""
+    changed = []
+    for series in client.paged("release/series", "seriess", release_id=release_id):
+        sid = series["id"]
+        if sid not in metadata_index:
+            changed.append(series)
+            continue
+        known = metadata_index.last_updated(sid)
+        fresh = datetime_or_none(series.get("last_updated"))
+        if known is None or fresh is None or fresh > known:
+            changed.append(series)
+    return changed
+
+
+def datetime_or_none(value):
+    ts = pd.to_datetime(value, errors="coerce", utc=True)
+    return None if pd.isna(ts) else ts
+
+
+def run_scheduler(client, make_crawler, index_path, tracked_releases=None, now=time.time):
+    """Run forever: fetch each release's changed series right after it is published.
+
+    make_crawler() must return a fresh crawler_core.Crawler per run (a crawler
+    is closed after each refresh). tracked_releases optionally limits the
+    schedule to a set of release ids.
+    """
+    index = load_or_build_index(client, index_path)
+    print(f"[Releases] Index covers {len(index.releases)} releases, {index.total_series} series.", flush=True)
+    queue, scheduled, planned_on = [], set(), None
+    retries = {}                          # release_id -> retries scheduled since its last clean check
+
+    while True:
+        today = datetime.now(RELEASE_TZ).date()
+        if planned_on != today:
+            try:
+                if index.is_stale():
+                    index = load_or_build_index(client, index_path)
+                for release_id, release_date in upcoming_release_dates(client, today):
+                    if release_id not in index.releases:
+                        continue
+                    if tracked_releases and release_id not in tracked_releases:
+                        continue
+                    for fire_at in check_times(release_date):
+                        entry = (fire_at.timestamp(), release_id)
+                        if entry[0] >= now() and entry not in scheduled:
+                            scheduled.add(entry)
+                            heapq.heappush(queue, entry)
+                planned_on = today
+                print(f"[Releases] {len(queue)} checks scheduled.", flush=True)
+            except Exception as e:
+                # planned_on stays behind, so the plan is retried after the next sleep
+                print(f"[Releases ERROR] Planning {today} failed: {e}", flush=True)
+
+        # sleep at most an hour so the calendar is replanned every day
+        wait_for = queue[0][0] - now() if queue else 3600
+        if wait_for > 0:
+            time.sleep(min(wait_for, 3600))
+            continue
+
+        entry = heapq.heappop(queue)
+        scheduled.discard(entry)
+        release_id = entry[1]
+        name = index.releases.get(release_id, {}).get("name", "")
+        # one bad check (a FRED 5xx, a sink error) must not end the daemon. A series
+        # whose fetch failed keeps its old last_updated in the index (Crawler.refresh),
+        # so the release's next check picks it up again.
+        try:
+            crawler = make_crawler()
+            changed = changed_release_series(client, crawler.index, release_id)
+            print(f"[Releases] {release_id} {name}: {len(changed)} series changed.", flush=True)
+            crawler.refresh(changed)
+            ok = not crawler.failed
+            if not ok:
+                print(f"[Releases] {release_id} {name}: {len(crawler.failed)} series failed.", flush=True)
+        except Exception as e:
+            print(f"[Releases ERROR] Check of {release_id} {name} failed: {e}", flush=True)
+            ok = False
+
+        if ok:
+            retries.pop(release_id, None)
+        elif not any(rid == release_id for _, rid in queue) and retries.get(release_id, 0) < MAX_RETRIES:
+            retries[release_id] = retries.get(release_id, 0) + 1
+            entry = (now() + RETRY_AFTER.total_seconds(), release_id)
+            scheduled.add(entry)
+            heapq.heappush(queue, entry)
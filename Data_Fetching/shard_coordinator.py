@@ -0,0 +1,354 @@
+# shard_coordinator.py
+# Distributed crawl: the work is split into shards kept in one coordination
+# table (a SQLite file for processes on one machine, Postgres across nodes)
+# and every worker process leases shards from it.
+#
+#   coord = ShardCoordinator("sqlite:///shards.db")
+#   plan_categories(client, coord)                  # once; idempotent
+#   run_worker(coord, make_crawler, "category")     # in as many processes as you like
+#
+# Shard kinds:
+#   category  a category frontier from plan_categories(): categories above
+#             SHARD_DEPTH contribute only their own series, categories at
+#             SHARD_DEPTH their whole subtree
+#   ids       a hash partition of the known series ids, for re-fetching the
+#             observations of everything already in the metadata
+#   key       one FRED API key; a worker holds one key lease for its lifetime,
+#             so every key stays within its own rate limit
+#   merge     merges the workers' metadata parts once every category is done
+#
+# A lease is a compare-and-set on (owner, token): it expires LEASE_SECONDS
+# after the last heartbeat, after which any worker may take the shard over
+# (the token is bumped, so the old owner's heartbeat and completion fail and
+# it abandons the shard). Sinks already write idempotently, so a shard that
+# is crawled twice after a takeover only costs API calls.
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from metadata_index import METADATA_COLUMNS, MetadataIndex
+
+LEASE_SECONDS = 90
+HEARTBEAT_SECONDS = 15
+MAX_ATTEMPTS = 5          # a shard that kills this many workers is left for a human
+SHARD_DEPTH = 2
+ID_SHARDS = 256
+PARTS_PREFIX = "metadata/parts/"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_shards (
+    shard TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    token INTEGER NOT NULL DEFAULT 0,
+    expires DOUBLE PRECISION NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created DOUBLE PRECISION,
+    finished DOUBLE PRECISION,
+    series INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Lease:
+    def __init__(self, shard, kind, payload, token):
+        self.shard = shard
+        self.kind = kind
+        self.payload = payload
+        self.token = token
+        self.lost = threading.Event()     # set when another worker took the shard over
+
+
+class ShardCoordinator:
+    def __init__(self, url, worker_id=None, lease_seconds=LEASE_SECONDS, heartbeat=HEARTBEAT_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat = heartbeat
+        if url.startswith("postgresql"):
+            import psycopg2
+
+            self.con = psycopg2.connect(url.replace("postgresql+psycopg2://", "postgresql://"))
+            self.con.autocommit = True
+            self._param = "%s"
+        else:
+            path = url.split("sqlite:///", 1)[-1]
+            self.con = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self._param = "?"
+        self._lock = threading.Lock()
+        self._held = {}                   # shard -> Lease
+        self._stop = threading.Event()
+        self._execute(SCHEMA)
+        self._beat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._beat.start()
+
+    def _execute(self, sql, params=()):
+        """(rowcount, rows) of one autocommitted statement."""
+        with self._lock:
+            cur = self.con.cursor()
+            try:
+                cur.execute(sql.replace("?", self._param), params)
+                rows = cur.fetchall() if cur.description else []
+                return cur.rowcount, rows
+            finally:
+                cur.close()
+
+    # ---------- planning --------------------------------------------------
+
+    def add(self, shards):
+        """Register (shard, kind, payload) rows in one transaction, so a plan is
+        never half there; existing shards are left as they are."""
+        now = time.time()
+        rows = [(shard, kind, json.dumps(payload), now) for shard, kind, payload in shards]
+        sql = "INSERT INTO crawl_shards (shard, kind, payload, created) VALUES (?, ?, ?, ?) " \
+              "ON CONFLICT (shard) DO NOTHING"
+        with self._lock:
+            cur = self.con.cursor()
+            try:
+                cur.execute("BEGIN")
+                cur.executemany(sql.replace("?", self._param), rows)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+
+    def count(self, kind, state=None):
+        sql, params = "SELECT count(*) FROM crawl_shards WHERE kind = ?", [kind]
+        if state:
+            sql, params = sql + " AND state = ?", params + [state]
+        return self._execute(sql, params)[1][0][0]
+
+    def remaining(self, kind):
+        """Shards of kind that are neither done nor given up on."""
+        return self._execute("SELECT count(*) FROM crawl_shards WHERE kind = ? AND state = 'pending' "
+                             "AND attempts < ?", (kind, MAX_ATTEMPTS))[1][0][0]
+
+    def started(self, kind):
+        """When the shards of kind were planned, as a UTC datetime."""
+        created = self._execute("SELECT min(created) FROM crawl_shards WHERE kind = ?", (kind,))[1][0][0]
+        return datetime.fromtimestamp(created, timezone.utc) if created else None
+
+    def status(self):
+        _, rows = self._execute("SELECT kind, state, count(*), sum(series), "
+                                "sum(CASE WHEN owner IS NOT NULL AND expires >= ? THEN 1 ELSE 0 END) "
+                                "FROM crawl_shards GROUP BY kind, state ORDER BY kind, state", (time.time(),))
+        return pd.DataFrame(rows, columns=["kind", "state", "shards", "series", "leased"])
+
+    # ---------- leases ----------------------------------------------------
+
+    def claim(self, kind):
+        """Lease one free or expired shard of kind; None if there is none right now."""
+        now = time.time()
+        _, candidates = self._execute(
+            "SELECT shard FROM crawl_shards WHERE kind = ? AND state = 'pending' AND (attempts < ? OR kind = 'key') "
+            "AND (owner IS NULL OR expires < ?) ORDER BY attempts, shard LIMIT 16", (kind, MAX_ATTEMPTS, now))
+        for (shard,) in candidates:
+            claimed, _ = self._execute(
+                "UPDATE crawl_shards SET owner = ?, token = token + 1, expires = ?, attempts = attempts + 1 "
+                "WHERE shard = ? AND state = 'pending' AND (owner IS NULL OR expires < ?)",
+                (self.worker_id, now + self.lease_seconds, shard, now))
+            if claimed != 1:
+                continue                  # another worker got there first
+            _, rows = self._execute("SELECT payload, token FROM crawl_shards WHERE shard = ?", (shard,))
+            lease = Lease(shard, kind, json.loads(rows[0][0]), rows[0][1])
+            with self._lock:
+                self._held[shard] = lease
+            return lease
+        return None
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat):
+            with self._lock:
+                held = list(self._held.values())
+            for lease in held:
+                try:
+                    renewed, _ = self._execute(
+                        "UPDATE crawl_shards SET expires = ? WHERE shard = ? AND owner = ? AND token = ?",
+                        (time.time() + self.lease_seconds, lease.shard, self.worker_id, lease.token))
+                except Exception as e:
+                    print(f"[Shard] Heartbeat failed: {e}", flush=True)
+                    continue              # try again next beat; the lease may still be ours
+                if renewed != 1:
+                    print(f"[Shard] Lost the lease on {lease.shard}.", flush=True)
+                    lease.lost.set()
+                    self._forget(lease)
+
+    def _forget(self, lease):
+        with self._lock:
+            self._held.pop(lease.shard, None)
+
+    def complete(self, lease, series=0):
+        """Mark the shard done; False if the lease was lost in the meantime."""
+        self._forget(lease)
+        done, _ = self._execute(
+            "UPDATE crawl_shards SET state = 'done', owner = NULL, finished = ?, series = ? "
+            "WHERE shard = ? AND owner = ? AND token = ?",
+            (time.time(), int(series), lease.shard, self.worker_id, lease.token))
+        return done == 1
+
+    def release(self, lease, failed=False):
+        """Give the shard back (e.g. on shutdown) so others need not wait for it
+        to expire; a clean release does not count as a failed attempt, one after
+        the work raised (failed=True) does."""
+        self._forget(lease)
+        refund = "" if failed else ", attempts = attempts - 1"
+        self._execute(f"UPDATE crawl_shards SET owner = NULL, expires = 0{refund} "
+                      "WHERE shard = ? AND owner = ? AND token = ?", (lease.shard, self.worker_id, lease.token))
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            held = list(self._held.values())
+        for lease in held:
+            self.release(lease)
+        self.con.close()
+
+
+# ---------- planning ----------------------------------------------------------
+
+def plan_categories(client, coordinator, depth=SHARD_DEPTH, root=0):
+    """Split the category tree at depth into shards (plus a merge shard); skipped if already planned."""
+    if coordinator.count("category"):
+        return 0
+    shards, frontier = [], [(root, 0)]
+    while frontier:
+        category_id, level = frontier.pop()
+        recurse = level >= depth
+        shards.append((f"category:{category_id}", "category", {"category": category_id, "recurse": recurse}))
+        if not recurse:
+            frontier.extend((child["id"], level + 1) for child in client.category_children(category_id))
+    coordinator.add(shards + [("merge", "merge", {})])
+    print(f"[Shard] Planned {len(shards)} category shards at depth {depth}.", flush=True)
+    return len(shards)
+
+
+def plan_ids(coordinator, parts=ID_SHARDS):
+    coordinator.add((f"ids:{k}/{parts}", "ids", {"part": k, "parts": parts}) for k in range(parts))
+
+
+def plan_keys(coordinator, api_keys):
+    """One key shard per API key; the shard name does not reveal the key."""
+    coordinator.add((f"key:{zlib.crc32(key.encode()):08x}", "key", {"key": key}) for key in api_keys)
+
+
+def ids_in_part(ids, part, parts):
+    return [sid for sid in ids if zlib.crc32(sid.encode()) % parts == part]
+
+
+# ---------- metadata parts ------------------------------------------------------
+
+def part_key(lease, prefix=PARTS_PREFIX):
+    """S3 key of a shard's metadata part; a shard taken over rewrites the same part."""
+    return f"{prefix}{lease.shard.replace(':', '-').replace('/', '-')}.csv"
+
+
+def merge_metadata_parts(bucket, metadata_key, prefix=PARTS_PREFIX):
+    """Fold every worker's metadata part into metadata_key (later rows win) and delete the parts."""
+    local = os.path.join(tempfile.gettempdir(), f"fred_metadata_merge_{os.getpid()}.csv")
+    try:
+        bucket.download_file(metadata_key, local)
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            raise
+        if os.path.exists(local):
+            os.remove(local)
+    index = MetadataIndex(local)
+    parts = list(bucket.objects.filter(Prefix=prefix))
+    for part in parts:
+        body = part.get()["Body"]
+        rows = pd.read_csv(body, dtype=str, keep_default_na=False)
+        for row in rows.reindex(columns=METADATA_COLUMNS, fill_value="").to_dict("records"):
+            index.update(row)
+    index.close()
+    bucket.upload_file(local, metadata_key)
+    for part in parts:
+        part.delete()
+    os.remove(local)
+    print(f"[Shard] Merged {len(parts)} metadata parts into {metadata_key}.", flush=True)
+    return len(parts)
+
+
+# ---------- worker --------------------------------------------------------------
+
+def _hold_key(coordinator, poll):
+    while True:
+        lease = coordinator.claim("key")
+        if lease is not None:
+            return lease
+        if not coordinator.count("key"):
+            raise RuntimeError("No API keys registered; call plan_keys() first.")
+        print("[Shard] Every API key is leased; waiting.", flush=True)
+        time.sleep(poll)
+
+
+def run_worker(coordinator, make_crawler, kind="category", make_client=None, on_merge=None, poll=None):
+    """Lease and crawl shards of kind until none are left. make_crawler(client,
+    lease) returns a fresh crawler_core.Crawler that stops once lease.lost is
+    set (and writes its metadata to part_key(lease)); make_client(api_key)
+    builds the FredClient for the leased key. on_merge(started) runs once, on
+    the worker that finds every category shard done."""
+    poll = poll or coordinator.lease_seconds / 3
+    key = _hold_key(coordinator, poll)
+    client = make_client(key.payload["key"])
+    seen = set()                          # series already handled by this worker
+    done = 0
+    try:
+        while True:
+            if key.lost.is_set():
+                key = _hold_key(coordinator, poll)
+                client = make_client(key.payload["key"])
+            lease = coordinator.claim(kind)
+            if lease is None:
+                if not coordinator.remaining(kind):
+                    break
+                time.sleep(poll)          # the rest are leased; wait in case an owner dies
+                continue
+
+            print(f"[Shard] {coordinator.worker_id} took {lease.shard}.", flush=True)
+            try:
+                crawler = make_crawler(client, lease)
+                crawler.seen_series_ids = seen
+                if kind == "category":
+                    total = crawler.crawl(lease.payload["category"], recurse=lease.payload["recurse"])
+                else:
+                    ids = ids_in_part(crawler.index.ids, lease.payload["part"], lease.payload["parts"])
+                    total = crawler.refetch(ids)
+            except Exception:
+                # a counted attempt, so a shard that always crashes stops at MAX_ATTEMPTS
+                coordinator.release(lease, failed=True)
+                raise
+            if coordinator.complete(lease, total):
+                done += 1
+                print(f"[Shard] {lease.shard} done: {total} series.", flush=True)
+            else:
+                print(f"[Shard] Lost {lease.shard} to another worker before finishing.", flush=True)
+
+        if kind == "category" and on_merge is not None and not coordinator.remaining("category"):
+            merge = coordinator.claim("merge")
+            if merge is not None:
+                try:
+                    on_merge(coordinator.started("category"))
+                except Exception:
+                    coordinator.release(merge, failed=True)
+                    raise
+                coordinator.complete(merge)
+    finally:
+        coordinator.release(key)
+    print(f"[Shard] {coordinator.worker_id} finished {done} {kind} shards.", flush=True)
+    return done
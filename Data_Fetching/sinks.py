@@ -0,0 +1,186 @@
+# sinks.py
+# Storage back-ends for crawler_core.Crawler. A sink receives every new series'
+# metadata row, every fetched SeriesObservations and periodic checkpoints of
+# the metadata file; writes must be idempotent so re-crawls are safe.
+import os
+import shutil
+import threading
+import time
+
+
+class Sink:
+    def write_series(self, row):
+        pass
+
+    def write_observations(self, obs):
+        pass
+
+    def checkpoint(self, metadata_path):
+        pass
+
+    def close(self):
+        pass
+
+
+class S3Sink(Sink):
+    def __init__(self, bucket, prefix="observations/", metadata_key="metadata/metadata.csv"):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.metadata_key = metadata_key
+
+    def _retry(self, action, key, *args, **kwargs):
+        for attempt in range(3):
+            try:
+                action(*args, **kwargs)
+                return
+            except Exception as e:
+                print(f"[S3 ERROR] Attempt {attempt+1} failed to upload {key}: {e}", flush=True)
+                time.sleep(2)
+        raise RuntimeError(f"Failed to upload {key} after retries.")
+
+    def write_observations(self, obs):
+        key = f"{self.prefix}{obs.series_id}.csv"
+        body = obs.csv_bytes
+        self._retry(self.bucket.put_object, key, Key=key, Body=body, ContentLength=len(body))
+
+    def checkpoint(self, metadata_path):
+        if self.metadata_key is None:        # sharded workers upload parts instead (MetadataPartSink)
+            return
+        self._retry(self.bucket.upload_file, self.metadata_key, metadata_path, self.metadata_key)
+        print(f"[S3] Uploaded {self.metadata_key}.", flush=True)
+
+
+class MetadataPartSink(S3Sink):
+    """Uploads only the metadata rows this crawler wrote, as one CSV part per
+    shard; shard_coordinator.merge_metadata_parts folds the parts together."""
+
+    def __init__(self, bucket, key):
+        super().__init__(bucket, metadata_key=key)
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def write_series(self, row):
+        with self._lock:
+            self._rows[row['id']] = row
+
+    def write_observations(self, obs):
+        pass
+
+    def checkpoint(self, metadata_path):
+        import pandas as pd
+        from metadata_index import METADATA_COLUMNS
+
+        with self._lock:
+            rows = list(self._rows.values())
+        if not rows:
+            return
+        body = pd.DataFrame(rows, columns=METADATA_COLUMNS).to_csv(index=False).encode("utf-8")
+        self._retry(self.bucket.put_object, self.metadata_key, Key=self.metadata_key, Body=body,
+                    ContentLength=len(body))
+
+
+class LocalCSVSink(Sink):
+    def __init__(self, data_dir="data", metadata_file=None):
+        self.data_dir = data_dir
+        self.metadata_file = metadata_file
+        os.makedirs(data_dir, exist_ok=True)
+
+    def write_observations(self, obs):
+        path = os.path.join(self.data_dir, f"{obs.series_id}.csv")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(obs.csv_bytes)
+        os.replace(tmp, path)
+
+    def checkpoint(self, metadata_path):
+        if self.metadata_file and os.path.abspath(self.metadata_file) != os.path.abspath(metadata_path):
+            shutil.copyfile(metadata_path, self.metadata_file)
+
+
+class PostgresSink(Sink):
+    def __init__(self, url):
+        from sqlalchemy import create_engine, Table, Column, String, MetaData, Float
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        self._pg_insert = pg_insert
+        self.engine = create_engine(url)
+        metadata = MetaData()
+        self.fred_series = Table('fred_series', metadata,
+            Column('id', String, primary_key=True),
+            Column('title', String),
+            Column('observation_start', String),
+            Column('observation_end', String),
+            Column('frequency', String),
+            Column('units', String),
+            Column('seasonal_adjustment', String),
+            Column('last_updated', String),
+            Column('notes', String),
+        )
+        self.fred_observations = Table('fred_observations', metadata,
+            Column('series_id', String, primary_key=True),
+            Column('date', String, primary_key=True),
+            Column('value', Float),
+        )
+        metadata.create_all(self.engine)
+
+    def write_series(self, row):
+        stmt = self._pg_insert(self.fred_series).values(row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={c: stmt.excluded[c] for c in row if c != 'id'},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def write_observations(self, obs):
+        table = self.fred_observations
+        stmt = self._pg_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['series_id', 'date'],
+            set_={'value': stmt.excluded.value},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt, obs.rows)
+
+    def close(self):
+        self.engine.dispose()
+
+
+class CatalogSink(Sink):
+    """Keeps the SQLite catalog (catalog.py) in step with the crawl; rows are
+    buffered and written in one transaction per batch or checkpoint."""
+
+    def __init__(self, path, batch_size=500):
+        from catalog import Catalog
+
+        self.catalog = Catalog(path)
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        # first run against an existing crawl: hold rows until the first checkpoint
+        # bulk-loads the metadata file into the still empty catalog
+        self._bootstrap = len(self.catalog) == 0
+
+    def _flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            self.catalog.upsert(rows)
+
+    def write_series(self, row):
+        with self._lock:
+            self._pending.append(row)
+            full = not self._bootstrap and len(self._pending) >= self.batch_size
+        if full:
+            self._flush()
+
+    def checkpoint(self, metadata_path):
+        if self._bootstrap:
+            self._bootstrap = False
+            if os.path.exists(metadata_path):
+                self.catalog.load_csv(metadata_path)
+        self._flush()
+
+    def close(self):
+        self._flush()
+        self.catalog.close()
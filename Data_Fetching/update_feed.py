@@ -0,0 +1,133 @@
+# update_feed.py
+# Change-feed refresh: instead of re-walking the category tree, page through
+# FRED's series/updates endpoint for the time since the last successful run
+# (the high-water mark) and refresh only the series that actually changed.
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from crawler_core import metadata_row
+
+HWM_KEY = 'metadata/updates_hwm.json'
+# series/updates only covers roughly the last two weeks; older marks need a full walk
+MAX_LOOKBACK = timedelta(days=13)
+WINDOW = timedelta(hours=6)
+OVERLAP = timedelta(minutes=15)   # re-read a little before the mark to absorb clock skew
+
+
+def _fmt(ts):
+    return ts.astimezone(timezone.utc).strftime("%Y%m%d%H%M")
+
+
+class HighWaterMark:
+    """The time the change feed has been applied through, plus the series
+    whose refresh failed and must be retried whatever the feed says."""
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _write(self, payload):
+        raise NotImplementedError
+
+    def load(self):
+        payload = self._read()
+        return None if payload is None else datetime.fromisoformat(payload["updated_through"])
+
+    def retries(self):
+        payload = self._read()
+        return [] if payload is None else payload.get("retry", [])
+
+    def save(self, ts, retry=()):
+        self._write({"updated_through": ts.isoformat(), "retry": list(retry)})
+
+
+class FileHighWaterMark(HighWaterMark):
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _write(self, payload):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, self.path)
+
+
+class S3HighWaterMark(HighWaterMark):
+    def __init__(self, bucket, key=HWM_KEY):
+        self.bucket = bucket
+        self.key = key
+
+    def _read(self):
+        try:
+            body = self.bucket.Object(self.key).get()["Body"].read()
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(body)
+
+    def _write(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.bucket.put_object(Key=self.key, Body=body, ContentLength=len(body))
+
+
+def failed_rows(crawler, series=()):
+    """Metadata rows of the series crawler could not store, for HighWaterMark.save(retry=...)."""
+    rows = {s["id"]: metadata_row(s) for s in series if s["id"] in crawler.failed}
+    for sid in crawler.failed - set(rows):
+        row = crawler.index.get(sid)
+        if row is not None:
+            rows[sid] = row
+    return list(rows.values())
+
+
+def updated_series(client, since, until, window=WINDOW, filter_value="all"):
+    """Yield each series changed in [since, until) once, with its newest metadata.
+
+    The range is split into windows so that no single listing grows past what
+    offset paging can reliably return; series touched in several windows are
+    de-duplicated, keeping the latest last_updated.
+    """
+    latest = {}
+    start = since
+    while start < until:
+        end = min(start + window, until)
+        for series in client.paged("series/updates", "seriess", filter_value=filter_value,
+                                   start_time=_fmt(start), end_time=_fmt(end)):
+            prev = latest.get(series["id"])
+            if prev is None or series.get("last_updated", "") >= prev.get("last_updated", ""):
+                latest[series["id"]] = series
+        start = end
+    return list(latest.values())
+
+
+def run_updates(crawler, hwm, now=None):
+    """Refresh everything changed since the stored mark.
+
+    Returns False without doing anything when there is no usable mark (first
+    run, or the last run is older than the feed's lookback), in which case the
+    caller should fall back to a full category walk.
+    """
+    now = now or datetime.now(timezone.utc)
+    since = hwm.load()
+    if since is None or now - since > MAX_LOOKBACK:
+        print(f"[Updates] No usable high-water mark ({since}); a full crawl is required.", flush=True)
+        return False
+
+    changed = updated_series(crawler.client, since - OVERLAP, now)
+    print(f"[Updates] {len(changed)} series changed since {since.isoformat()}.", flush=True)
+    retry = [row for row in hwm.retries() if row["id"] not in {s["id"] for s in changed}]
+    if retry:
+        print(f"[Updates] Retrying {len(retry)} series that failed last time.", flush=True)
+    crawler.refresh(changed + retry)
+    failed = failed_rows(crawler, changed + retry)
+    if failed:
+        print(f"[Updates] {len(failed)} series failed; kept for the next run.", flush=True)
+    hwm.save(now, retry=failed)
+    return True
@@ -0,0 +1,292 @@
+# vintage_store.py
+# Revision history of the observations. Each series is one small .npz blob
+# holding its vintages as deltas: the first vintage carries every (date,
+# value), later ones only the dates whose value changed, appeared or was
+# removed (NaN), keyed by the realtime_start at which FRED published them.
+#
+#   store = VintageStore(LocalBlobs("vintages"))      # or S3Blobs(bucket)
+#   store.as_of("GDP", "2020-06-30")                  # GDP as known on that day
+#
+# An as-of read patches the deltas of every vintage up to that day in one
+# vectorized pass (last write per date wins), so point-in-time backtests cost
+# about as much as reading the latest series.
+import io
+import os
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from sinks import Sink
+
+VINTAGE_PREFIX = "vintages/"
+DELETED = np.nan          # a delta value of NaN removes the date from the series
+OBSERVATIONS_PAGE = 100_000   # series/observations' row limit per request
+
+
+def _days(values):
+    # straight to datetime64[D]: pandas' ns timestamps stop in 2262, ALFRED's open end is 9999-12-31
+    return np.asarray(pd.Series(values).to_numpy(), dtype="datetime64[D]").astype(np.int64)
+
+
+def _day(value):
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+
+# ---------- blob back-ends ----------------------------------------------------
+
+class LocalBlobs:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def read(self, sid):
+        try:
+            with open(os.path.join(self.root, f"{sid}.npz"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def version(self, sid):
+        try:
+            st = os.stat(os.path.join(self.root, f"{sid}.npz"))
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def write(self, sid, body):
+        path = os.path.join(self.root, f"{sid}.npz")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+
+class S3Blobs:
+    def __init__(self, bucket, prefix=VINTAGE_PREFIX):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def read(self, sid):
+        try:
+            return self.bucket.Object(f"{self.prefix}{sid}.npz").get()["Body"].read()
+        except self.bucket.meta.client.exceptions.NoSuchKey:
+            return None
+
+    def version(self, sid):
+        try:
+            return self.bucket.Object(f"{self.prefix}{sid}.npz").e_tag
+        except Exception:
+            return None
+
+    def write(self, sid, body):
+        key = f"{self.prefix}{sid}.npz"
+        for attempt in range(3):
+            try:
+                self.bucket.put_object(Key=key, Body=body, ContentLength=len(body))
+                return
+            except Exception as e:
+                print(f"[S3 ERROR] Attempt {attempt+1} failed to upload {key}: {e}", flush=True)
+                time.sleep(2)
+        raise RuntimeError(f"Failed to upload {key} after retries.")
+
+
+# ---------- history of one series ---------------------------------------------
+
+class SeriesHistory:
+    """Vintages of one series. Delta i is dates[offsets[i]:offsets[i+1]]
+    (int32 days since the epoch) with their values, published on keys[i]."""
+
+    def __init__(self, keys=None, offsets=None, dates=None, values=None):
+        self.keys = np.asarray([] if keys is None else keys, dtype=np.int32)
+        self.offsets = np.asarray([0] if offsets is None else offsets, dtype=np.int64)
+        self.dates = np.asarray([] if dates is None else dates, dtype=np.int32)
+        self.values = np.asarray([] if values is None else values, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def decode(cls, body):
+        if body is None:
+            return cls()
+        with np.load(io.BytesIO(body)) as data:
+            return cls(data["keys"], data["offsets"], data["dates"], data["values"])
+
+    def encode(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, keys=self.keys, offsets=self.offsets, dates=self.dates, values=self.values)
+        return buffer.getvalue()
+
+    def state(self, n_vintages=None):
+        """(dates, values) after applying the first n_vintages deltas, sorted by date."""
+        n = self.offsets[len(self) if n_vintages is None else n_vintages]
+        dates, values = self.dates[:n], self.values[:n]
+        # last write per date wins: unique over the reversed deltas keeps the latest one
+        uniq, pos = np.unique(dates[::-1], return_index=True)
+        vals = values[::-1][pos]
+        keep = ~np.isnan(vals)
+        return uniq[keep], vals[keep]
+
+    def append(self, key, dates, values):
+        """Add a vintage published on day key holding the full series (dates,
+        values); stores only what changed. Returns False if nothing changed."""
+        dates = np.asarray(dates, dtype=np.int32)
+        values = np.asarray(values, dtype=np.float64)
+        uniq, pos = np.unique(dates[::-1], return_index=True)
+        dates, values = uniq, values[::-1][pos]
+        dates, values = dates[~np.isnan(values)], values[~np.isnan(values)]
+
+        base = len(self)
+        if base and key <= self.keys[-1]:
+            if key < self.keys[-1]:
+                raise ValueError(f"vintage {key} is older than the latest one ({self.keys[-1]})")
+            base -= 1                    # re-fetched on the same day: replace that vintage
+        prev_dates, prev_values = self.state(base)
+
+        # dates that are new or changed, plus dates that disappeared (as DELETED)
+        idx = np.clip(np.searchsorted(prev_dates, dates), 0, max(len(prev_dates) - 1, 0))
+        known = (prev_dates[idx] == dates) if len(prev_dates) else np.zeros(len(dates), dtype=bool)
+        changed = ~known | (prev_values[idx] != values if len(prev_values) else True)
+        gone = prev_dates[~np.isin(prev_dates, dates)]
+        delta_dates = np.concatenate([dates[changed], gone]).astype(np.int32)
+        delta_values = np.concatenate([values[changed], np.full(len(gone), DELETED)])
+        if base == len(self) and not len(delta_dates):
+            return False
+
+        order = np.argsort(delta_dates, kind="stable")
+        cut = self.offsets[base]
+        self.keys = np.append(self.keys[:base], np.int32(key))
+        self.dates = np.concatenate([self.dates[:cut], delta_dates[order]])
+        self.values = np.concatenate([self.values[:cut], delta_values[order]])
+        self.offsets = np.append(self.offsets[:base + 1], len(self.dates))
+        return True
+
+    def as_of(self, day):
+        """(dates, values) as known on day: every vintage published on or before it."""
+        return self.state(int(np.searchsorted(self.keys, day, side="right")))
+
+
+# ---------- store ---------------------------------------------------------------
+
+class VintageStore:
+    def __init__(self, blobs, cache_items=256):
+        self.blobs = blobs
+        self.cache_items = cache_items
+        self._cache = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _series_lock(self, sid):
+        with self._lock:
+            return self._locks.setdefault(sid, threading.Lock())
+
+    def history(self, sid):
+        """SeriesHistory of sid; cached, and re-read when the blob's own version
+        (ETag or mtime) differs from the one it was cached with."""
+        version = self.blobs.version(sid)      # before the read: a racing write only forces a re-read
+        with self._lock:
+            cached = self._cache.get(sid)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        history = SeriesHistory.decode(self.blobs.read(sid))
+        with self._lock:
+            self._cache.pop(sid, None)
+            if len(self._cache) >= self.cache_items:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[sid] = (version, history)
+        return history
+
+    def record(self, sid, realtime_start, dates, values):
+        """Record the series as published on realtime_start; returns True if it was a revision."""
+        with self._series_lock(sid):
+            history = SeriesHistory.decode(self.blobs.read(sid))
+            if not history.append(_day(realtime_start), _days(dates), values):
+                return False
+            self.blobs.write(sid, history.encode())
+            with self._lock:
+                self._cache.pop(sid, None)
+            return True
+
+    def as_of(self, sid, as_of=None):
+        """date/value DataFrame of sid as known on as_of (default: latest vintage)."""
+        history = self.history(sid)
+        if as_of is None:
+            days, values = history.state()
+        else:
+            days, values = history.as_of(_day(as_of))
+        return pd.DataFrame({"date": days.astype("datetime64[D]").astype("datetime64[ns]"), "value": values})
+
+    def vintages(self, sid):
+        """Publication dates of the stored vintages with the number of changed dates in each."""
+        history = self.history(sid)
+        return pd.DataFrame({"realtime_start": history.keys.astype("datetime64[D]").astype("datetime64[ns]"),
+                             "changes": np.diff(history.offsets)})
+
+    def revisions(self, sid, obs_date):
+        """Every value published for one observation date, oldest first."""
+        history = self.history(sid)
+        vintage = np.searchsorted(history.offsets, np.arange(len(history.dates)), side="right") - 1
+        hit = history.dates == _day(obs_date)
+        return pd.DataFrame({"realtime_start": history.keys[vintage[hit]].astype("datetime64[D]")
+                             .astype("datetime64[ns]"), "value": history.values[hit]})
+
+
+def _all_observations(client, sid, **params):
+    # paged with offset like FredClient.paged; None if any page fails, never a truncated list
+    rows, offset = [], 0
+    while True:
+        page = client.observations(sid, limit=OBSERVATIONS_PAGE, offset=offset, **params)
+        if page is None:
+            return None
+        rows.extend(page)
+        if len(page) < OBSERVATIONS_PAGE:
+            return rows
+        offset += OBSERVATIONS_PAGE
+
+
+def backfill(client, store, sid):
+    """Rebuild sid's history from every vintage ALFRED has (realtime periods since 1776)."""
+    observations = _all_observations(client, sid, realtime_start="1776-07-04", realtime_end="9999-12-31")
+    if not observations:
+        return 0
+    rows = pd.DataFrame(observations)
+    rows["value"] = pd.to_numeric(rows["value"].replace({".": None, "": None}), errors="coerce")
+    rows["start"], rows["end"] = _days(rows["realtime_start"]), _days(rows["realtime_end"])
+    history = SeriesHistory()
+    for key in np.unique(rows["start"].to_numpy()):
+        # the series as of key: rows whose realtime period covers it
+        live = rows[(rows["start"] <= key) & (rows["end"] >= key)]
+        history.append(int(key), _days(live["date"]), live["value"].to_numpy())
+
+    # the newest vintage must be the series FRED serves today
+    current = _all_observations(client, sid)
+    if current is None:
+        print(f"[Vintage ERROR] {sid}: live series could not be fetched; not written.", flush=True)
+        return 0
+    current = pd.DataFrame(current, columns=["date", "value"])
+    values = pd.to_numeric(current["value"].replace({".": None, "": None}), errors="coerce").to_numpy(float)
+    dates, values = _days(current["date"])[~np.isnan(values)], values[~np.isnan(values)]
+    days, stored = history.state()
+    if not (np.array_equal(days, np.sort(dates)) and np.allclose(stored, values[np.argsort(dates)])):
+        print(f"[Vintage ERROR] {sid}: backfilled history does not match the live series; not written.",
+              flush=True)
+        return 0
+    store.blobs.write(sid, history.encode())
+    return len(history)
+
+
+class VintageSink(Sink):
+    """Records every fetched series in a VintageStore, keyed by the
+    realtime_start FRED reports with the observations (today if missing)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def write_observations(self, obs):
+        frame = obs.frame
+        realtime_start = obs.realtime_start or date.today().isoformat()
+        if self.store.record(obs.series_id, realtime_start, frame["date"], frame["value"].astype(float)):
+            print(f"[Vintage] {obs.series_id} revised as of {realtime_start}.", flush=True)
@@ -0,0 +1,52 @@
+# client.py
+# Small client for server.py. Frames come over Arrow IPC and are reused
+# when the server answers 304 to the ETag of the previous response.
+#
+#   api = DataClient("http://localhost:8060")
+#   krw = api.series("DEXKOUS", start="2024-01-01")
+#   weekly = api.panel(["WPU0851", "HOUST", "MORTGAGE30US"], freq="W")
+import threading
+
+import requests
+
+
+class DataClient:
+    def __init__(self, base_url="http://localhost:8060", timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._seen = {}                  # url + params -> (etag, frame)
+        self._lock = threading.Lock()
+
+    def _get(self, path, **params):
+        import pyarrow as pa
+
+        params = {k: v for k, v in params.items() if v is not None}
+        params["format"] = "arrow"
+        key = (path, tuple(sorted(params.items())))
+        with self._lock:
+            seen = self._seen.get(key)
+        headers = {"If-None-Match": seen[0]} if seen else {}
+        resp = self.session.get(f"{self.base_url}{path}", params=params, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304:
+            return seen[1].copy()
+        resp.raise_for_status()
+        frame = pa.ipc.open_stream(resp.content).read_pandas()
+        with self._lock:
+            self._seen[key] = (resp.headers.get("ETag"), frame)
+        return frame.copy()
+
+    def series(self, series_id, start=None, end=None, as_of=None):
+        """(date, value) frame of one series, optionally cut to [start, end];
+        as_of gives the series as it was known on that day."""
+        return self._get(f"/series/{series_id}", start=start, end=end, as_of=as_of)
+
+    def panel(self, series_ids, start=None, end=None, freq="W", how="latest", as_of=None):
+        """As-of aligned panel with one column per series id (see alignment.align_series)."""
+        return self._get("/panel", ids=",".join(series_ids), start=start, end=end, freq=freq, how=how,
+                         as_of=as_of)
+
+    def version(self, series_id):
+        resp = self.session.head(f"{self.base_url}/series/{series_id}", timeout=self.timeout)
+        return resp.headers.get("ETag") if resp.ok else None
+
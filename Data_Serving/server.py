@@ -0,0 +1,288 @@
+# server.py
+# Read API in front of the observation store, so consumers fetch only the
+# slice they need instead of whole CSV objects, and share one warm cache.
+#
+#   GET /series/<id>?start=&end=&as_of=&format=json|arrow|csv
+#   GET /panel?ids=A,B,C&start=&end=&as_of=&freq=W&how=latest&format=json|arrow|csv
+#   GET /health
+#
+# Parsed series are kept in an in-memory LRU (bounded by bytes) and
+# revalidated against the store version (S3 ETag or file mtime) at most every
+# REVALIDATE_SECONDS. Responses carry a strong ETag built from the store
+# versions and the query, so a repeated request gets a 304 without any
+# encoding work; bodies are gzipped when the client accepts it. as_of=
+# answers with the data as it was known on that day, from the vintage store
+# (Data_Fetching/vintage_store.py).
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import boto3
+import numpy as np
+import pandas as pd
+from flask import Flask, Response, abort, jsonify, request
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Dash" / "app" / "models"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Data_Fetching"))
+from alignment import CALENDARS, align_series, prepare_series  # noqa: E402
+from vintage_store import LocalBlobs, S3Blobs, VintageStore  # noqa: E402
+
+aws_access_key_id = os.environ.get("AWS_ACCESS_KEY_ID", "YOUR_KEY_ID")
+aws_secret_access_key = os.environ.get("AWS_SECRET_ACCESS_KEY", "YOUR_ACCESS_KEY")
+endpoint_url = os.environ.get("S3_ENDPOINT_URL", "YOUR_ENDPOINT")
+bucket_name = os.environ.get("FRED_BUCKET", "fred")
+
+# Serve a local folder (e.g. the crawler's LOCAL_CSV_DIR) instead of S3
+OBSERVATIONS_DIR = os.environ.get("OBSERVATIONS_DIR")
+VINTAGES_DIR = os.environ.get("VINTAGES_DIR")      # with OBSERVATIONS_DIR; on S3 it is vintages/
+PORT = int(os.environ.get("PORT", 8060))
+
+CACHE_BYTES = 512 * 2**20
+REVALIDATE_SECONDS = 30
+MAX_AGE = 60                 # Cache-Control max-age for clients and proxies
+GZIP_MIN_BYTES = 1024
+MAX_PANEL_SERIES = 200
+
+
+# ---------- store -----------------------------------------------------------
+
+class S3Store:
+    def __init__(self, prefix="observations/"):
+        s3 = boto3.resource(
+            "s3",
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            endpoint_url=endpoint_url,
+        )
+        self.bucket = s3.Bucket(bucket_name)
+        self.prefix = prefix
+
+    def version(self, sid):
+        try:
+            return self.bucket.Object(f"{self.prefix}{sid}.csv").e_tag
+        except Exception:
+            return None
+
+    def read(self, sid):
+        return self.bucket.Object(f"{self.prefix}{sid}.csv").get()["Body"].read()
+
+
+class LocalStore:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def version(self, sid):
+        try:
+            st = os.stat(os.path.join(self.data_dir, f"{sid}.csv"))
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def read(self, sid):
+        with open(os.path.join(self.data_dir, f"{sid}.csv"), "rb") as f:
+            return f.read()
+
+
+def parse_observations(body):
+    """CSV bytes -> sorted (datetime64[D], float64) arrays, NaNs dropped."""
+    df = pd.read_csv(io.BytesIO(body))
+    df.columns = df.columns.str.strip().str.lower()
+    date_col = "observation_date" if "observation_date" in df.columns else "date"
+    value_col = "value" if "value" in df.columns else next(c for c in df.columns
+                                                           if c not in (date_col, "series_id"))
+    days, values = prepare_series(df[date_col], df[value_col])
+    return days.astype("datetime64[D]"), values
+
+
+# ---------- hot series cache ------------------------------------------------
+
+class SeriesCache:
+    def __init__(self, store, max_bytes=CACHE_BYTES, revalidate=REVALIDATE_SECONDS):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.revalidate = revalidate
+        self._items = OrderedDict()        # id -> (version, checked_at, dates, values)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _lookup(self, sid):
+        with self._lock:
+            item = self._items.get(sid)
+            if item is not None:
+                self._items.move_to_end(sid)
+            return item
+
+    def version(self, sid):
+        """Current store version of sid, checked against the store at most every `revalidate` s."""
+        item = self._lookup(sid)
+        if item is not None and time.monotonic() - item[1] < self.revalidate:
+            return item[0]
+        version = self.store.version(sid)
+        if item is not None and item[0] == version:
+            with self._lock:
+                if sid in self._items:
+                    self._items[sid] = (version, time.monotonic(), item[2], item[3])
+        return version
+
+    def get(self, sid, version):
+        item = self._lookup(sid)
+        if item is not None and item[0] == version:
+            self.hits += 1
+            return item[2], item[3]
+        self.misses += 1
+        dates, values = parse_observations(self.store.read(sid))
+        with self._lock:
+            old = self._items.pop(sid, None)
+            if old is not None:
+                self._bytes -= old[2].nbytes + old[3].nbytes
+            self._items[sid] = (version, time.monotonic(), dates, values)
+            self._bytes += dates.nbytes + values.nbytes
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, _, d, v) = self._items.popitem(last=False)
+                self._bytes -= d.nbytes + v.nbytes
+        return dates, values
+
+    def stats(self):
+        with self._lock:
+            return {"series": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+# ---------- encoding --------------------------------------------------------
+
+def _slice(dates, values, start, end):
+    lo = np.searchsorted(dates, np.datetime64(start, "D"), side="left") if start else 0
+    hi = np.searchsorted(dates, np.datetime64(end, "D"), side="right") if end else len(dates)
+    return dates[lo:hi], values[lo:hi]
+
+
+def encode(frame, fmt):
+    """(body, mimetype) for a frame whose first column is 'date'."""
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+    if fmt == "csv":
+        return frame.to_csv(index=False, date_format="%Y-%m-%d").encode(), "text/csv"
+    payload = {"date": frame["date"].dt.strftime("%Y-%m-%d").tolist()}
+    for col in frame.columns[1:]:
+        payload[col] = [None if np.isnan(v) else float(v) for v in frame[col].to_numpy()]
+    return json.dumps(payload, separators=(",", ":")).encode(), "application/json"
+
+
+def etag_for(versions, params):
+    payload = json.dumps([versions, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def respond(etag, build):
+    """304 if the client already has etag, otherwise build() -> (body, mimetype), gzipped if accepted."""
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={MAX_AGE}", "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if request.method == "HEAD":
+        return Response(status=200, headers=headers)
+    body, mimetype = build()
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("Accept-Encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+# ---------- app -------------------------------------------------------------
+
+def create_app(store=None, vintages=None):
+    store = store or (LocalStore(OBSERVATIONS_DIR) if OBSERVATIONS_DIR else S3Store())
+    if vintages is None and (VINTAGES_DIR or isinstance(store, S3Store)):
+        vintages = VintageStore(LocalBlobs(VINTAGES_DIR) if VINTAGES_DIR else S3Blobs(store.bucket))
+    cache = SeriesCache(store)
+    app = Flask(__name__)
+    app.config["series_cache"] = cache
+
+    def query():
+        fmt = request.args.get("format", "json")
+        if fmt not in ("json", "arrow", "csv"):
+            abort(400, f"unknown format {fmt}")
+        try:
+            start, end, as_of = (request.args.get(k) and str(np.datetime64(request.args[k], "D"))
+                                 for k in ("start", "end", "as_of"))
+        except ValueError:
+            abort(400, "start/end/as_of must be YYYY-MM-DD")
+        if as_of and vintages is None:
+            abort(400, "no vintage store configured for as_of")
+        return fmt, start or None, end or None, as_of or None
+
+    def version_of(sid):
+        version = cache.version(sid)
+        if version is None:
+            abort(404, f"series {sid} not found")
+        return version
+
+    def etag_version(sid, version, as_of):
+        # an as_of answer comes from vintages/, which a backfill rewrites without touching observations/
+        return version if as_of is None else [version, vintages.blobs.version(sid)]
+
+    def observations(sid, version, as_of):
+        if as_of is None:
+            return cache.get(sid, version)
+        days, values = vintages.history(sid).as_of(np.datetime64(as_of, "D").astype(np.int64))
+        if not len(days):
+            abort(404, f"series {sid} has no vintage on or before {as_of}")
+        return days.astype("datetime64[D]"), values
+
+    @app.get("/series/<sid>")
+    def series(sid):
+        fmt, start, end, as_of = query()
+        version = version_of(sid)
+
+        def build():
+            dates, values = _slice(*observations(sid, version, as_of), start, end)
+            return encode(pd.DataFrame({"date": dates.astype("datetime64[ns]"), "value": values}), fmt)
+
+        return respond(etag_for({sid: etag_version(sid, version, as_of)}, [start, end, as_of, fmt]), build)
+
+    @app.get("/panel")
+    def panel():
+        fmt, start, end, as_of = query()
+        ids = [s for s in request.args.get("ids", "").split(",") if s]
+        if not ids or len(ids) > MAX_PANEL_SERIES:
+            abort(400, f"ids must name 1..{MAX_PANEL_SERIES} series")
+        freq = request.args.get("freq", "W")
+        how = request.args.get("how", "latest")
+        if freq not in CALENDARS or how not in ("latest", "common"):
+            abort(400, f"freq must be one of {list(CALENDARS)} and how 'latest' or 'common'")
+        versions = {sid: version_of(sid) for sid in ids}
+
+        def build():
+            aligned = align_series({sid: observations(sid, versions[sid], as_of) for sid in ids},
+                                   freq=freq, how=how, end=as_of)
+            if start or end:
+                aligned = aligned[aligned["date"].between(start or aligned["date"].min(),
+                                                          end or aligned["date"].max())]
+            return encode(aligned.reset_index(drop=True), fmt)
+
+        tags = {sid: etag_version(sid, version, as_of) for sid, version in versions.items()}
+        return respond(etag_for(tags, [start, end, as_of, freq, how, fmt]), build)
+
+    @app.get("/health")
+    def health():
+        return jsonify(cache.stats())
+
+    return app
+
+
+if __name__ == "__main__":
+    print(f"[Serve] {'local ' + OBSERVATIONS_DIR if OBSERVATIONS_DIR else 's3 ' + bucket_name} on :{PORT}",
+          flush=True)
+    create_app().run(host="0.0.0.0", port=PORT, threaded=True)
@@ -0,0 +1,127 @@
+# mock_fred.py
+# Deterministic synthetic FRED API for benchmarks. Serves the endpoints the
+# crawler uses (category/children, category/series, series/observations) from
+# a generated category tree; every response depends only on the constructor
+# arguments, so two runs with the same settings see byte-identical data.
+import json
+import random
+import threading
+import zlib
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LAST_UPDATED = "2024-01-02 07:51:03-06"
+FREQUENCIES = ["Daily", "Weekly, Ending Friday", "Monthly", "Quarterly", "Annual"]
+FREQ_STEP = {"Daily": 1, "Weekly, Ending Friday": 7, "Monthly": 30, "Quarterly": 91, "Annual": 365}
+
+
+def synthetic_values(series_id, n, seed=0, start=100.0):
+    rng = random.Random(zlib.crc32(series_id.encode()) ^ seed)
+    value, out = start, []
+    for _ in range(n):
+        value = max(0.01, value * (1 + rng.gauss(0, 0.01)))
+        out.append(round(value, 4))
+    return out
+
+
+def synthetic_dates(n, step_days=1, end=date(2024, 1, 1)):
+    first = end - timedelta(days=step_days * (n - 1))
+    return [(first + timedelta(days=step_days * i)).isoformat() for i in range(n)]
+
+
+class SyntheticFred:
+    def __init__(self, depth=2, fanout=4, series_per_category=25, observations=2000, seed=0):
+        self.series_per_category = series_per_category
+        self.observations = observations
+        self.seed = seed
+        self.children = {}
+        frontier, next_id = [0], 1
+        for _ in range(depth):
+            nxt = []
+            for parent in frontier:
+                kids = list(range(next_id, next_id + fanout))
+                next_id += fanout
+                self.children[parent] = kids
+                nxt.extend(kids)
+            frontier = nxt
+        self.categories = [0] + [c for kids in self.children.values() for c in kids]
+
+    @property
+    def total_series(self):
+        return len(self.categories) * self.series_per_category
+
+    def series(self, category_id):
+        out = []
+        for i in range(self.series_per_category):
+            sid = f"SYN{category_id:04d}X{i:04d}"
+            freq = FREQUENCIES[(category_id + i) % len(FREQUENCIES)]
+            out.append({
+                "id": sid, "title": f"Synthetic series {sid}",
+                "observation_start": "1990-01-01", "observation_end": "2024-01-01",
+                "frequency": freq, "units": "Index", "seasonal_adjustment": "Not Seasonally Adjusted",
+                "last_updated": LAST_UPDATED, "notes": f"Generated for benchmarks, seed {self.seed}.",
+            })
+        return out
+
+    @lru_cache(maxsize=4096)
+    def observations_json(self, series_id):
+        dates = synthetic_dates(self.observations)
+        values = synthetic_values(series_id, self.observations, self.seed)
+        obs = [{"realtime_start": "2024-01-02", "realtime_end": "2024-01-02", "date": d, "value": str(v)}
+               for d, v in zip(dates, values)]
+        return json.dumps({"count": len(obs), "observations": obs}).encode()
+
+    # ---------- request routing -------------------------------------------
+
+    def handle(self, endpoint, params):
+        if endpoint == "category/children":
+            cid = int(params.get("category_id", 0))
+            kids = [{"id": c, "name": f"Category {c}", "parent_id": cid} for c in self.children.get(cid, [])]
+            return json.dumps({"categories": kids}).encode()
+        if endpoint == "category/series":
+            cid = int(params.get("category_id", 0))
+            offset, limit = int(params.get("offset", 0)), int(params.get("limit", 1000))
+            series = self.series(cid) if cid in self.categories else []
+            return json.dumps({"count": len(series), "offset": offset, "limit": limit,
+                               "seriess": series[offset:offset + limit]}).encode()
+        if endpoint == "series/observations":
+            return self.observations_json(params["series_id"])
+        return None
+
+
+class MockFredServer:
+    def __init__(self, fred=None, host="127.0.0.1", port=0):
+        self.fred = fred or SyntheticFred()
+        fred = self.fred
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                body = fred.handle(url.path.split("/fred/", 1)[-1], params)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.base_url = f"http://{host}:{self.server.server_port}/fred"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,220 @@
+# run_benchmarks.py
+# Reproducible benchmarks for the crawler, the macro merge and the forecast.
+#
+#   python benchmarks/run_benchmarks.py                     # full run
+#   python benchmarks/run_benchmarks.py --quick --out bench.json
+#   python benchmarks/run_benchmarks.py --baseline bench.json --tolerance 0.2
+#
+# The synthetic FRED API (mock_fred.py) and a moto S3 server run in this
+# process; each benchmark runs in a fresh child process so its peak RSS is
+# measured on its own. With --baseline the run exits non-zero if any metric
+# regressed by more than --tolerance.
+import argparse
+import io
+import json
+import logging
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(REPO / "Data_Fetching"), str(REPO / "Dash" / "app"), str(Path(__file__).parent)]
+
+from mock_fred import MockFredServer, SyntheticFred, synthetic_dates, synthetic_values
+
+BUCKET = "fred-bench"
+HIGHER_IS_BETTER = ("series_per_s", "mb_per_s", "runs_per_s")
+
+PROFILES = {
+    "quick": {"depth": 2, "fanout": 3, "series_per_category": 10, "observations": 500,
+              "workers": 4, "macro_days": 2000, "repeats": 3},
+    "full": {"depth": 2, "fanout": 5, "series_per_category": 40, "observations": 5000,
+             "workers": 8, "macro_days": 9000, "repeats": 10},
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _latency(samples):
+    samples = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(samples, 50)), 3),
+            "p99_ms": round(float(np.percentile(samples, 99)), 3)}
+
+
+@contextmanager
+def local_s3():
+    from moto.server import ThreadedMotoServer
+    import boto3
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "S3_ENDPOINT_URL": f"http://127.0.0.1:{port}",
+        "FRED_BUCKET": BUCKET,
+    })
+    try:
+        bucket = boto3.resource("s3", endpoint_url=os.environ["S3_ENDPOINT_URL"]).Bucket(BUCKET)
+        bucket.create()
+        yield bucket
+    finally:
+        server.stop()
+
+
+def seed_macro(bucket, n_days):
+    from models.merge_fred_files import SERIES
+
+    for fname, fred_col in SERIES.values():
+        dates = synthetic_dates(n_days)
+        values = synthetic_values(fred_col, n_days)
+        buffer = io.StringIO()
+        buffer.write("series_id,date,value\n")
+        for d, v in zip(dates, values):
+            buffer.write(f"{fred_col},{d},{v}\n")
+        bucket.put_object(Key=f"observations/{fname}", Body=buffer.getvalue().encode())
+
+
+def _bucket():
+    import boto3
+    return boto3.resource("s3", endpoint_url=os.environ["S3_ENDPOINT_URL"]).Bucket(BUCKET)
+
+
+# ---------- benchmarks (run in child processes) ------------------------------
+
+def bench_crawler(cfg):
+    from crawler_core import FredClient, Crawler
+    from crawl_metrics import METRICS
+    from metadata_index import MetadataIndex
+    from sinks import S3Sink
+
+    latencies = []
+
+    class TimedFredClient(FredClient):
+        def get(self, endpoint, stage="list", **params):
+            start = time.perf_counter()
+            try:
+                return super().get(endpoint, stage=stage, **params)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    client = TimedFredClient("bench", base_url=cfg["fred_url"], retries=2, backoff=0, min_interval=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = MetadataIndex(os.path.join(tmp, "metadata.csv"))
+        crawler = Crawler(client, [S3Sink(_bucket(), prefix=f"bench-{time.time_ns()}/")], index,
+                          workers=cfg["workers"], progress_interval=3600)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            series = crawler.crawl(0)
+        elapsed = time.perf_counter() - start
+    written = METRICS.total("sink_bytes_total")
+    return {"series": series, "seconds": round(elapsed, 3),
+            "series_per_s": round(series / elapsed, 2),
+            "mb_per_s": round(written / elapsed / 1e6, 3),
+            **_latency(latencies), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def _bench_repeated(fn, repeats):
+    fn()  # warm-up: imports and connection setup
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_merge(cfg):
+    from models import merge_fred_files
+
+    read_bytes = sum(o.size for o in _bucket().objects.filter(Prefix="observations/"))
+    times = _bench_repeated(lambda: merge_fred_files.build_merged_macro("usd_krw"), cfg["repeats"])
+    return {"runs": len(times), "runs_per_s": round(len(times) / sum(times), 3),
+            "mb_per_s": round(read_bytes * len(times) / sum(times) / 1e6, 3),
+            **_latency(times), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def bench_forecast(cfg):
+    from models.macro_model_s3 import build_forecast
+
+    times = _bench_repeated(lambda: build_forecast("usd_krw"), cfg["repeats"])
+    return {"runs": len(times), "runs_per_s": round(len(times) / sum(times), 3),
+            **_latency(times), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+BENCHMARKS = {"crawler": bench_crawler, "merge": bench_merge, "forecast": bench_forecast}
+
+
+def _run_isolated(name, cfg):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+        return ex.submit(BENCHMARKS[name], cfg).result()
+
+
+# ---------- regression check ------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for bench, metrics in results.items():
+        for key, value in metrics.items():
+            old = baseline.get(bench, {}).get(key)
+            if not isinstance(old, (int, float)) or not old or key in ("series", "runs", "seconds"):
+                continue
+            change = (value - old) / old
+            worse = change < -tolerance if key in HIGHER_IS_BETTER else change > tolerance
+            if worse:
+                failures.append(f"{bench}.{key}: {old} -> {value} ({change:+.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--only", choices=list(BENCHMARKS), action="append")
+    parser.add_argument("--out")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    cfg = dict(PROFILES["quick" if args.quick else "full"])
+    fred = SyntheticFred(cfg["depth"], cfg["fanout"], cfg["series_per_category"], cfg["observations"])
+    results = {}
+    with MockFredServer(fred) as api, local_s3() as bucket:
+        cfg["fred_url"] = api.base_url
+        seed_macro(bucket, cfg["macro_days"])
+        for name in args.only or BENCHMARKS:
+            print(f"[Bench] {name} ...", flush=True)
+            results[name] = _run_isolated(name, cfg)
+            print(f"[Bench] {name}: {json.dumps(results[name])}", flush=True)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        failures = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for f in failures:
+            print(f"[Regression] {f}", flush=True)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
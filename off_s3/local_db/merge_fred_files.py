@@ -1,7 +1,10 @@
-import pandas as pd
-from functools import reduce
+import sys
+from pathlib import Path
 from fetch_fred_data import fetch_csv_from_s3
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Dash" / "app" / "models"))
+from alignment import align_series
+
 # Defined S3 keys and columns
 kpi_files = {
     'CPIAUCSL.csv': 'cpi',
@@ -17,13 +20,10 @@ kpi_files = {
     'WPU0851.csv': 'lumber_price'
 }
 
-def load_and_merge_data():
-    dfs = []
+def load_and_merge_data(freq="W", lags=None):
+    series = {}
     for key, col_name in kpi_files.items():
         df = fetch_csv_from_s3(key)
-        df.columns = ['date', col_name]
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.set_index('date').resample('W').ffill().reset_index()
-        dfs.append(df)
-    merged_df = reduce(lambda left, right: pd.merge(left, right, on='date', how='inner'), dfs)
-    return merged_df.sort_values('date').reset_index(drop=True)
+        series[col_name] = (df.iloc[:, 0], df.iloc[:, 1])
+    # as-of alignment on a weekly calendar, running to the newest observation
+    return align_series(series, freq=freq, lags=lags)